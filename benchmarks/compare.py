@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Compares two result files of benchmarks/run.py, exits with status 1 on regressions.
+
+    python benchmarks/compare.py base.json new.json [--threshold 0.1] [--stat min]
+
+A benchmark regressed when it is more than `threshold` (a fraction) slower than in the
+base results. Benchmarks missing from either file are listed, not compared.
+"""
+import argparse
+import json
+import sys
+
+
+def load_results(path):
+    with open(path) as fh:
+        data = json.load(fh)
+    if data.get('version') != 1:
+        raise ValueError('{}: unsupported results version {}.'.format(path, data.get('version')))
+    return data
+
+
+def compare(base, new, threshold, stat='min'):
+    """
+    Returns [(name, base seconds, new seconds, ratio, status)] of the benchmarks in
+    `base` or `new`, status is one of 'regression', 'improvement', 'ok', 'added' or
+    'removed'.
+    """
+    rows = []
+    for name in sorted(set(base) | set(new)):
+        if name not in new:
+            rows.append((name, base[name][stat], None, None, 'removed'))
+            continue
+        if name not in base:
+            rows.append((name, None, new[name][stat], None, 'added'))
+            continue
+        old_value, new_value = base[name][stat], new[name][stat]
+        ratio = new_value / old_value if old_value else float('inf')
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 / (1 + threshold):
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append((name, old_value, new_value, ratio, status))
+    return rows
+
+
+def _format_ms(value):
+    return '{:10.3f}'.format(value * 1000) if value is not None else ' ' * 10
+
+
+def main():
+    aparser = argparse.ArgumentParser(description='Compare vdb benchmark results')
+    aparser.add_argument('base', help='results of the base version')
+    aparser.add_argument('new', help='results to check')
+    aparser.add_argument('--threshold', type=float, default=0.1,
+                         help='slowdown flagged as a regression, as a fraction (default: 0.1)')
+    aparser.add_argument('--stat', choices=('min', 'median'), default='min',
+                         help='statistic compared (default: min)')
+    args = aparser.parse_args()
+
+    base, new = load_results(args.base), load_results(args.new)
+    print('base: {}\nnew:  {}\n'.format(
+        base['meta'].get('commit') or args.base, new['meta'].get('commit') or args.new
+    ))
+    print('{:<36} {:>10} {:>10} {:>8}'.format('benchmark', 'base ms', 'new ms', 'ratio'))
+    rows = compare(base['results'], new['results'], args.threshold, args.stat)
+    for name, old_value, new_value, ratio, status in rows:
+        print('{:<36} {} {} {:>8} {}'.format(
+            name,
+            _format_ms(old_value),
+            _format_ms(new_value),
+            '{:.2f}'.format(ratio) if ratio is not None else '',
+            status if status != 'ok' else '',
+        ).rstrip())
+
+    regressions = [row for row in rows if row[-1] == 'regression']
+    if regressions:
+        print('\n{} regression(s) over {:.0%}.'.format(len(regressions), args.threshold))
+        sys.exit(1)
+    print('\nNo regressions over {:.0%}.'.format(args.threshold))
+
+
+if __name__ == '__main__':
+    main()
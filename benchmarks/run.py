@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of the debug VM, source map generation, variable decoding and vdb commands.
+
+    python benchmarks/run.py [-o results.json] [--quick] [--startup] [-k vm/]
+    python benchmarks/compare.py base.json results.json
+
+Every benchmark is timed `repeat` times, results are the min and median seconds of one
+iteration, written as JSON (see write_results).
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from eth.vm.forks.byzantium.computation import ByzantiumComputation  # noqa: E402
+from eth.vm.message import Message  # noqa: E402
+from eth_tester import EthereumTester  # noqa: E402
+from eth_utils import to_canonical_address  # noqa: E402
+from web3 import Web3  # noqa: E402
+from web3.providers.eth_tester import EthereumTesterProvider  # noqa: E402
+
+from vdb.debug_computation import DebugSession  # noqa: E402
+from vdb.eth_tester_debug_backend import PyEVMDebugBackend  # noqa: E402
+from vdb.source_map import (  # noqa: E402
+    _produce_debug_info,
+    produce_debug_info,
+)
+from vdb.storage import StorageReader  # noqa: E402
+from vdb.variables import (  # noqa: E402
+    parse_global,
+    parse_local,
+)
+from vdb.vdb import VyperDebugCmd  # noqa: E402
+
+
+RESULTS_VERSION = 1
+
+VM_CONTRACTS = {
+    'loop': ("""
+@public
+def run(n: int128) -> int128:
+    s: int128 = 0
+    for i in range(1000):
+        if i >= n:
+            break
+        s += i * 3 % 7
+    return s
+""", 300),
+    'storage': ("""
+values: map(int128, int128)
+
+@public
+def run(n: int128) -> int128:
+    for i in range(100):
+        if i >= n:
+            break
+        self.values[i] = self.values[i] + i + 1
+    return self.values[n - 1]
+""", 50),
+    'memory': ("""
+@public
+def run(n: int128) -> int128:
+    a: int128[128]
+    b: bytes[4096] = "memory"
+    c: bytes[4096]
+    for i in range(128):
+        if i >= n:
+            break
+        a[i] = i
+        c = b
+    return a[n - 1]
+""", 100),
+}
+
+DECODE_CONTRACT = """
+struct Point:
+    x: int128
+    y: int128
+
+total: int128
+owner: address
+name: bytes[100]
+points: Point[10]
+
+@public
+def run(n: int128) -> int128:
+    s: int128 = n
+    t: bytes[100] = "benchmarking local variable decoding"
+    p: Point = Point({x: n, y: n + 1})
+    self.total = n
+    self.owner = msg.sender
+    self.name = t
+    self.points[3] = p
+    return s
+"""
+
+# (name, command), run on a stopped VyperDebugCmd.
+COMMANDS = [
+    ('locals', 'locals'),
+    ('print_local', 's'),
+    ('print_global', 'self.total'),
+    ('print_struct', 'self.points[3]'),
+    ('stack', 'stack'),
+    ('hexdump', 'x 0 512'),
+    ('dump', 'dump'),
+]
+
+
+def timeit(fn, repeat, number=1):
+    """
+    Returns {'min', 'median'} seconds per call of `fn`, over `repeat` rounds of `number`
+    calls.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / number)
+    return {'min': min(times), 'median': statistics.median(times), 'runs': repeat * number}
+
+
+def deploy(code, session=None):
+    """
+    Deploys `code` on a new tester chain, returns (tester, contract, debug_info).
+    """
+    debug_info = produce_debug_info(code)
+    tester = EthereumTester(backend=PyEVMDebugBackend(session=session or DebugSession()))
+    tester.backend.session.set_debug_info(code, debug_info['source_map'])
+    w3 = Web3(EthereumTesterProvider(tester))
+    w3.eth.setGasPriceStrategy(lambda web3, transaction_params=None: 0)
+    factory = w3.eth.contract(abi=debug_info['abi'], bytecode=debug_info['bytecode'])
+    tx_hash = factory.constructor().transact({'from': w3.eth.accounts[0], 'gas': 3 * 10 ** 6})
+    address = w3.eth.getTransactionReceipt(tx_hash)['contractAddress']
+    return tester, w3.eth.contract(address, abi=debug_info['abi']), debug_info
+
+
+#
+# Benchmarks, each yields (name, result).
+#
+def bench_vm(repeat):
+    """
+    apply_computation of the stock ByzantiumComputation and of the debug computation,
+    without stops (fast path) and with the instrumented opcode loop.
+    """
+    for name, (code, n) in VM_CONTRACTS.items():
+        tester, contract, _ = deploy(code)
+        session = tester.backend.session
+        state = tester.backend.chain.get_vm().state
+        sender = to_canonical_address(tester.get_accounts()[0])
+        address = to_canonical_address(contract.address)
+        message = Message(
+            gas=10 ** 7,
+            to=address,
+            sender=sender,
+            value=0,
+            data=bytes.fromhex(contract.encodeABI('run', args=(n, ))[2:]),
+            code=state.account_db.get_code(address),
+        )
+        transaction_context = state.get_transaction_context_class()(gas_price=0, origin=sender)
+
+        def run(computation_class):
+            snapshot = state.snapshot()
+            computation = computation_class.apply_computation(
+                state, message, transaction_context
+            )
+            state.revert(snapshot)
+            assert not computation.is_error, computation._error
+
+        yield 'vm/{}/stock'.format(name), timeit(lambda: run(ByzantiumComputation), repeat)
+        yield 'vm/{}/debug'.format(name), timeit(lambda: run(session.computation_class), repeat)
+        session.enable_debug = True
+        session.debugger = lambda computation, line_no: None  # instrumented, never stops.
+        yield 'vm/{}/instrumented'.format(name), timeit(
+            lambda: run(session.computation_class), repeat
+        )
+        session.enable_debug = False
+        session.debugger = None
+
+
+def make_contract(lines):
+    """
+    Synthetic contract of about `lines` lines, functions of up to 20 lines.
+    """
+    per_function = max(6, min(20, lines - 2))
+    out = ['total: int128', '']
+    for i in range(max(1, (lines - 2) // per_function)):
+        out += ['@public', 'def f{}(x: int128) -> int128:'.format(i)]
+        out += ['    y: int128 = x + {}'.format(i)]
+        out += ['    # {} of f{}'.format(k, i) for k in range(per_function - 6)]
+        out += ['    self.total += y', '    return y', '']
+    return '\n'.join(out) + '\n'
+
+
+def bench_source_map(repeat, sizes):
+    for lines in sizes:
+        code = make_contract(lines)
+        # large contracts take seconds to compile.
+        rounds = repeat if lines <= 1000 else 1
+        yield 'source_map/{}_lines'.format(lines), timeit(lambda: _produce_debug_info(code), rounds)
+
+
+def _stop(code, line_no):
+    """
+    Runs `run(5)` of `code` and returns a VyperDebugCmd stopped at `line_no`.
+    """
+    stopped = []
+
+    def debugger(computation, line_no):
+        stopped.append(computation)
+
+    tester, contract, debug_info = deploy(code)
+    session = tester.backend.session
+    session.debugger = debugger
+    session.add_breakpoint(line_no)
+    session.enable_debug = True
+    contract.functions.run(5).transact({'gas': 10 ** 6})
+    session.enable_debug = False
+    return VyperDebugCmd(
+        stopped[0],
+        line_no=line_no,
+        source_code=code,
+        source_map=debug_info['source_map'],
+        stdin=io.StringIO(),
+        stdout=io.StringIO(),
+        session=session,
+    )
+
+
+def _stop_at_return():
+    return _stop(DECODE_CONTRACT, DECODE_CONTRACT.splitlines().index('    return s') + 1)
+
+
+def bench_decode(repeat):
+    cmd = _stop_at_return()
+    computation = cmd.computation
+    local_vars = cmd._get_fn_name_locals()[1]
+    out = io.StringIO()
+    number = 200
+
+    def read_global(name):
+        # a new reader per read, as at every stop.
+        storage = StorageReader.from_computation(computation)
+        parse_global(out, cmd.global_vars, computation, name, storage)
+
+    for name in ('self.total', 'self.name', 'self.points[3]'):
+        yield 'decode/global/{}'.format(name[5:]), timeit(
+            lambda: read_global(name), repeat, number
+        )
+    for name in ('s', 't', 'p'):
+        yield 'decode/local/{}'.format(name), timeit(
+            lambda: parse_local(out, local_vars, computation, name), repeat, number
+        )
+
+
+def bench_commands(repeat):
+    cmd = _stop_at_return()
+    for name, line in COMMANDS:
+        def run():
+            cmd.stdout = io.StringIO()
+            cmd.onecmd(line)
+        yield 'command/{}'.format(name), timeit(run, repeat, 50)
+
+    # a scripted session: stop, run every command, continue.
+    script = ''.join(line + '\n' for _, line in COMMANDS) + 'continue\n'
+
+    def run_script():
+        cmd.stdin = io.StringIO(script)
+        cmd.stdout = io.StringIO()
+        cmd.cmdqueue = []
+        cmd.cmdloop()
+    yield 'command/script', timeit(run_script, repeat, 10)
+
+
+def bench_startup(repeat):
+    import startup
+    with startup.startup_contract() as contract_path:
+        for name, args in startup.get_scenarios(contract_path):
+            yield 'startup/{}'.format(name.replace(' ', '_')), startup.measure(args, repeat)
+
+
+def get_meta():
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def write_results(path, results):
+    """
+    {"version": 1, "meta": {...}, "results": {name: {"min", "median", "runs"}}}, seconds.
+    """
+    with open(path, 'w') as fh:
+        json.dump({
+            'version': RESULTS_VERSION,
+            'meta': get_meta(),
+            'results': results,
+        }, fh, indent=2, sort_keys=True)
+
+
+def main():
+    aparser = argparse.ArgumentParser(description='vdb benchmarks')
+    aparser.add_argument('-o', '--output', default='benchmark-results.json',
+                         help='JSON results file (default: benchmark-results.json)')
+    aparser.add_argument('--repeat', type=int, default=5, help='rounds per benchmark')
+    aparser.add_argument('--quick', action='store_true',
+                         help='fewer rounds and source maps up to 1000 lines')
+    aparser.add_argument('--startup', action='store_true',
+                         help='include the startup benchmarks (see startup.py)')
+    aparser.add_argument('-k', dest='select', default='',
+                         help='only run benchmarks whose name contains SELECT, e.g. vm/')
+    args = aparser.parse_args()
+
+    os.environ['VDB_NO_CACHE'] = '1'  # time compilation, not the debug info cache.
+    repeat = 2 if args.quick else args.repeat
+    sizes = (10, 100, 1000) if args.quick else (10, 100, 1000, 5000)
+    suites = [
+        ('vm/', lambda: bench_vm(repeat)),
+        ('source_map/', lambda: bench_source_map(repeat, sizes)),
+        ('decode/', lambda: bench_decode(repeat)),
+        ('command/', lambda: bench_commands(repeat)),
+    ]
+    if args.startup:
+        suites.append(('startup/', lambda: bench_startup(repeat)))
+
+    results = {}
+    for prefix, suite in suites:
+        if not (prefix.startswith(args.select) or args.select.startswith(prefix)):
+            continue
+        for name, result in suite():
+            if args.select not in name:
+                continue
+            results[name] = result
+            print('{:<36} min {:10.3f} ms   median {:10.3f} ms'.format(
+                name, result['min'] * 1000, result['median'] * 1000
+            ), flush=True)
+    write_results(args.output, results)
+    print('\nResults written to {}'.format(args.output))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Startup time of vyper-run and vdb.
+
+Every scenario runs in a fresh interpreter, `--repeat` times. On Python 3.7+ the modules
+with the largest cumulative import time (`python -X importtime`) are listed as well.
+
+    python benchmarks/startup.py [--repeat N] [--top N]
+"""
+import argparse
+import contextlib
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VYPER_RUN = os.path.join(ROOT, 'bin', 'vyper-run')
+HAS_IMPORTTIME = sys.version_info >= (3, 7)
+
+CONTRACT = """
+total: int128
+
+@public
+def incr(x: int128) -> int128:
+    self.total += x
+    return self.total
+"""
+
+
+@contextlib.contextmanager
+def startup_contract():
+    """
+    Path of a contract to debug, its debug info is cached.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        contract_path = os.path.join(tmp_dir, 'startup.vy')
+        with open(contract_path, 'w') as fh:
+            fh.write(CONTRACT)
+        run([VYPER_RUN, contract_path, 'incr(1)'])  # fill the debug info cache.
+        yield contract_path
+
+
+def get_scenarios(contract_path):
+    return [
+        ('vyper-run --help', [VYPER_RUN, '--help']),
+        ('import vdb', ['-c', 'import vdb']),
+        ('import vdb.vdb', ['-c', 'import vdb.vdb']),
+        ('debug session', [VYPER_RUN, contract_path, 'incr(1)']),
+    ]
+
+
+def get_env():
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+    return env
+
+
+def run(args, importtime=False):
+    """
+    Runs python with `args`, returns (seconds, stderr).
+    """
+    cmd = [sys.executable] + (['-X', 'importtime'] if importtime else []) + args
+    start = time.perf_counter()
+    proc = subprocess.run(
+        cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=get_env(), cwd=ROOT
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode:
+        raise RuntimeError('{} failed:\n{}'.format(' '.join(cmd), proc.stderr.decode()))
+    return elapsed, proc.stderr.decode()
+
+
+def parse_importtime(stderr):
+    """
+    Returns [(cumulative microseconds, module)] of `-X importtime` output, slowest first.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)
+
+
+def measure(args, repeat):
+    times = [run(args)[0] for _ in range(repeat)]
+    return {'min': min(times), 'median': statistics.median(times), 'runs': repeat}
+
+
+def main():
+    aparser = argparse.ArgumentParser(description='Startup time of vyper-run and vdb')
+    aparser.add_argument('--repeat', type=int, default=5, help='runs per scenario')
+    aparser.add_argument('--top', type=int, default=10,
+                         help='slowest imports listed per scenario (Python 3.7+)')
+    args = aparser.parse_args()
+
+    with startup_contract() as contract_path:
+        for name, scenario_args in get_scenarios(contract_path):
+            result = measure(scenario_args, args.repeat)
+            print('{:<20} min {:8.1f} ms   median {:8.1f} ms'.format(
+                name, result['min'] * 1000, result['median'] * 1000
+            ))
+            if HAS_IMPORTTIME and args.top:
+                _, stderr = run(scenario_args, importtime=True)
+                for cumulative, module in parse_importtime(stderr)[:args.top]:
+                    print('    {:8.1f} ms  {}'.format(cumulative / 1000, module))
+
+
+if __name__ == '__main__':
+    main()
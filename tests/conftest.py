@@ -1,6 +1,6 @@
-import pytest
+import os
 
-from vyper import compile_code
+import pytest
 
 from eth_tester import (
     EthereumTester,
@@ -14,21 +14,41 @@ from web3 import (
 from vdb.vdb import (
     VyperDebugCmd
 )
+from vdb.debug_computation import (
+    DebugSession
+)
 from vdb.eth_tester_debug_backend import (
     PyEVMDebugBackend,
     set_debug_info
 )
 from vdb.source_map import (
-    produce_source_map
+    produce_debug_info
 )
 
 
+@pytest.fixture(scope='session', autouse=True)
+def debug_info_cache_dir(tmpdir_factory):
+    # Compiled debug info is cached in a temporary directory, not in ~/.cache/vdb.
+    old_cache_dir = os.environ.get('VDB_CACHE_DIR')
+    cache_dir = os.environ['VDB_CACHE_DIR'] = str(tmpdir_factory.mktemp('vdb-cache'))
+    yield cache_dir
+    if old_cache_dir is None:
+        del os.environ['VDB_CACHE_DIR']
+    else:
+        os.environ['VDB_CACHE_DIR'] = old_cache_dir
+
+
 @pytest.fixture()
 def tester():
-    t = EthereumTester(backend=PyEVMDebugBackend())
+    t = EthereumTester(backend=PyEVMDebugBackend(session=DebugSession()))
     return t
 
 
+@pytest.fixture()
+def debug_session(tester):
+    return tester.backend.session
+
+
 def zero_gas_price_strategy(web3, transaction_params=None):
     return 0  # zero gas price makes testing simpler.
 
@@ -41,18 +61,17 @@ def w3(tester):
 
 
 def _get_contract(w3, source_code, *args, **kwargs):
-    compiler_output = compile_code(source_code, ['bytecode', 'abi'])
-    abi = compiler_output['abi']
-    bytecode = compiler_output['bytecode']
+    debug_info = produce_debug_info(source_code)
+    abi = debug_info['abi']
+    bytecode = debug_info['bytecode']
     contract = w3.eth.contract(abi=abi, bytecode=bytecode)
 
     stdin = kwargs['stdin'] if 'stdin' in kwargs else None
     stdout = kwargs['stdout'] if 'stdout' in kwargs else None
 
-    source_map = produce_source_map(source_code)
-    set_debug_info(source_code, source_map, stdin, stdout)
-    import vdb
-    setattr(vdb.debug_computation.DebugComputation, 'enable_debug', True)
+    session = w3.providers[0].ethereum_tester.backend.session
+    set_debug_info(source_code, debug_info['source_map'], stdin, stdout, session=session)
+    session.enable_debug = True
     value = kwargs.pop('value', 0)
     value_in_eth = kwargs.pop('value_in_eth', 0)
     value = value_in_eth * 10**18 if value_in_eth else value  # Handle deploying with an eth value.
@@ -0,0 +1,75 @@
+import io
+import json
+
+from vdb.batch import (
+    BatchDebugger,
+    load_script,
+)
+
+
+code = """
+total: int128
+values: int128[3]
+
+@public
+def foo(x: int128) -> int128:
+    s: int128 = x * 2
+    self.total += s
+    self.values[1] = s
+    vdb
+    return self.total
+"""
+
+
+def _run_batch(get_contract, debug_session, script, calls):
+    c = get_contract(code)
+    output = io.StringIO()
+    BatchDebugger(debug_session, output, **load_script(script)).install()
+    for x in calls:
+        c.functions.foo(x).transact({'gas': 500000})
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+def test_batch_script(get_contract, debug_session):
+    script = """
+# read at the vdb statement, then step once.
+s
+self.values
+pdb
+stepi
+continue
+self.total
+"""
+    records = _run_batch(get_contract, debug_session, script, [4, 3])
+
+    stops = [r for r in records if r['event'] == 'stop']
+    assert [(r['stop'], r['reason'], r['line'], r['function']) for r in stops] == [
+        (1, 'breakpoint', 11, 'foo'), (2, 'step', 11, 'foo'), (3, 'breakpoint', 11, 'foo')
+    ]
+    assert stops[1]['pc'] > stops[0]['pc']
+    commands = [r for r in records if r['event'] == 'command']
+    assert [(r['stop'], r['command']) for r in commands] == [
+        (1, 's'), (1, 'self.values'), (1, 'pdb'), (1, 'stepi'), (2, 'continue'),
+        (3, 'self.total'),
+    ]
+    assert commands[0]['value'] == 8 and commands[0]['output'] == '8\n'
+    assert commands[1]['value'] == [0, 8, 0]
+    assert 'error' in commands[2]
+    assert commands[5]['value'] == 14
+
+
+def test_batch_breakpoints(get_contract, debug_session):
+    script = json.dumps({
+        'breakpoints': [{'line': 8, 'condition': 'x == 3', 'commands': ['s', 'self.nope']}],
+        'commands': ['self.total'],
+    })
+    records = _run_batch(get_contract, debug_session, script, [4, 3])
+
+    assert [(r['event'], r.get('line'), r.get('command')) for r in records] == [
+        ('stop', 11, None), ('command', None, 'self.total'),
+        ('stop', 8, None), ('command', None, 's'), ('command', None, 'self.nope'),
+        ('stop', 11, None), ('command', None, 'self.total'),
+    ]
+    assert records[3]['value'] == 6
+    assert 'not found' in records[4]['error']
+    assert records[6]['value'] == 14
@@ -0,0 +1,89 @@
+import io
+
+
+code = """
+total: int128
+
+@public
+def loop(n: int128) -> int128:
+    s: int128 = 0
+    vdb
+    for i in range(1000):
+        if i >= n:
+            break
+        s += i
+    self.total = s
+    return s
+"""
+
+
+def test_conditional_breakpoint(get_contract):
+    stdin = io.StringIO(
+        "break 11 if s > 100 and self.total == 0 and len(stack) > 0\n"
+        "continue\n"
+        "s\n"
+        "delete 1\n"
+        "continue\n"
+    )
+    stdout = io.StringIO()
+    c = get_contract(code, stdin=stdin, stdout=stdout)
+    assert c.functions.loop(50).call({'gas': 500000}) == sum(range(50))
+
+    out = stdout.getvalue()
+    assert 'Breakpoint 1 at line 11 if s > 100' in out
+    assert '--> \033[92m11\033[0m' in out
+    # first iteration with s > 100: s = sum(range(15))
+    assert '{}\n'.format(sum(range(15))) in out
+    assert out.count('--> ') == 2  # vdb statement and the breakpoint.
+
+
+def test_tbreak_and_ignore(get_contract, debug_session):
+    stdin = io.StringIO(
+        "tbreak 11\n"
+        "ignore 1 150\n"
+        "continue\n"
+        "s\n"
+        "break\n"
+        "continue\n"
+    )
+    stdout = io.StringIO()
+    c = get_contract(code, stdin=stdin, stdout=stdout)
+    assert c.functions.loop(200).call({'gas': 1000000}) == sum(range(200))
+
+    out = stdout.getvalue()
+    assert 'Temporary breakpoint 1 at line 11' in out
+    assert 'Will ignore next 150 crossings of breakpoint 1.' in out
+    assert '{}\n'.format(sum(range(150))) in out
+    assert 'No breakpoints.' in out
+    assert len(debug_session.breakpoints) == 0
+
+
+def test_breakpoint_errors(get_contract, debug_session):
+    stdin = io.StringIO(
+        "break 11 if foo > 1\n"
+        "break 3\n"
+        "break 11 when s\n"
+        "ignore 7 1\n"
+        "continue\n"
+    )
+    stdout = io.StringIO()
+    c = get_contract(code, stdin=stdin, stdout=stdout)
+    c.functions.loop(3).call({'gas': 500000})
+
+    out = stdout.getvalue()
+    assert '*** Unknown variable "foo".' in out
+    assert '*** Line 3 has no code.' in out
+    assert 'Usage: break <line_no> [if <condition>]' in out
+    assert 'No breakpoint number 7.' in out
+    assert len(debug_session.breakpoints) == 0
+
+
+def test_session_breakpoints(get_contract, debug_session):
+    stdin = io.StringIO("s\ncontinue\n" * 3)
+    stdout = io.StringIO()
+    c = get_contract(code.replace('    vdb\n', ''), stdin=stdin, stdout=stdout)
+    bp = debug_session.add_breakpoint(10, 's % 2 == 1')
+    assert c.functions.loop(6).call({'gas': 500000}) == sum(range(6))
+
+    # s = sum(range(i)) is odd for i = 2 and 3 only.
+    assert bp.hits == stdout.getvalue().count('--> ') == 2
@@ -0,0 +1,111 @@
+import io
+from types import SimpleNamespace
+
+from eth.exceptions import InsufficientStack
+import pytest
+
+from vdb.coverage import (
+    CODE_CACHE_SIZE,
+    JUMPI,
+    CoverageCollector,
+    get_file_coverage,
+    get_jumpis,
+    write_cobertura,
+    write_lcov,
+)
+from vdb.source_map import produce_debug_info
+
+
+code = """
+total: int128
+
+@public
+def incr(x: int128) -> int128:
+    if x > 3:
+        self.total += x
+    else:
+        self.total -= x
+    return self.total
+
+@public
+def never() -> int128:
+    return 1
+"""
+
+
+def test_get_jumpis():
+    # PUSH2 0x5757, JUMPI, PUSH1 0x57, STOP, JUMPI
+    assert list(get_jumpis(bytes.fromhex('61575757605700' + '57'))) == [3, 7]
+
+
+def test_coverage(get_contract, debug_session):
+    debug_info = produce_debug_info(code)
+    c = get_contract(code)
+    collector = debug_session.record_coverage()
+    c.functions.incr(5).transact({'gas': 100000})
+
+    cov = get_file_coverage(collector, debug_info)
+    assert cov.lines[7] == 1 and cov.lines[9] == 0 and cov.lines[10] == 1
+    assert cov.functions == {'incr': (4, 1), 'never': (12, 0)}
+    assert cov.branches[6] == [(0, 1)]
+    assert cov.branches[9] == [None, None]
+
+    # merged with the coverage of another process.
+    other = CoverageCollector()
+    debug_session.record_coverage(other)
+    c.functions.incr(1).transact({'gas': 100000})
+    collector.merge(other)
+    cov = get_file_coverage(collector, debug_info)
+    assert cov.lines[9] == 1
+    assert cov.branches[6] == [(1, 1)]
+
+    out = io.StringIO()
+    write_lcov(out, [('c.vy', cov)])
+    lcov = out.getvalue().splitlines()
+    assert lcov[:2] == ['TN:', 'SF:c.vy']
+    assert 'FNDA:0,never' in lcov and 'DA:9,1' in lcov and 'DA:14,0' in lcov
+    assert 'BRDA:6,0,0,1' in lcov and 'BRDA:6,0,1,1' in lcov
+    assert lcov[-1] == 'end_of_record'
+
+    out = io.StringIO()
+    write_cobertura(out, [('c.vy', cov)])
+    assert 'filename="c.vy"' in out.getvalue()
+    assert '<line branch="true" condition-coverage="100% (2/2)" hits="1" number="6" />' in \
+        out.getvalue()
+
+
+def test_save_load(tmpdir):
+    collector = CoverageCollector()
+    executed, branches = collector.get_bitmaps(b'\x60\x01\x57\x00')
+    executed[0] = executed[2] = 1
+    branches[2] = 1
+    path = str(tmpdir.join('data'))
+    collector.save(path)
+
+    loaded = CoverageCollector.load(path)
+    assert loaded.executed == collector.executed
+    assert loaded.branches == collector.branches
+
+
+def test_bitmaps_cache():
+    collector = CoverageCollector()
+    codes = [i.to_bytes(2, 'big') for i in range(CODE_CACHE_SIZE + 1)]
+    bitmaps = collector.get_bitmaps(codes[0])
+    for code in codes[1:]:
+        collector.get_bitmaps(code)
+    assert len(collector._bitmaps) == CODE_CACHE_SIZE
+    assert codes[0] not in collector._bitmaps
+    # evicted codes get their bitmaps back by hash.
+    assert collector.get_bitmaps(codes[0])[0] is bitmaps[0]
+    assert len(collector.executed) == CODE_CACHE_SIZE + 1
+
+
+def test_jumpi_stack_underflow():
+    def jumpi(computation):
+        raise InsufficientStack()
+
+    jumpi.mnemonic = 'JUMPI'
+    opcodes = CoverageCollector().make_opcodes({JUMPI: jumpi})
+    computation = SimpleNamespace(_stack=SimpleNamespace(values=[1]))
+    with pytest.raises(InsufficientStack):
+        opcodes[JUMPI](computation)
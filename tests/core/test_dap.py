@@ -0,0 +1,164 @@
+import asyncio
+import queue
+import threading
+
+import pytest
+
+from vdb.dap import (
+    GLOBALS_REF,
+    LOCALS_REF,
+    MEMORY_REF,
+    DebugAdapterClient,
+    DebugAdapterError,
+    DebugAdapterServer,
+    encode_message,
+    read_message,
+)
+
+
+code = """
+total: int128
+
+@public
+def loop(n: int128) -> int128:
+    s: int128 = 0
+    for i in range(10):
+        if i >= n:
+            break
+        s += i
+    self.total = s
+    return s
+"""
+
+
+def start_server(server, **kwargs):
+    ready = queue.Queue()
+    thread = threading.Thread(target=server.run, kwargs=dict(kwargs, ready=ready.put))
+    thread.start()
+    return thread, ready.get(timeout=10)
+
+
+def test_message_framing():
+    message = {'seq': 1, 'type': 'request', 'command': 'threads'}
+    loop = asyncio.new_event_loop()
+    reader = asyncio.StreamReader(loop=loop)
+    reader.feed_data(encode_message(message) * 2)
+    reader.feed_eof()
+    assert loop.run_until_complete(read_message(reader)) == message
+    assert loop.run_until_complete(read_message(reader)) == message
+    assert loop.run_until_complete(read_message(reader)) is None
+    loop.close()
+
+
+def test_breakpoints_and_stepping(tester, get_contract, debug_session):
+    c = get_contract(code)
+    server = DebugAdapterServer(
+        debug_session,
+        lambda: c.functions.loop(3).transact({'gas': 500000}),
+        source_path='loop.vy'
+    )
+    thread, address = start_server(server)
+
+    with DebugAdapterClient(address) as client:
+        assert client.request('initialize', adapterID='vdb')['supportsConfigurationDoneRequest']
+        client.wait_for_event('initialized')
+        breakpoints = client.request(
+            'setBreakpoints', source={'path': 'loop.vy'}, breakpoints=[{'line': 10}, {'line': 3}]
+        )['breakpoints']
+        assert [bp['verified'] for bp in breakpoints] == [True, False]
+        client.request('configurationDone')
+
+        assert client.wait_for_event('stopped')['reason'] == 'breakpoint'
+        frame, = client.request('stackTrace', threadId=1)['stackFrames']
+        assert (frame['name'], frame['line'], frame['source']['path']) == ('loop', 10, 'loop.vy')
+        scopes = client.request('scopes', frameId=frame['id'])['scopes']
+        assert [s['name'] for s in scopes] == ['Locals', 'Globals', 'Stack', 'Memory']
+        local_vars = client.request('variables', variablesReference=LOCALS_REF)['variables']
+        assert {v['name']: v['value'] for v in local_vars}['s'] == '0'
+        global_vars = client.request('variables', variablesReference=GLOBALS_REF)['variables']
+        assert global_vars == [
+            {'name': 'self.total', 'value': '0', 'type': 'int128', 'variablesReference': 0}
+        ]
+        words = client.request('variables', variablesReference=MEMORY_REF, start=0, count=2)
+        assert len(words['variables']) == 2
+
+        # Breakpoints hit on every loop iteration.
+        for _ in range(2):
+            client.request('continue', threadId=1)
+            assert client.wait_for_event('stopped')['reason'] == 'breakpoint'
+        assert client.request('evaluate', expression='s')['result'] == '1'
+
+        client.request('next', threadId=1)
+        assert client.wait_for_event('stopped')['reason'] == 'step'
+        frame, = client.request('stackTrace', threadId=1)['stackFrames']
+        assert frame['line'] == 7
+
+        client.request('setBreakpoints', source={'path': 'loop.vy'}, breakpoints=[])
+        client.request('continue', threadId=1)
+        assert client.wait_for_event('exited')['exitCode'] == 0
+        client.wait_for_event('terminated')
+        with pytest.raises(DebugAdapterError):
+            client.request('evaluate', expression='s')
+        client.request('disconnect')
+
+    thread.join(10)
+    assert not thread.is_alive()
+    state = tester.backend.chain.get_vm().state
+    assert state.account_db.get_storage(bytes.fromhex(c.address[2:]), 0) == 3  # self.total
+
+
+def test_invalid_hit_condition(get_contract, debug_session):
+    c = get_contract(code)
+    server = DebugAdapterServer(
+        debug_session,
+        lambda: c.functions.loop(3).transact({'gas': 500000}),
+        source_path='loop.vy'
+    )
+    thread, address = start_server(server)
+
+    with DebugAdapterClient(address) as client:
+        client.request('initialize', adapterID='vdb')
+        bp, = client.request(
+            'setBreakpoints',
+            source={'path': 'loop.vy'},
+            breakpoints=[{'line': 10, 'hitCondition': 'often'}]
+        )['breakpoints']
+        assert not bp['verified'] and 'often' in bp['message']
+        assert len(debug_session.breakpoints) == 0
+        client.request('configurationDone')
+
+        # runs to the end without stopping.
+        assert client.wait_for_event('exited')['exitCode'] == 0
+        assert not [e for e in client.events if e['event'] == 'stopped']
+        client.wait_for_event('terminated')
+        client.request('disconnect')
+
+    thread.join(10)
+    assert not thread.is_alive()
+
+
+def test_pause(get_contract, debug_session, tmpdir):
+    c = get_contract(code)
+    done = threading.Event()
+
+    def target():
+        while not done.is_set():
+            c.functions.loop(9).transact({'gas': 500000})
+
+    server = DebugAdapterServer(debug_session, target)
+    thread, address = start_server(server, path=str(tmpdir.join('vdb.sock')))
+
+    with DebugAdapterClient(address) as client:
+        client.request('initialize', adapterID='vdb')
+        client.request('configurationDone')
+        client.request('pause', threadId=1)
+        assert client.wait_for_event('stopped')['reason'] == 'pause'
+        frame, = client.request('stackTrace', threadId=1)['stackFrames']
+        assert frame['name'] == 'loop'
+        done.set()
+        client.request('continue', threadId=1)
+        client.wait_for_event('terminated')
+        client.request('disconnect')
+
+    thread.join(10)
+    assert not thread.is_alive()
@@ -0,0 +1,86 @@
+from concurrent.futures import ThreadPoolExecutor
+import io
+
+from eth.vm.forks.byzantium.computation import ByzantiumComputation
+from eth_tester import EthereumTester
+from web3 import Web3
+from web3.providers.eth_tester import EthereumTesterProvider
+
+from vdb.debug_computation import DebugSession
+from vdb.eth_tester_debug_backend import PyEVMDebugBackend
+from vdb.trace import TraceRecorder
+
+
+def test_passthrough_without_breakpoints(get_contract, debug_session):
+    code = """
+@public
+def test() -> int128:
+    a: int128 = 3
+    return a
+    """
+
+    c = get_contract(code)
+    debug_session.pc = -1
+    assert not debug_session.is_instrumented()
+    assert c.functions.test().call() == 3
+    assert debug_session.pc == -1  # instrumented loop never ran.
+
+
+def test_instrumented_with_breakpoints(get_contract, debug_session):
+    code = """
+@public
+def test() -> int128:
+    a: int128 = 3
+    vdb
+    return a
+    """
+
+    stdin = io.StringIO("continue\n")
+    stdout = io.StringIO()
+    c = get_contract(code, stdin=stdin, stdout=stdout)
+    debug_session.pc = -1
+    assert debug_session.is_instrumented()
+    assert c.functions.test().call() == 3
+    assert debug_session.pc != -1
+    assert '--> ' in stdout.getvalue()
+
+    debug_session.enable_debug = False
+    assert not debug_session.is_instrumented()
+
+
+def test_concurrent_sessions(tmpdir):
+    from tests.conftest import _get_contract, zero_gas_price_strategy
+    code = """
+@public
+def loop(n: int128) -> int128:
+    s: int128 = 0
+    for i in range(100):
+        if i >= n:
+            break
+        s += i
+    return s
+    """
+
+    def run(trace_path):
+        session = DebugSession()
+        w3 = Web3(EthereumTesterProvider(EthereumTester(PyEVMDebugBackend(session=session))))
+        w3.eth.setGasPriceStrategy(zero_gas_price_strategy)
+        c = _get_contract(w3, code)
+        if trace_path:
+            session.trace = TraceRecorder(trace_path)
+        results = [c.functions.loop(n).call({'gas': 500000}) for n in range(20)]
+        return session, results
+
+    path = str(tmpdir.join('loop.trace'))
+    with ThreadPoolExecutor(2) as pool:
+        traced, untraced = pool.map(run, [path, None])
+
+    assert traced[1] == untraced[1] == [sum(range(n)) for n in range(20)]
+    assert len(traced[0].trace) > 0
+    assert untraced[0].trace is None
+    assert traced[0].computation_class is not untraced[0].computation_class
+
+    # Opcode tables are per session.
+    traced[0].set_evm_opcode_pass()
+    assert traced[0].computation_class.opcodes is not ByzantiumComputation.opcodes
+    assert untraced[0].computation_class.opcodes == ByzantiumComputation.opcodes
@@ -0,0 +1,65 @@
+import os
+
+import vdb.source_map
+from vdb.cache import DebugInfoCache
+from vdb.source_map import produce_source_map
+
+
+code = """
+total: int128
+
+@public
+def func1(a: int128) -> int128:
+    b: int128 = 2
+    return a + b
+"""
+
+
+def test_cache_roundtrip(tmpdir):
+    cache = DebugInfoCache(str(tmpdir))
+    key = cache.make_key(code)
+    assert cache.get(key) is None
+
+    value = {'pc_pos_map': {1: (4, 0)}, 'breakpoints': [5]}
+    cache.set(key, value)
+    assert cache.get(key) == value
+
+
+def test_cache_key_depends_on_interfaces():
+    assert DebugInfoCache.make_key(code) != DebugInfoCache.make_key(
+        code, interface_codes={'Foo': {'type': 'vyper', 'code': 'x'}}
+    )
+
+
+def test_cache_lru_eviction(tmpdir):
+    cache = DebugInfoCache(str(tmpdir), max_size=0)
+    cache.set('a', {'x': 1})
+    assert os.listdir(str(tmpdir)) == []
+
+    cache = DebugInfoCache(str(tmpdir), max_size=10 ** 6)
+    cache.set('a', {'x': 1})
+    cache.set('b', {'x': 2})
+    os.utime(cache._entry_path('a'), (0, 0))  # make 'a' least recently used.
+    cache.max_size = os.path.getsize(cache._entry_path('b'))
+    cache.evict()
+    assert cache.get('a') is None
+    assert cache.get('b') == {'x': 2}
+
+
+def test_produce_debug_info_uses_cache(tmpdir, monkeypatch):
+    monkeypatch.setenv('VDB_CACHE_DIR', str(tmpdir))
+    monkeypatch.delenv('VDB_NO_CACHE', raising=False)
+
+    calls = []
+    orig_produce_debug_info = vdb.source_map._produce_debug_info
+
+    def counting_produce_debug_info(*args, **kwargs):
+        calls.append(args)
+        return orig_produce_debug_info(*args, **kwargs)
+
+    monkeypatch.setattr(vdb.source_map, '_produce_debug_info', counting_produce_debug_info)
+
+    cold = produce_source_map(code)
+    warm = produce_source_map(code)
+    assert len(calls) == 1
+    assert cold == warm
@@ -0,0 +1,89 @@
+import io
+from types import SimpleNamespace
+
+from eth.exceptions import OutOfGas
+from eth.vm.memory import Memory
+import pytest
+
+from vdb.display import DirtyTracker
+from vdb.watchpoints import (
+    CALLDATACOPY,
+    MEMORY_WRITES,
+    SSTORE,
+)
+
+
+code = """
+total: int128
+
+@public
+def foo(n: int128) -> int128:
+    s: int128 = n
+    vdb
+    s = s + 1
+    self.total = s
+    return s
+"""
+
+
+def test_display(get_contract):
+    steps = "stepi\n" * 32
+    stdin = io.StringIO("display\ndisplay on\n" + steps + "display off\nstepi\ncontinue\n")
+    stdout = io.StringIO()
+    c = get_contract(code, stdin=stdin, stdout=stdout)
+    assert c.functions.foo(41).call({'gas': 500000}) == 42
+
+    out = stdout.getvalue()
+    assert 'Auto-display is off.\n' in out
+    assert 'Auto-display is on.\n' in out
+    assert 'vdb\x1b[0m> Auto-display is off.\n' in out
+    assert 'Pushed: 0x60\n' in out
+    assert 'Popped: 0x60\nPushed: 0x{}80{}\n'.format('ff' * 16, '00' * 15) in out
+    # s = s + 1
+    assert 'mem[0x160] 0x{}29 -> 0x{}2a\n'.format('00' * 31, '00' * 31) in out
+    # self.total = s
+    assert 'self.total: 0 -> 42\n' in out
+    assert out.count('mem[') == 1
+    after_off = out.split('vdb\x1b[0m> Auto-display is off.\n')[-1]
+    assert 'Pushed' not in after_off and 'Popped' not in after_off
+
+
+def test_dirty_memory_range():
+    def calldatacopy(computation):
+        values = computation._stack.values
+        start, size = values[-1], values[-3]
+        del values[-3:]
+        if start + size > 0x1000:
+            raise OutOfGas()
+        data = computation._memory._bytes
+        data.extend(bytes(max(0, start + size - len(data))))
+        data[start:start + size] = b'\1' * size
+
+    calldatacopy.mnemonic = 'CALLDATACOPY'
+    tracker = DirtyTracker()
+    opcodes = {opcode: calldatacopy for opcode in [SSTORE] + list(MEMORY_WRITES)}
+    opcodes = tracker.make_opcodes(opcodes)
+    computation = SimpleNamespace(
+        _stack=SimpleNamespace(values=[]),
+        _memory=Memory(),
+    )
+    computation._memory.extend(0, 0x40)
+    tracker.reset(computation)
+
+    # size, data offset, memory offset: memory grows from 0x40 to 0x60 bytes.
+    computation._stack.values = [0x20, 0, 0x30]
+    opcodes[CALLDATACOPY](computation)
+    computation._stack.values = [0x10, 0, 0x50]
+    opcodes[CALLDATACOPY](computation)
+    zero, ones = bytes(32), b'\1' * 32
+    assert tracker.get_memory_changes(computation) == [
+        (0x20, zero, bytes(16) + ones[:16]),
+        (0x40, zero, ones),
+    ]
+
+    # the words recorded are bounded by the size of memory, not by the size written.
+    tracker.reset(computation)
+    computation._stack.values = [2 ** 255, 0, 0]
+    with pytest.raises(OutOfGas):
+        opcodes[CALLDATACOPY](computation)
+    assert len(tracker._memory[computation._memory][1]) == 3
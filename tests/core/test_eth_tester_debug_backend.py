@@ -0,0 +1,134 @@
+import pytest
+
+from eth_tester import EthereumTester
+from eth_tester.exceptions import SnapshotNotFound
+
+from vdb.eth_tester_debug_backend import (
+    OverlayDB,
+    PyEVMDebugBackend,
+)
+
+
+def test_reset_to_genesis(tester):
+    accounts = tester.get_accounts()
+    assert len(accounts) == 10
+    genesis_hash = tester.get_block_by_number(0)['hash']
+    balance = tester.get_balance(accounts[0])
+
+    tester.send_transaction({
+        'from': accounts[0], 'to': accounts[1], 'value': 1, 'gas': 21000, 'gas_price': 0
+    })
+    assert tester.get_block_by_number('latest')['number'] == 1
+    assert tester.get_balance(accounts[0]) == balance - 1
+
+    tester.reset_to_genesis()
+    assert tester.get_block_by_number('latest')['number'] == 0
+    assert tester.get_block_by_number(0)['hash'] == genesis_hash
+    assert tester.get_balance(accounts[0]) == balance
+
+    # Other backends start from the same genesis and don't share state.
+    other = EthereumTester(backend=PyEVMDebugBackend())
+    assert other.get_block_by_number(0)['hash'] == genesis_hash
+    other.send_transaction({
+        'from': accounts[0], 'to': accounts[1], 'value': 1, 'gas': 21000, 'gas_price': 0
+    })
+    assert tester.get_block_by_number('latest')['number'] == 0
+
+
+def test_reset_to_genesis_arguments():
+    backend = PyEVMDebugBackend()
+    backend.reset_to_genesis(num_accounts=3)
+    assert len(backend.get_accounts()) == 3
+
+    genesis_params = backend._generate_genesis_params({'gas_limit': 5000000})
+    backend.reset_to_genesis(genesis_params=genesis_params)
+    assert backend.get_block_by_number(0)['gas_limit'] == 5000000
+
+    address = backend.get_accounts()[0]
+    genesis_state = {
+        address: {'balance': 12345, 'nonce': 0, 'code': b'', 'storage': {}},
+    }
+    backend = PyEVMDebugBackend(genesis_state=genesis_state)
+    assert backend.get_accounts() == (address, )
+    assert backend.get_balance(address) == 12345
+
+
+def test_named_snapshots(tester):
+    backend = tester.backend
+    accounts = tester.get_accounts()
+    transaction = {
+        'from': accounts[0], 'to': accounts[1], 'value': 1, 'gas': 21000, 'gas_price': 0
+    }
+    balance = tester.get_balance(accounts[1])
+
+    tester.send_transaction(transaction)
+    assert backend.take_snapshot('after deployment') == 'after deployment'
+    tester.send_transaction(transaction)
+    tester.send_transaction(transaction)
+    assert tester.get_balance(accounts[1]) == balance + 3
+
+    backend.revert_to_snapshot('after deployment')
+    assert tester.get_block_by_number('latest')['number'] == 1
+    assert tester.get_balance(accounts[1]) == balance + 1
+
+    # A snapshot can be restored any number of times.
+    tester.send_transaction(transaction)
+    backend.revert_to_snapshot('after deployment')
+    assert tester.get_balance(accounts[1]) == balance + 1
+
+    # EthereumTester snapshots use the same mechanism.
+    snapshot_id = tester.take_snapshot()
+    tester.send_transaction(transaction)
+    tester.revert_to_snapshot(snapshot_id)
+    assert tester.get_balance(accounts[1]) == balance + 1
+
+    backend.delete_snapshot('after deployment')
+    with pytest.raises(SnapshotNotFound):
+        backend.revert_to_snapshot('after deployment')
+
+
+def test_snapshots_are_checkpoints(tester):
+    backend = tester.backend
+    accounts = tester.get_accounts()
+    transaction = {
+        'from': accounts[0], 'to': accounts[1], 'value': 1, 'gas': 21000, 'gas_price': 0
+    }
+    balance = tester.get_balance(accounts[1])
+
+    first = tester.take_snapshot()
+    tester.send_transaction(transaction)
+    second = tester.take_snapshot()
+    tester.send_transaction(transaction)
+    tester.revert_to_snapshot(first)
+    assert tester.get_balance(accounts[1]) == balance
+    # snapshots taken after the reverted one are dropped with their changes.
+    with pytest.raises(SnapshotNotFound):
+        tester.revert_to_snapshot(second)
+
+    # a snapshot per test, reverted at its end, does not add layers.
+    for _ in range(5):
+        snapshot = tester.take_snapshot()
+        tester.send_transaction(transaction)
+        tester.revert_to_snapshot(snapshot)
+    assert len(backend._db._layers) == 2
+    assert tester.get_balance(accounts[1]) == balance
+
+
+def test_overlay_db():
+    db = OverlayDB({b'a': b'1', b'b': b'2'})
+    db[b'c'] = b'3'
+    first = db.checkpoint()
+    del db[b'a']
+    db[b'b'] = b'4'
+    assert b'a' not in db and db[b'b'] == b'4'
+    with pytest.raises(KeyError):
+        del db[b'a']
+
+    second = db.checkpoint()
+    db[b'd'] = b'5'
+    db.discard(second)
+    assert db[b'd'] == b'5' and not db.has_checkpoint(second)
+
+    db.revert(first)
+    assert (db[b'a'], db[b'b'], db[b'c']) == (b'1', b'2', b'3')
+    assert b'd' not in db
@@ -1,4 +1,23 @@
+import subprocess
+import sys
 
 
 def test_import():
     import vdb  # noqa: F401
+
+
+def _get_imported_modules(module):
+    out = subprocess.check_output([
+        sys.executable, '-c', 'import sys, {}; print(" ".join(sys.modules))'.format(module)
+    ])
+    return set(out.decode().split())
+
+
+def test_lazy_imports():
+    # py-evm is loaded by the debug session, vyper to compile, eth_abi to decode values and
+    # the keccak backend of eth_hash (imported by eth_utils) to hash: not by vdb.vdb.
+    modules = _get_imported_modules('vdb.vdb')
+    assert not {'eth.vm', 'vyper', 'eth_abi', 'Crypto', 'sha3'} & modules
+    # vyper-run parses its arguments after importing vdb.defaults only.
+    modules = _get_imported_modules('vdb.defaults')
+    assert not {'eth_utils', 'vyper', 'web3'} & modules
@@ -0,0 +1,77 @@
+import io
+
+from vdb import vdb
+from vdb.memory import hexdump_lines
+from vdb.variables import print_var
+
+
+code = """
+@public
+def foo() -> bytes[100]:
+    s: bytes[100] = "hello world, this is vdb"
+    vdb
+    return s
+"""
+
+
+def test_hexdump_lines():
+    memory = bytearray(b'hello world, this is vdb' + bytes(100) + b'end')
+    lines = list(hexdump_lines(memoryview(memory), 0, 0x100))
+    assert lines == [
+        '00000000  68 65 6c 6c 6f 20 77 6f  72 6c 64 2c 20 74 68 69  |hello world, thi|',
+        '00000010  73 20 69 73 20 76 64 62  00 00 00 00 00 00 00 00  |s is vdb........|',
+        '00000020  00 00 00 00 00 00 00 00  00 00 00 00 00 00 00 00  |................|',
+        '*',
+        '00000070  00 00 00 00 00 00 00 00  00 00 00 00 65 6e 64     |............end|',
+    ]
+    assert list(hexdump_lines(memoryview(memory), 0x13, 2)) == [
+        '00000013  73 20{}|s |'.format(' ' * 45),
+    ]
+
+
+def test_print_memory_slice():
+    # raw memory slices of locals are bytearrays.
+    memory = bytearray(64)
+    memory[31] = 42
+    out = io.StringIO()
+    print_var(out, memory[:32], 'int128')
+    print_var(out, memory[:32], 'bool')
+    print_var(out, memory[32:], 'bytes32')
+    assert out.getvalue().splitlines() == ['42', 'True', str(bytes(32))]
+
+
+def test_x(get_contract, monkeypatch):
+    monkeypatch.setattr(vdb, 'DUMP_PAGE_SIZE', 0x100)
+    stdin = io.StringIO(
+        "x\n"
+        "x 0x150 0x20\n"
+        "x\n"
+        "hexdump 0 0x220\n"
+        "x\n"
+        "x\n"
+        "x 0x10000\n"
+        "s\n"
+        "continue\n"
+    )
+    stdout = io.StringIO()
+    c = get_contract(code, stdin=stdin, stdout=stdout)
+    assert c.functions.foo().call({'gas': 500000}) == b'hello world, this is vdb'
+
+    out = stdout.getvalue()
+    assert 'Usage: x <start> [<length>]\n' in out
+    assert (
+        '> 00000150  00 00 00 00 00 00 00 00  00 00 00 00 00 00 00 18  |................|\n'
+        '00000160  68 65 6c 6c 6f 20 77 6f  72 6c 64 2c 20 74 68 69  |hello world, thi|\n'
+        '\033[92mvdb\033[0m> 00000170  73 20 69 73 20 76 64 62  00 00 00 00 00 00 00 00'
+    ) in out
+    assert (
+        '000000f0  00 00 00 00 00 00 00 00  00 00 00 00 00 00 00 00  |................|\n'
+        '(288 more bytes, x to continue)\n'
+        '\033[92mvdb\033[0m> 00000100  00 00 00 00 00 00 00 00  00 00 00 00 00 00 00 00'
+        '  |................|\n*\n'
+    ) in out
+    assert '(32 more bytes, x to continue)\n' in out
+    assert '00000210  00 00 00 00 00 00 00 00  00 00 00 00 00 00 00 18  |................|\n' \
+        '\033[92mvdb\033[0m> Memory ends at 0x240.\n' in out
+    assert out.count('Memory ends at 0x240.') == 1
+    assert "b'hello world, this is vdb'" in out  # locals decoded through views.
@@ -0,0 +1,85 @@
+import io
+
+from vdb.preimages import PreimageIndex
+
+
+code = """
+balances: map(int128, uint256)
+names: map(bytes[10], int128)
+nested: map(int128, map(int128, int128))
+
+@public
+def set(key: int128, value: uint256, name: bytes[10]):
+    self.balances[key] = value
+    self.names[name] = key
+    self.nested[key][key + 1] = key * 2
+
+@public
+def show() -> uint256:
+    vdb
+    return self.balances[1]
+"""
+
+
+def test_keys_and_dump(get_contract, debug_session):
+    stdin = io.StringIO(
+        "keys self.balances\n"
+        "keys self.names\n"
+        "keys self.nested[-3]\n"
+        "self.balances\n"
+        "self.balances[1:]\n"
+        "dump\n"
+        "dump self.nested\n"
+    )
+    stdout = io.StringIO()
+    c = get_contract(code, stdin=stdin, stdout=stdout)
+    debug_session.record_preimages()
+    for key, value, name in ((1, 10, b'one'), (-3, 30, b'minus'), (2, 20, b'two')):
+        c.functions.set(key, value, name).transact({'gas': 500000})
+    c.functions.show().call({'gas': 500000})
+
+    out = stdout.getvalue()
+    assert '> -3\n1\n2\n' in out
+    assert "> b'minus'\nb'one'\nb'two'\n" in out
+    assert '> -2\n' in out
+    assert '> {-3: 30, 1: 10, 2: 20}\n' in out
+    assert '> [1] 10\n[2] 20\n' in out
+    assert "self.names = {b'minus': -3, b'one': 1, b'two': 2}\n" in out
+    assert '> {-3: {-2: -6}, 1: {2: 2}, 2: {3: 4}}\n' in out
+
+
+def test_keys_disabled(get_contract):
+    stdin = io.StringIO(
+        "keys self.balances\n"
+        "dump self.balances\n"
+        "keys on\n"
+        "keys self.names[1]\n"
+    )
+    stdout = io.StringIO()
+    c = get_contract(code, stdin=stdin, stdout=stdout)
+    c.functions.show().call({'gas': 500000})
+
+    out = stdout.getvalue()
+    assert 'Map keys are not recorded, enable with: keys on\n' in out
+    assert '<map, use [key]>\n' in out
+    assert 'Recording map keys.\n' in out
+    assert '*** self.names[1] is not a map.\n' in out
+
+
+def test_preimage_index_eviction():
+    index = PreimageIndex(max_entries=3)
+    slot = (5).to_bytes(32, 'big')
+    for digest, key in enumerate((b'\3', b'\1', b'\2')):
+        index.add(digest, slot + key.rjust(32, b'\0'))
+    assert index.get_map_keys(5) == [x.rjust(32, b'\0') for x in (b'\1', b'\2', b'\3')]
+
+    index.add(0, slot + b'\3'.rjust(32, b'\0'))  # recent again.
+    index.add(3, b'abc')
+    assert len(index) == 3
+    assert index.get(1) is None
+    assert index.get(3) == b'abc'
+    assert index.get_map_keys(5) == [x.rjust(32, b'\0') for x in (b'\2', b'\3')]
+    index.add(4, b'def')
+    index.add(5, b'ghi')
+    assert index.get_map_keys(5) == []
+    assert index._children == {}
@@ -0,0 +1,172 @@
+import io
+from types import SimpleNamespace
+
+from vdb.profiler import (
+    Profiler,
+    SamplingProfiler,
+)
+from vdb.source_map import (
+    find_function,
+    get_function_index,
+    produce_source_map,
+)
+
+
+code = """
+@public
+def loop(n: int128) -> int128:
+    s: int128 = 0
+    for i in range(100):
+        if i >= n:
+            break
+        s += i
+    return s
+
+@public
+def other() -> int128:
+    return 1
+"""
+
+
+def test_profile_lines_and_functions(get_contract, debug_session):
+    c = get_contract(code)
+    profiler = Profiler(produce_source_map(code))
+    debug_session.profiler = profiler
+    assert c.functions.loop(10).call({'gas': 500000}) == 45
+
+    line_stats = profiler.line_stats()
+    # loop body executes 10 times, the break only once.
+    assert line_stats[8][1] > line_stats[7][1] > 0
+    assert line_stats[7][0] > 0
+    function_stats = profiler.function_stats()
+    assert function_stats['loop'][0] > 0
+    assert 'other' not in function_stats
+
+    out = io.StringIO()
+    profiler.write_annotated_source(code, out)
+    assert '        s += i' in out.getvalue()
+
+    folded = io.StringIO()
+    profiler.write_collapsed_stacks(folded)
+    lines = folded.getvalue().splitlines()
+    assert any(line.startswith('loop;loop:8 ') for line in lines)
+    assert all(int(line.rsplit(' ', 1)[1]) > 0 for line in lines)
+    # the dispatcher of the default source is left out.
+    assert not any('unknown' in line or 'None' in line for line in lines)
+
+
+def test_function_names_match_function_index():
+    # the end of `a` is the start of `b`.
+    source_map = {'locals': {
+        'a': {'from_lineno': 2, 'to_lineno': 6}, 'b': {'from_lineno': 6, 'to_lineno': 9},
+    }}
+    profiler = Profiler(source_map)
+    index = get_function_index(source_map)
+    for line_no in (None, 1, 2, 6, 7, 9, 10):
+        assert profiler.get_fn_name(line_no) == find_function(index, line_no)
+    assert profiler.get_fn_name(6) == 'a'
+
+
+def test_sampling_every_opcodes(get_contract, debug_session):
+    c = get_contract(code)
+    source_map = produce_source_map(code)
+    exact = Profiler(source_map)
+    debug_session.profiler = exact
+    c.functions.loop(50).call({'gas': 500000})
+
+    sampling = SamplingProfiler(source_map, every_opcodes=7)
+    debug_session.profiler = sampling
+    assert not debug_session.is_instrumented()
+    c.functions.loop(50).call({'gas': 500000})
+
+    exact_count = sum(x[1] for x in exact.function_stats().values())
+    sampled_count = sum(x[1] for x in sampling.function_stats().values())
+    # every sample counts for 7 opcodes.
+    assert sampled_count % 7 == 0 and abs(sampled_count - exact_count) < 7
+    assert set(sampling.line_stats()) <= set(exact.line_stats())
+    assert sampling._active == []
+
+
+store_code = """
+total: int128
+values: int128[10]
+
+@public
+def store(n: int128) -> int128:
+    s: int128 = n
+    for i in range(10):
+        s += i
+    self.values[n] = s
+    return s
+"""
+
+
+def test_sampling_charges_sampled_line(get_contract, debug_session):
+    c = get_contract(store_code)
+    profiler = SamplingProfiler(produce_source_map(store_code), every_opcodes=5)
+    debug_session.profiler = profiler
+    for n in range(10):
+        c.functions.store(n).transact({'gas': 100000})
+
+    # the SSTOREs of line 10 are charged to line 10, not to the line sampled before them.
+    line_stats = profiler.line_stats()
+    assert max(line_stats, key=lambda line_no: line_stats[line_no][0]) == 10
+
+
+def test_sampling_interval(get_contract, debug_session):
+    c = get_contract(code)
+    source_map = produce_source_map(code)
+    exact = Profiler(source_map)
+    debug_session.profiler = exact
+    c.functions.loop(99).call({'gas': 500000})
+
+    profiler = SamplingProfiler(source_map, interval=0.001)
+    debug_session.profiler = profiler
+    assert not debug_session.is_instrumented()
+    with profiler:
+        c.functions.loop(99).call({'gas': 500000})
+
+    # every opcode and all gas is charged, to the lines of the samples.
+    exact_fns = exact.function_stats()
+    sampled_fns = profiler.function_stats()
+    assert sum(x[1] for x in sampled_fns.values()) == sum(x[1] for x in exact_fns.values())
+    assert sum(x[0] for x in sampled_fns.values()) == sum(x[0] for x in exact_fns.values())
+    assert set(profiler.line_stats()) <= set(exact.line_stats())
+    assert profiler._active == []
+
+
+class FakeComputation:
+
+    def __init__(self, gas):
+        self.msg = SimpleNamespace(gas=gas)
+        self.code = SimpleNamespace(pc=0)
+        self._gas_meter = SimpleNamespace(gas_remaining=gas)
+
+    def get_opcode_fn(self, opcode):
+        return None
+
+    def get_gas_remaining(self):
+        return self._gas_meter.gas_remaining
+
+    def run(self, pc, gas_remaining):
+        # the stock loop: reads the opcode at `pc`, runs it.
+        self.get_opcode_fn(0)
+        self.code.pc = pc + 1
+        self._gas_meter.gas_remaining = gas_remaining
+
+
+def test_sampling_interval_charges_running_line():
+    profiler = SamplingProfiler({}, interval=1)
+    computation = FakeComputation(1000)
+    profiler.enter_computation(computation, [None, 1, 2, 2])
+
+    computation.run(1, 997)  # line 1
+    computation.run(2, 900)  # line 2, long running.
+    profiler._sample()
+    assert {line_no: stat[:2] for line_no, stat in profiler.line_stats().items()} == {
+        2: [100, 2]
+    }
+
+    computation.run(3, 500)  # line 2
+    profiler.exit_computation(computation)
+    assert profiler.line_stats()[2][:2] == [500, 3]
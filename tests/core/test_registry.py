@@ -0,0 +1,108 @@
+import io
+
+from vdb.profiler import Profiler
+from vdb.registry import (
+    CODE_CACHE_SIZE,
+    DebugInfoRegistry,
+)
+from vdb.source_map import produce_debug_info
+
+
+callee_code = """
+calls: int128
+
+@public
+def double(x: int128) -> int128:
+    y: int128 = x * 2
+    self.calls += 1
+    vdb
+    return y
+"""
+
+caller_code = """
+contract Callee():
+    def double(x: int128) -> int128: modifying
+
+total: int128
+
+@public
+def run(callee: address, x: int128) -> int128:
+    self.total = Callee(callee).double(x) + 1
+    return self.total
+"""
+
+counter_code = """
+count: int128
+
+@public
+def __init__(start: int128):
+    self.count = start
+
+@public
+def increase() -> int128:
+    self.count += 1
+    return self.count
+"""
+
+
+def test_nested_call(get_contract, debug_session):
+    stdin = io.StringIO('y\nself.calls\ncontinue\n')
+    stdout = io.StringIO()
+    callee = get_contract(callee_code)
+    caller = get_contract(caller_code, stdin=stdin, stdout=stdout)
+    contract = debug_session.register_contract(
+        callee_code, produce_debug_info(callee_code), name='callee'
+    )
+    assert debug_session.get_contract(bytes(caller.web3.eth.getCode(callee.address))) is contract
+    assert debug_session.get_contract(bytes(caller.web3.eth.getCode(caller.address))) is None
+
+    profiler = debug_session.profiler = Profiler(debug_session.source_map)
+    caller.functions.run(callee.address, 20).transact({'gas': 200000})
+    debug_session.profiler = None
+    assert caller.functions.run(callee.address, 20).call() == 41
+
+    # stopped at the vdb statement of the callee, its source and variables.
+    out = stdout.getvalue()
+    assert '--> \033[92m9\033[0m\t    return y\n' in out
+    assert out.count('40\n') == 1 and out.count('1\n') == 1
+
+    function_stats = profiler.function_stats()
+    assert function_stats['run'][0] > 0
+    assert function_stats['callee.double'][0] > 0
+    stacks = [line.rsplit(' ', 1)[0] for line in _collapsed(profiler).splitlines()]
+    assert any(key.startswith('run;run:9;callee.double;callee.double:') for key in stacks)
+    # the dispatcher of the callee is labelled with its name.
+    assert 'run;run:9;callee' in stacks
+
+
+def _collapsed(profiler):
+    out = io.StringIO()
+    profiler.write_collapsed_stacks(out)
+    return out.getvalue()
+
+
+def test_constructor(get_contract, debug_session):
+    debug_info = produce_debug_info(counter_code)
+    contract = debug_session.register_contract(counter_code, debug_info, name='counter')
+    init_code = bytes.fromhex(debug_info['bytecode'][2:])
+    constructor = debug_session.get_contract(init_code + (7).to_bytes(32, 'big'))
+    assert constructor.name == 'counter' and constructor is not contract
+    assert 6 in constructor.lookup.pc_lines  # self.count = start
+
+    # deployment is profiled with the lines of the constructor.
+    profiler = debug_session.profiler = Profiler(debug_session.source_map)
+    c = get_contract(counter_code, 7)
+    debug_session.profiler = None
+    assert c.functions.increase().call() == 8
+    assert profiler.line_stats()[('counter', 6)][0] > 0
+
+
+def test_code_cache():
+    registry = DebugInfoRegistry()
+    contract = registry.register(callee_code, produce_debug_info(callee_code))
+    codes = [i.to_bytes(2, 'big') for i in range(CODE_CACHE_SIZE + 1)]
+    for code in codes:
+        assert registry.get(code) is None
+    assert len(registry._by_code) == CODE_CACHE_SIZE and codes[0] not in registry._by_code
+    code = bytes.fromhex(produce_debug_info(callee_code)['bytecode_runtime'][2:])
+    assert registry.get(code) is contract
@@ -1,4 +1,15 @@
-from vdb.source_map import produce_source_map
+from vdb.source_map import (
+    LINE_BREAKPOINT,
+    PC_BREAKPOINT,
+    USER_BREAKPOINT,
+    SourceMapLookup,
+    find_function,
+    get_function_index,
+    get_line_offsets,
+    get_source_lines,
+    produce_debug_info,
+    produce_source_map,
+)
 
 
 def test_source_map_output():
@@ -23,7 +34,8 @@ def func2(a: int128):
     assert sm['globals']['a_map'] == {
         'type': 'map(bytes32, bytes32)',
         'size': 0,
-        'position': 0
+        'position': 0,
+        'layout': {'kind': 'map', 'keytype': 'bytes32', 'valuetype': 'bytes32'},
     }
 
     # locals
@@ -37,3 +49,116 @@ def func2(a: int128):
             'g': {'type': 'bytes[10]', 'size': 96, 'position': 416}
         },
     }
+
+
+def test_debug_info_matches_compiler():
+    from vyper import compile_code
+    from vyper.compiler import get_source_map
+
+    code = """
+struct Point:
+    x: int128
+    y: int128
+
+Transfer: event({_from: indexed(address), _value: uint256})
+
+owner: address
+points: map(int128, Point)
+
+@public
+def __init__():
+    self.owner = msg.sender
+
+@public
+def set_point(idx: int128, x: int128, y: int128 = 3):
+    self.points[idx] = Point({x: x, y: y})
+    log.Transfer(msg.sender, 1)
+
+@public
+@constant
+def get_x(idx: int128) -> int128:
+    return self.points[idx].x
+    """
+
+    debug_info = produce_debug_info(code)
+    compiler_output = compile_code(code, ['abi', 'bytecode', 'bytecode_runtime'])
+
+    assert debug_info['abi'] == compiler_output['abi']
+    assert debug_info['bytecode'] == compiler_output['bytecode']
+    assert debug_info['bytecode_runtime'] == compiler_output['bytecode_runtime']
+    line_number_map = debug_info['source_map']['line_number_map']
+    assert line_number_map['pc_pos_map'] == get_source_map(code, '')['pc_pos_map']
+    assert set(debug_info['source_map']['locals']) == {'set_point', 'get_x'}
+
+
+def test_source_map_lookup():
+    source_map = {
+        'line_number_map': {
+            'breakpoints': [3],
+            'pc_breakpoints': [7],
+            'pc_pos_map': {0: (2, 4), 2: (3, 4), 5: (3, 8)},
+        }
+    }
+    lookup = SourceMapLookup(source_map)
+
+    assert lookup.get_line_no(2) == 3
+    assert lookup.get_line_no(1) is None
+    assert lookup.get_line_no(100) is None
+    assert lookup.get_pos(5) == (3, 8)
+
+    breakpoints = lookup.get_breakpoints(20)
+    assert len(breakpoints) >= 20
+    assert [pc for pc, flag in enumerate(breakpoints) if flag & LINE_BREAKPOINT] == [2, 5]
+    assert [pc for pc, flag in enumerate(breakpoints) if flag & PC_BREAKPOINT] == [7]
+
+
+def test_source_map_lookup_line_breakpoints():
+    source_map = {
+        'line_number_map': {
+            'breakpoints': [],
+            'pc_pos_map': {0: (2, 4), 1: (3, 4), 3: (3, 8), 5: (2, 4), 6: (4, 4)},
+        }
+    }
+    lookup = SourceMapLookup(source_map)
+    assert not lookup.has_breakpoints
+    assert lookup.get_line_starts() == {2: [0, 5], 3: [1], 4: [6]}
+
+    assert lookup.set_line_breakpoints([2, 9]) == {2}
+    assert lookup.has_breakpoints
+    assert [pc for pc, flag in enumerate(lookup.breakpoints) if flag & USER_BREAKPOINT] == [0, 5]
+
+    lookup.set_line_breakpoints([])
+    assert not lookup.has_breakpoints
+
+
+def test_function_index():
+    code = """
+total: int128
+
+@public
+def a() -> int128:
+    return 1
+
+@public
+def b() -> int128:
+    x: int128 = 2
+    return x
+"""
+    sm = produce_source_map(code)
+    assert sm['function_index'] == {'starts': [4, 8], 'ends': [8, 11], 'names': ['a', 'b']}
+    index = sm['function_index']
+    assert [find_function(index, line_no) for line_no in (1, 3, 4, 6, 8, 9, 11, 12)] == [
+        None, None, 'a', 'a', 'a', 'b', 'b', None
+    ]
+    # source maps without index.
+    assert get_function_index({'locals': sm['locals']}) == index
+    assert get_function_index({}) == {'starts': [], 'ends': [], 'names': []}
+
+    assert sm['line_offsets'] == get_line_offsets(code)
+    assert list(get_source_lines(code, sm['line_offsets'], 9, 11)) == [
+        (9, 'def b() -> int128:'), (10, '    x: int128 = 2'), (11, '    return x'),
+    ]
+    assert list(get_source_lines(code, sm['line_offsets'], 0, 1)) == [(1, '')]
+    assert list(get_source_lines(code, sm['line_offsets'], 11, 12)) == [(11, '    return x')]
+    # offsets of another source.
+    assert list(get_source_lines('a\nb\n', sm['line_offsets'], 2, 3)) == [(2, 'b')]
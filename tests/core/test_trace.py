@@ -0,0 +1,51 @@
+import pytest
+
+from vdb.trace import (
+    TraceRecorder,
+    iter_trace_chunks,
+    read_trace,
+)
+
+
+def test_trace_file_roundtrip(tmpdir):
+    path = str(tmpdir.join('test.trace'))
+    with TraceRecorder(path, chunk_size=2) as recorder:
+        recorder.record(0, 0x60, 100, 0, 0, 0, 4)
+        recorder.record(2, 0x60, 97, 1, 0, 0, 4)
+        recorder.record(4, 0x01, 94, 2, 32, 1, 0)
+    assert len(recorder) == 3
+
+    chunks = list(iter_trace_chunks(path))
+    assert [count for _, count, _ in chunks] == [2, 1]
+
+    np = pytest.importorskip('numpy')
+    trace = read_trace(path)
+    assert trace['pc'].tolist() == [0, 2, 4]
+    assert trace['gas_remaining'].tolist() == [100, 97, 94]
+    assert trace['stack_depth'].tolist() == [0, 1, 2]
+    assert trace['line_no'].tolist() == [4, 4, 0]
+    assert trace['depth'].dtype == np.uint16
+
+
+def test_trace_transaction(get_contract, tmpdir, debug_session):
+    code = """
+@public
+def loop() -> int128:
+    s: int128 = 0
+    for i in range(10):
+        s += i
+    return s
+    """
+
+    c = get_contract(code)
+    path = str(tmpdir.join('loop.trace'))
+    recorder = TraceRecorder(path)
+    debug_session.trace = recorder
+    assert c.functions.loop().call() == 45
+    recorder.close()
+
+    pytest.importorskip('numpy')
+    trace = read_trace(path)
+    assert len(trace['pc']) == len(recorder) > 0
+    assert set(trace['line_no'].tolist()) >= {4, 5, 6, 7}
+    assert trace['stack_depth'].max() > 0
@@ -0,0 +1,95 @@
+import json
+import os
+import subprocess
+import sys
+
+from vdb.trace import iter_trace_chunks
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+VYPER_RUN = os.path.join(ROOT, 'bin', 'vyper-run')
+
+code = """
+counter: public(int128)
+
+@public
+def increase(x: int128) -> int128:
+    self.counter += x
+    return self.counter
+
+@public
+def fail(x: int128) -> int128:
+    self.counter += x
+    assert x > 100
+    return x
+"""
+
+
+def _vyper_run(tmpdir, *args):
+    path = tmpdir.join('counter.vy')
+    path.write(code)
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+    return subprocess.run(
+        [sys.executable, VYPER_RUN, str(path)] + list(args),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env=env,
+        universal_newlines=True,
+    )
+
+
+def _returns(stdout):
+    lines = stdout.splitlines()
+    return [lines[i + 1] for i, line in enumerate(lines) if line == '- Returns:']
+
+
+def test_calls_execute_once(tmpdir):
+    proc = _vyper_run(tmpdir, 'increase(1);counter;increase(1);counter')
+    assert proc.returncode == 0, proc.stderr
+    # every call is a single transaction, its return value decoded from the computation.
+    assert _returns(proc.stdout) == ["'1'", "'1'", "'2'", "'2'"]
+
+
+def test_reverting_call(tmpdir):
+    proc = _vyper_run(tmpdir, 'increase(1);fail(3);counter')
+    assert proc.returncode != 0
+    assert proc.stdout.endswith('* Calling fail(3)\n')
+    assert 'TransactionFailed' in proc.stderr
+
+    # batch mode records the error and goes on, the writes of the failed call are reverted.
+    script = tmpdir.join('script.vdb')
+    script.write('')
+    proc = _vyper_run(tmpdir, 'increase(1);fail(3);counter', '--batch', str(script))
+    assert proc.returncode == 0, proc.stderr
+    records = [json.loads(line) for line in proc.stdout.splitlines()]
+    assert [(r['function'], r.get('returns')) for r in records] == [
+        ('increase', 1), ('fail', None), ('counter', 1)
+    ]
+    assert 'error' in records[1]
+
+
+def test_trace_of_failing_call(tmpdir):
+    path = str(tmpdir.join('run.trace'))
+    proc = _vyper_run(tmpdir, 'increase(1);fail(3)', '--trace', path)
+    assert proc.returncode != 0
+    # the last chunk is written although the run failed.
+    assert sum(count for _, count, _ in iter_trace_chunks(path)) > 0
+
+
+def test_parallel(tmpdir):
+    calls = ['increase(1)', 'increase(2)', 'counter', 'increase(3)']
+    parallel = _vyper_run(tmpdir, ';'.join(calls), '-j', '2')
+    assert parallel.returncode == 0, parallel.stderr
+
+    # in input order, every call from the post-deployment state.
+    serial = [_vyper_run(tmpdir, call) for call in calls]
+    assert parallel.stdout == ''.join(proc.stdout for proc in serial)
+    assert _returns(parallel.stdout) == ["'1'", "'2'", "'0'", "'3'"]
+
+
+def test_parallel_failing_call(tmpdir):
+    proc = _vyper_run(tmpdir, 'increase(1);fail(3);increase(2)', '-j', '2')
+    assert proc.returncode != 0
+    assert proc.stdout.endswith('* Calling fail(3)\n')
+    assert 'TransactionFailed' in proc.stderr
@@ -0,0 +1,143 @@
+import io
+from types import SimpleNamespace
+
+from eth.exceptions import InsufficientStack
+import pytest
+
+from vdb.watchpoints import (
+    CALL,
+    MEMORY_WRITES,
+    MSTORE,
+    SSTORE,
+    WatchpointTable,
+)
+
+
+code = """
+total: int128
+balances: map(bytes32, int128)
+
+@public
+def loop(n: int128, key: bytes32) -> int128:
+    s: int128 = 0
+    vdb
+    for i in range(1000):
+        if i >= n:
+            break
+        s += i
+        self.balances[key] = s
+    self.total = s
+    return s
+"""
+
+
+def test_watch_storage(get_contract):
+    stdin = io.StringIO(
+        "watch self.total\n"
+        "watch self.balances[one]\n"
+        "continue\n"
+        "continue\n"
+        "unwatch 2\n"
+        "watch\n"
+        "continue\n"
+        "unwatch\n"
+        "continue\n"
+    )
+    stdout = io.StringIO()
+    c = get_contract(code, stdin=stdin, stdout=stdout)
+    assert c.functions.loop(3, b'one').call({'gas': 500000}) == 3
+
+    out = stdout.getvalue()
+    assert 'Watchpoint 1: self.total\n' in out
+    assert 'Watchpoint 2: self.balances[one]\n' in out
+    assert 'Watchpoint 2: self.balances[one]\nOld value = 0\nNew value = 0\n' in out
+    assert 'Old value = 0\nNew value = 1\n' in out
+    assert 'Num\tHits\tWhat\n1\t0\tself.total\n' in out
+    assert 'Watchpoint 1: self.total\nOld value = 0\nNew value = 3\n' in out
+    assert out.count('Old value') == 3
+
+
+def test_watch_memory(get_contract, debug_session):
+    stdin = io.StringIO(
+        "watch mem 0x180 -1\n"
+        "watch self.foo\n"
+        "watch mem 0x180 0x20\n"  # s
+        "continue\n"
+        "continue\n"
+        "unwatch\n"
+        "continue\n"
+    )
+    stdout = io.StringIO()
+    c = get_contract(code, stdin=stdin, stdout=stdout)
+    c.functions.loop(3, b'one').call({'gas': 500000})
+
+    out = stdout.getvalue()
+    assert '*** Watched memory size must be positive.' in out
+    assert '*** Global named "foo" not found.' in out
+    assert 'Watchpoint 1: mem[0x180:0x1a0]\nOld value = 0x{}\nNew value = 0x{}\n'.format(
+        '00' * 32, '00' * 31 + '01'
+    ) in out
+    assert debug_session.watchpoints.hits == []
+    assert len(debug_session.watchpoints) == 0
+
+
+def test_watchpoint_table_intervals():
+    table = WatchpointTable()
+    table.add_memory(0x40, 0x20)
+    table.add_memory(0x50, 0x20)
+    table.add_memory(0x100, 1)
+    assert (table._starts, table._ends) == ([0x40, 0x100], [0x70, 0x101])
+    assert table.watches_memory(0x20, 0x21)
+    assert not table.watches_memory(0x20, 0x20)
+    assert table.watches_memory(0x6f, 1)
+    assert not table.watches_memory(0x70, 0x90)
+    assert table.watches_memory(0, 0x1000)
+    assert not table.watches_memory(0x100, 0)
+    table.delete(1)
+    assert (table._starts, table._ends) == ([0x50, 0x100], [0x70, 0x101])
+    table.clear()
+    assert not table.watches_memory(0, 0x1000)
+
+
+def test_write_hits():
+    table = WatchpointTable()
+    wp = table.add_memory(0, 0x100)
+    table.hits.append((wp, b'\0' * 0x100, b'\0' * 0x80 + b'\1' * 0x80))
+    stdout = io.StringIO()
+    table.write_hits(stdout)
+    assert stdout.getvalue() == (
+        'Watchpoint 1: mem[0x0:0x100]\nChanged from 0x80\nOld value = 0x{}\nNew value = 0x{}\n'
+    ).format('00' * 64, '01' * 64)
+    assert table.hits == []
+
+
+def test_memory_write_opcodes():
+    def call(computation):
+        # pops the 7 arguments, writes 2 bytes of return data at the output offset.
+        del computation._stack.values[-7:]
+        computation._memory._bytes[0x41:0x43] = b'\1\2'
+
+    def underflow(computation):
+        raise InsufficientStack()
+
+    opcodes = {opcode: underflow for opcode in [SSTORE] + list(MEMORY_WRITES)}
+    opcodes[CALL] = call
+    for opcode_fn in opcodes.values():
+        opcode_fn.mnemonic = 'OPCODE'
+    table = WatchpointTable()
+    table.add_memory(0x40, 0x20)
+    hits = []
+    opcodes = table.make_opcodes(opcodes, hits.append)
+
+    # CALL out size, out offset, in size, in offset, value, to, gas.
+    computation = SimpleNamespace(
+        _stack=SimpleNamespace(values=[2, 0x41, 0, 0, 0, 0, 0]),
+        _memory=SimpleNamespace(_bytes=bytearray(0x60)),
+    )
+    opcodes[CALL](computation)
+    assert hits == [computation]
+    assert table.hits[0][2] == b'\0\1\2'.ljust(0x20, b'\0')
+
+    # stack underflows are left to the opcode.
+    with pytest.raises(InsufficientStack):
+        opcodes[MSTORE](computation)
@@ -0,0 +1,93 @@
+import io
+
+from vdb.source_map import produce_source_map
+
+
+code = """
+struct Point:
+    x: int128
+    y: decimal
+    name: bytes[40]
+
+points: Point[3]
+big: uint256[1000]
+owners: map(int128, map(address, Point))
+
+@public
+def set(a: int128[4]) -> int128:
+    p: Point = Point({x: -1, y: 2.5, name: "origin"})
+    self.points[1] = p
+    self.big[1] = 3
+    self.big[999] = 7
+    self.owners[5][msg.sender] = Point({x: 9, y: -0.5, name: "m"})
+    vdb
+    return 1
+"""
+
+
+def test_layout():
+    points = produce_source_map(code)['globals']['points']
+    assert points['layout'] == {
+        'kind': 'list',
+        'count': 3,
+        'subtype': {
+            'kind': 'struct',
+            'name': 'Point',
+            'members': [['x', 'int128'], ['y', 'decimal'], ['name', 'bytes[40]']],
+        },
+    }
+
+
+def test_print_aggregates(w3, get_contract):
+    sender = w3.eth.accounts[0]
+    stdin = io.StringIO(
+        "p\n"
+        "a\n"
+        "a[1:3]\n"
+        "self.points\n"
+        "self.points[1].name\n"
+        "self.points[-2].y\n"
+        "self.big\n"
+        "self.big[997:]\n"
+        "self.owners[5]\n"
+        "self.owners[5][{}]\n".format(sender)
+    )
+    stdout = io.StringIO()
+    c = get_contract(code, stdin=stdin, stdout=stdout)
+    c.functions.set([1, 2, 3, 4]).transact({'gas': 2000000, 'from': sender})
+
+    out = stdout.getvalue()
+    assert "Point(x=-1, y=2.5, name=b'origin')\n" in out
+    assert '[1, 2, 3, 4]\n' in out
+    assert '[1] 2\n[2] 3\n' in out
+    assert "[Point(x=0, y=0, name=b''), Point(x=-1, y=2.5, name=b'origin'), " in out
+    assert "b'origin'\n" in out
+    assert '2.5\n' in out
+    assert '[0, 3, {}... (980 more)]\n'.format('0, ' * 18) in out
+    assert '[997] 0\n[998] 0\n[999] 7\n' in out
+    assert '<map, use [key]>\n' in out
+    assert "Point(x=9, y=-0.5, name=b'm')\n" in out
+
+
+def test_print_errors(get_contract):
+    stdin = io.StringIO(
+        "self.big[1000]\n"
+        "self.points.x\n"
+        "self.points[0].z\n"
+        "self.owners[1:2]\n"
+        "p.x[1]\n"
+        "watch self.owners[5]\n"
+        "watch self.points[1]\n"
+    )
+    stdout = io.StringIO()
+    c = get_contract(code, stdin=stdin, stdout=stdout)
+    c.functions.set([1, 2, 3, 4]).call({'gas': 2000000})
+
+    out = stdout.getvalue()
+    assert 'Index 1000 out of range.\n' in out
+    assert 'Invalid index "x".\n' in out
+    assert 'No member named "z".\n' in out
+    assert 'Only lists, structs, tuples and recorded maps can be paged.\n' in out
+    assert 'Can not get "1" of a int.\n' in out
+    assert '*** Maps have no fixed slots, use [key].\n' in out
+    assert 'Watchpoint 1: self.points[1]\n' in out
@@ -1,5 +1,14 @@
 import io
 
+from eth_hash.auto import keccak
+
+from vdb.storage import StorageReader
+from vdb.variables import (
+    get_hash,
+    read_global,
+)
+from vdb.vdb import VyperDebugCmd
+
 
 def test_single_key(get_contract, get_last_out):
     code = """
@@ -54,3 +63,68 @@ def get(key1: bytes32, key2: bytes32) -> bytes32:
 
     assert res[:6] == b'hello!'
     assert 'hello!' in stdout.getvalue()
+
+
+def test_long_bytes(get_contract):
+    code = """
+data: bytes[1024]
+
+@public
+def set(value: bytes[1024]) -> int128:
+    self.data = value
+    vdb
+    return len(self.data)
+    """
+
+    stdin = io.StringIO(
+        "self.data\n"
+        "self.data\n"
+    )
+    stdout = io.StringIO()
+    c = get_contract(code, stdin=stdin, stdout=stdout)
+    value = b'\0\1' + bytes(range(256)) * 3
+    c.functions.set(value).transact({'gas': 2000000})
+
+    out = stdout.getvalue().splitlines()
+    # slots starting with zero bytes are not truncated.
+    assert out[-2].split(VyperDebugCmd.prompt)[1] == str(value)
+    assert out[-3].split(VyperDebugCmd.prompt)[1] == str(value)
+
+
+def test_storage_reader(get_contract, debug_session):
+    code = """
+amap: map(bytes32, map(bytes32, bytes32))
+
+@public
+def set(key1: bytes32, key2: bytes32, value: bytes32) -> bytes32:
+    self.amap[key1][key2] = value
+    return self.amap[key1][key2]
+    """
+
+    results = []
+
+    def debugger(computation, line_no):
+        storage = StorageReader.from_computation(computation)
+        global_vars = debug_session.source_map['globals']
+        results.append(read_global(global_vars, computation, 'amap', ['one', 'two'], storage))
+        slot = get_hash(0, ['one', 'two'], '')
+        results.append(storage.read_range(slot - 1, 3))
+        results.append(slot in storage._values)
+
+    c = get_contract(code)
+    debug_session.debugger = debugger
+    debug_session.add_breakpoint(7)
+    c.functions.set(b'one', b'two', b'hello!').transact({'gas': 500000})
+
+    (value, value_type), buffer, cached = results
+    assert value_type == 'bytes32'
+    assert value == int.from_bytes(b'hello!'.ljust(32, b'\0'), 'big')
+    assert buffer == b'\0' * 32 + b'hello!'.ljust(32, b'\0') + b'\0' * 32
+    assert cached
+
+
+def test_get_hash():
+    outer = keccak(b'\0' * 32 + b'one'.ljust(32, b'\0'))
+    assert get_hash(0, ['one'], '') == int.from_bytes(outer, 'big')
+    inner = keccak(outer + b'two'.ljust(32, b'\0'))
+    assert get_hash(0, ['one', 'two'], '') == int.from_bytes(inner, 'big')
@@ -0,0 +1,225 @@
+import decimal
+import io
+import json
+import re
+
+from eth_utils import to_hex
+
+from vdb.decoders import Aggregate
+from vdb.variables import (
+    parse_global_name,
+    parse_var_name,
+    read_global_value,
+    read_local_value,
+)
+from vdb.vdb import VyperDebugCmd
+
+
+ANSI_RE = re.compile(r'\x1b\[[0-9;]*m')
+INTERACTIVE_COMMANDS = ('history', 'pdb', 'quit')  # not available in batch mode.
+
+
+def to_json(value):
+    """
+    Converts a decoded value to JSON types: aggregates in full, lists and tuples as arrays,
+    structs and maps as objects, bytes as hex strings and decimals as strings. Maps without
+    recorded keys are null.
+    """
+    if isinstance(value, Aggregate):
+        if value.kind == 'map' and value.location.preimages is None:
+            return None
+        items = value.items(0, len(value))
+        if value.kind in ('list', 'tuple'):
+            return [to_json(item) for _, item in items]
+        return {_to_json_key(key): to_json(item) for key, item in items}
+    elif isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    elif isinstance(value, dict):
+        return {_to_json_key(key): to_json(item) for key, item in value.items()}
+    elif isinstance(value, (bytes, bytearray)):
+        return to_hex(value)
+    elif isinstance(value, decimal.Decimal):
+        return str(value)
+    return value
+
+
+def _to_json_key(key):
+    key = to_json(key)
+    return key if isinstance(key, str) else str(key)
+
+
+def load_script(text):
+    """
+    Parses a batch script, returns the keyword arguments of BatchDebugger. Scripts are vdb
+    commands, one per line (blank lines and `#` comments are skipped), or a JSON object
+    {"breakpoints": [{"line": 12, "condition": "i == 3", "commands": [...]}, ...],
+    "commands": [...]}. Raises ValueError for invalid scripts.
+    """
+    if not text.lstrip().startswith('{'):
+        lines = (line.strip() for line in text.splitlines())
+        return {'commands': [line for line in lines if line and not line.startswith('#')]}
+    script = json.loads(text)
+    breakpoints = script.get('breakpoints', [])
+    for action in breakpoints:
+        if not isinstance(action.get('line'), int):
+            raise ValueError('Every breakpoint needs a line number: {}'.format(action))
+    return {'commands': script.get('commands', []), 'breakpoints': breakpoints}
+
+
+class BatchDebugger:
+    """
+    Debugger of a DebugSession running vdb commands without a prompt. Every stop and every
+    command writes a JSON Lines record to `output`:
+
+        {"event": "stop", "stop": 1, "reason": "breakpoint", "line": 12, "function": "foo",
+         "contract": null, "pc": 183, "depth": 0}
+        {"event": "command", "stop": 1, "command": "self.total", "output": "42\\n",
+         "value": 42}
+
+    Variables also have a "value", decoded to JSON (see to_json), failed commands an
+    "error". Without `breakpoints`, `commands` is read like the input of vdb: the commands
+    run in order across stops, `continue` and `stepi` resume the VM, and once the script
+    ends every stop continues. `breakpoints` are actions, dicts with a "line", an optional
+    "condition" and "commands" run at every stop on that line; `commands` then run at the
+    other stops (`vdb` statements, watchpoints and steps). The VM continues after the
+    commands of a stop, unless one of them resumes it.
+    """
+
+    def __init__(self, session, output, commands=(), breakpoints=None):
+        self.session = session
+        self.output = output
+        self.stops = 0
+        self.breakpoints = breakpoints
+        self._script = iter(commands) if breakpoints is None else None
+        self._commands = list(commands)
+        self._actions = {}  # line number -> commands of its breakpoints.
+        self._stepping = False
+
+    def install(self):
+        """
+        Sets the breakpoints of the script and makes this the debugger of the session.
+        Raises ValueError for lines without code and invalid conditions.
+        """
+        for action in self.breakpoints or ():
+            bp = self.session.add_breakpoint(
+                action['line'], action.get('condition'), action.get('temporary', False)
+            )
+            self._actions.setdefault(bp.line_no, []).extend(action.get('commands', []))
+        self.session.debugger = self
+
+    def write(self, record):
+        self.output.write(json.dumps(record) + '\n')
+
+    def write_call(self, function, args, returns=None, logs=(), error=None):
+        record = {'event': 'call', 'function': function, 'args': args}
+        if error is not None:
+            record['error'] = error
+        else:
+            record['returns'] = to_json(returns)
+            record['logs'] = [
+                {'event': event_name, 'args': to_json(log_args)} for event_name, log_args in logs
+            ]
+        self.write(record)
+
+    def __call__(self, computation, line_no):
+        session = self.session
+        hits = session.watchpoints.hits
+        if self._stepping:
+            reason = 'step'
+        elif hits:
+            reason = 'watchpoint'
+        else:
+            reason = 'breakpoint'
+        self.stops += 1
+        contract = session.get_contract(computation.msg.code)
+        source_code, source_map = session.get_source(computation.msg.code)
+        cmd = VyperDebugCmd(
+            computation,
+            line_no=line_no,
+            source_code=source_code,
+            source_map=source_map,
+            stdin=io.StringIO(),
+            stdout=io.StringIO(),
+            session=session
+        )
+        record = {
+            'event': 'stop',
+            'stop': self.stops,
+            'reason': reason,
+            'line': line_no,
+            'function': (cmd._get_fn_name_locals()[0] or None) if line_no else None,
+            'contract': contract.name if contract is not None else None,
+            'pc': session.pc,
+            'depth': computation.msg.depth,
+        }
+        if hits:
+            record['watchpoints'] = [
+                {
+                    'number': wp.number,
+                    'what': wp.description,
+                    'old': to_json(old),
+                    'new': to_json(new),
+                }
+                for wp, old, new in hits
+            ]
+            session.watchpoints.hits = []
+        if session.display is not None:
+            changes = io.StringIO()
+            session.display.write_changes(changes, computation, cmd._get_slot_vars())
+            record['display'] = changes.getvalue().splitlines()
+        self.write(record)
+
+        if self._script is not None:
+            commands = self._script
+        elif reason == 'breakpoint' and line_no in self._actions:
+            commands = self._actions[line_no]
+        else:
+            commands = self._commands
+        step = False
+        for line in commands:
+            if self.run_command(cmd, line):
+                step = cmd.step_mode
+                break
+        self._stepping = step
+        session.step_mode = step
+
+    def run_command(self, cmd, line):
+        """
+        Runs a vdb command on the stopped `cmd`, writes its record. Returns whether the
+        command resumes the VM.
+        """
+        line = line.strip()
+        record = {'event': 'command', 'stop': self.stops, 'command': line}
+        if line.split(' ', 1)[0] in INTERACTIVE_COMMANDS:
+            record['error'] = '"{}" is not available in batch mode.'.format(line)
+            self.write(record)
+            return False
+        cmd.stdout = io.StringIO()
+        resume = False
+        try:
+            resume = cmd.onecmd(line)
+            value = self._read_value(cmd, line)
+            if value is not None:
+                record['value'] = to_json(value[0])
+        except Exception as e:
+            record['error'] = str(e)
+        record['output'] = ANSI_RE.sub('', cmd.stdout.getvalue())
+        self.write(record)
+        return bool(resume)
+
+    @staticmethod
+    def _read_value(cmd, line):
+        # (value, ) of variables, None for other commands and pages of aggregates. Raises
+        # VariableError if the variable can not be read.
+        if line.startswith('self.') and len(line) > 5:
+            var_name, keys = parse_global_name(line)
+            if keys and ':' in keys[-1]:
+                return None
+            return (
+                read_global_value(cmd.global_vars, cmd.storage, var_name, keys, cmd.preimages),
+            )
+        var_name, keys = parse_var_name(line)
+        _, local_vars = cmd._get_fn_name_locals()
+        if var_name not in local_vars or (keys and ':' in keys[-1]):
+            return None
+        return (read_local_value(local_vars, cmd.computation, var_name, keys), )
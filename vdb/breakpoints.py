@@ -0,0 +1,219 @@
+import ast
+import itertools
+
+from eth_utils import big_endian_to_int
+
+from vdb.source_map import (
+    find_function,
+    get_function_index,
+)
+from vdb.variables import (
+    decode_var,
+    read_global,
+    read_local,
+)
+
+
+# Functions available in breakpoint conditions.
+CONDITION_BUILTINS = {
+    'abs': abs,
+    'len': len,
+    'max': max,
+    'min': min,
+}
+
+
+def _call(name, *args):
+    return ast.Call(func=ast.Name(id=name, ctx=ast.Load()), args=list(args), keywords=[])
+
+
+def _str(value):
+    return ast.Constant(value=value)
+
+
+def _subscript_value(node):
+    # Python < 3.9 wraps subscripts in ast.Index.
+    if isinstance(node, getattr(ast, 'Index', ())):
+        return node.value
+    return node
+
+
+class _ConditionTransformer(ast.NodeTransformer):
+    """
+    Rewrites variable references of a condition into calls of the readers below:
+    `a` -> _local(_c, 'a'), `self.a[k]` -> _global(_c, 'a', [k]), `stack` -> _stack(_c).
+    """
+
+    def __init__(self, local_names):
+        self.local_names = local_names
+
+    def visit_Name(self, node):
+        if node.id in self.local_names:
+            return _call('_local', ast.Name(id='_c', ctx=ast.Load()), _str(node.id))
+        if node.id == 'stack':
+            return _call('_stack', ast.Name(id='_c', ctx=ast.Load()))
+        if node.id in CONDITION_BUILTINS or node.id in ('True', 'False', 'None'):
+            return node
+        raise ValueError('Unknown variable "{}".'.format(node.id))
+
+    def _global_call(self, node, keys):
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and \
+           node.value.id == 'self':
+            return _call(
+                '_global',
+                ast.Name(id='_c', ctx=ast.Load()),
+                _str(node.attr),
+                ast.List(elts=[self.visit(key) for key in keys], ctx=ast.Load())
+            )
+        return None
+
+    def visit_Attribute(self, node):
+        call = self._global_call(node, [])
+        if call is None:
+            raise ValueError('Only globals (self.<name>) can be accessed as attributes.')
+        return call
+
+    def visit_Subscript(self, node):
+        keys = []
+        target = node
+        while isinstance(target, ast.Subscript):
+            keys.insert(0, _subscript_value(target.slice))
+            target = target.value
+        call = self._global_call(target, keys)
+        if call is None:  # e.g. stack[-1]
+            return self.generic_visit(node)
+        return call
+
+
+def _get_fn_locals(source_map, line_no):
+    fn_name = find_function(get_function_index(source_map), line_no)
+    if fn_name is None:
+        return {}
+    return source_map['locals'][fn_name]['variables']
+
+
+def compile_condition(condition, source_map, line_no):
+    """
+    Compiles a breakpoint condition at `line_no` to a function of the computation.
+
+    Conditions are Python expressions over the locals of the function at `line_no`,
+    globals (`self.total`, `self.balances[key]`) and stack values (`stack[-1]` is the top
+    of the stack), read with the same decoders as the vdb print commands.
+    Raises ValueError (or SyntaxError) for invalid conditions.
+    """
+    local_vars = _get_fn_locals(source_map, line_no)
+    global_vars = source_map.get('globals', {})
+    tree = ast.parse(condition.strip(), mode='eval')
+    tree = ast.fix_missing_locations(_ConditionTransformer(local_vars).visit(tree))
+    code = compile(tree, '<condition>', 'eval')
+
+    def _local(computation, name):
+        var_info = local_vars[name]
+        return decode_var(read_local(var_info, computation), var_info['type'])
+
+    def _global(computation, name, keys):
+        value, value_type = read_global(
+            global_vars, computation, name, [str(key) for key in keys]
+        )
+        return decode_var(value, value_type)
+
+    def _stack(computation):
+        return [
+            big_endian_to_int(value) if isinstance(value, bytes) else value
+            for value in computation._stack.values
+        ]
+
+    namespace = dict(
+        CONDITION_BUILTINS, __builtins__={}, _local=_local, _global=_global, _stack=_stack
+    )
+
+    def check(computation):
+        return bool(eval(code, namespace, {'_c': computation}))
+
+    return check
+
+
+class Breakpoint:
+
+    def __init__(self, number, line_no, condition=None, check=None, temporary=False):
+        self.number = number
+        self.line_no = line_no
+        self.condition = condition
+        self.check = check
+        self.temporary = temporary
+        self.ignore_count = 0
+        self.hits = 0
+        self.error = None  # last error raised by the condition.
+
+
+class BreakpointTable:
+    """
+    Runtime breakpoints of a debug session.
+
+    Breakpoints set the USER_BREAKPOINT flag on the first pc of every run of their line
+    (see SourceMapLookup.set_line_breakpoints), conditions and hit counts are only
+    evaluated when execution reaches one of those pcs.
+    """
+
+    def __init__(self):
+        self.breakpoints = {}
+        self._numbers = itertools.count(1)
+        self._by_pc = {}
+        self._lookup = None
+
+    def __iter__(self):
+        return iter(sorted(self.breakpoints.values(), key=lambda bp: bp.number))
+
+    def __len__(self):
+        return len(self.breakpoints)
+
+    def add(self, line_no, source_map, condition=None, temporary=False):
+        check = compile_condition(condition, source_map, line_no) if condition else None
+        bp = Breakpoint(next(self._numbers), line_no, condition, check, temporary)
+        self.breakpoints[bp.number] = bp
+        return bp
+
+    def delete(self, number):
+        return self.breakpoints.pop(number, None)
+
+    def clear(self):
+        self.breakpoints.clear()
+
+    def apply(self, lookup):
+        """
+        Updates the breakpoint flags of `lookup`, returns the line numbers that map to code.
+        """
+        self._lookup = lookup
+        verified = lookup.set_line_breakpoints({bp.line_no for bp in self.breakpoints.values()})
+        line_starts = lookup.get_line_starts()
+        self._by_pc = {}
+        for bp in self:
+            for pc in line_starts.get(bp.line_no, ()):
+                self._by_pc.setdefault(pc, []).append(bp)
+        return verified
+
+    def hit(self, computation, pc):
+        """
+        Whether execution stops at `pc`, counts hits of the breakpoints at `pc`.
+        """
+        stop = False
+        temporary_hit = False
+        for bp in self._by_pc.get(pc, ()):
+            if bp.check is not None:
+                try:
+                    if not bp.check(computation):
+                        continue
+                    bp.error = None
+                except Exception as e:  # stop, so the condition can be fixed.
+                    bp.error = '{}: {}'.format(type(e).__name__, e)
+            bp.hits += 1
+            if bp.ignore_count > 0:
+                bp.ignore_count -= 1
+                continue
+            if bp.temporary:
+                self.delete(bp.number)
+                temporary_hit = True
+            stop = True
+        if temporary_hit and self._lookup is not None:
+            self.apply(self._lookup)
+        return stop
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import marshal
+import os
+import sys
+import tempfile
+import zlib
+
+import vyper
+
+
+CACHE_VERSION = 5
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024  # 64 MiB
+ENTRY_SUFFIX = '.vdbdi'
+
+
+def get_default_cache_dir():
+    """
+    Cache location, in order of preference:
+    - VDB_CACHE_DIR environment variable.
+    - $XDG_CACHE_HOME/vdb
+    - ~/.cache/vdb
+    """
+    if os.environ.get('VDB_CACHE_DIR'):
+        return os.environ['VDB_CACHE_DIR']
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache'
+    )
+    return os.path.join(cache_home, 'vdb')
+
+
+class DebugInfoCache:
+    """
+    Content addressed on-disk cache of compiled debug info (see produce_debug_info).
+
+    Entries are marshal'ed and zlib compressed, one file per entry. Writes go to a
+    temporary file first and are moved in place with os.replace, so concurrent readers
+    (e.g. pytest-xdist workers) either see a complete entry or none at all.
+    Least recently used entries (by mtime, bumped on every hit) are evicted once
+    the total size exceeds `max_size`.
+    """
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+
+    @staticmethod
+    def make_key(code, interface_codes=None):
+        h = hashlib.sha256()
+        h.update('{}|{}|{}.{}\n'.format(
+            CACHE_VERSION, vyper.__version__, *sys.version_info[:2]
+        ).encode())
+        h.update(code.encode())
+        if interface_codes:
+            h.update(
+                json.dumps(interface_codes, sort_keys=True, default=str).encode()
+            )
+        return h.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'rb') as fh:
+                data = fh.read()
+            os.utime(entry_path)  # mark as recently used.
+        except OSError:
+            return None
+        try:
+            return marshal.loads(zlib.decompress(data))
+        except (zlib.error, ValueError, EOFError, TypeError):
+            # Corrupt entry, drop it.
+            self._remove(entry_path)
+            return None
+
+    def set(self, key, value):
+        data = zlib.compress(marshal.dumps(value))
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            os.replace(tmp_path, self._entry_path(key))
+        except OSError:
+            return  # Cache is best effort, a read-only location is not an error.
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total_size = 0
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return
+        for name in names:
+            if not name.endswith(ENTRY_SUFFIX):
+                continue
+            entry_path = os.path.join(self.path, name)
+            try:
+                st = os.stat(entry_path)
+            except OSError:
+                continue  # removed by another process.
+            entries.append((st.st_mtime, st.st_size, entry_path))
+            total_size += st.st_size
+
+        if total_size <= self.max_size:
+            return
+        for _, size, entry_path in sorted(entries):
+            self._remove(entry_path)
+            total_size -= size
+            if total_size <= self.max_size:
+                break
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            if name.endswith(ENTRY_SUFFIX):
+                self._remove(os.path.join(self.path, name))
+
+    @staticmethod
+    def _remove(entry_path):
+        try:
+            os.remove(entry_path)
+        except OSError:
+            pass
+
+
+def get_debug_info_cache():
+    """
+    Returns the default cache, or None when caching is disabled with VDB_NO_CACHE=1.
+    """
+    if os.environ.get('VDB_NO_CACHE'):
+        return None
+    max_size = int(os.environ.get('VDB_CACHE_MAX_SIZE', DEFAULT_MAX_SIZE))
+    return DebugInfoCache(get_default_cache_dir(), max_size=max_size)
@@ -0,0 +1,401 @@
+"""
+Line and branch coverage of Vyper contracts run on the debug backend.
+
+    VDB_COVERAGE=.vdb-coverage pytest -n 4
+    python -m vdb.coverage combine .vdb-coverage
+    python -m vdb.coverage report .vdb-coverage --source contracts/*.vy --lcov coverage.info
+"""
+import argparse
+import atexit
+import base64
+import collections
+import glob
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+import zlib
+from xml.etree import ElementTree
+
+from eth_hash.auto import keccak
+from eth_utils import to_hex
+
+from vdb.source_map import (
+    SourceMapLookup,
+    get_function_index,
+    produce_debug_info,
+)
+from vdb.watchpoints import _to_int
+
+
+COVERAGE_VERSION = 1
+JUMPI = 0x57
+PUSH1 = 0x60
+PUSH32 = 0x7f
+CODE_CACHE_SIZE = 256  # codes whose bitmaps are looked up without hashing.
+# flags of the branches bitmap, per JUMPI pc.
+TAKEN = 1
+NOT_TAKEN = 2
+
+# line -> 0 or 1, line -> [(taken, not taken)] per JUMPI (None if never reached),
+# function name -> (first line, 0 or 1).
+FileCoverage = collections.namedtuple('FileCoverage', ('lines', 'branches', 'functions'))
+
+
+class CoverageCollector:
+    """
+    Executed pcs and JUMPI outcomes, in a bitmap per contract code hash (see
+    DebugSession.record_coverage).
+
+    The instrumented opcode loop sets one byte of the `executed` bitmap per opcode, the
+    JUMPI opcode is wrapped to record whether it jumped in the `branches` bitmap. Nothing
+    is mapped to source lines until a report is made (see get_file_coverage), so bitmaps of
+    different processes can be merged by code hash. The bitmaps of the most recently run
+    codes are cached by code, the others are found by hashing the code again.
+    """
+
+    def __init__(self):
+        self.executed = {}  # code hash -> bytearray, 1 for every executed pc.
+        self.branches = {}  # code hash -> bytearray, TAKEN | NOT_TAKEN for JUMPI pcs.
+        self._bitmaps = collections.OrderedDict()  # code -> (executed, branches).
+
+    def get_bitmaps(self, code):
+        """
+        Returns the (executed, branches) bitmaps of `code`, created on first use.
+        """
+        bitmaps = self._bitmaps.get(code)
+        if bitmaps is not None:
+            self._bitmaps.move_to_end(code)
+            return bitmaps
+        code_hash = to_hex(keccak(code))
+        if code_hash not in self.executed:
+            # one extra byte, the loop reads a STOP past the end of the code.
+            self.executed[code_hash] = bytearray(len(code) + 1)
+            self.branches[code_hash] = bytearray(len(code) + 1)
+        bitmaps = self._bitmaps[code] = (self.executed[code_hash], self.branches[code_hash])
+        if len(self._bitmaps) > CODE_CACHE_SIZE:
+            self._bitmaps.popitem(last=False)
+        return bitmaps
+
+    def make_opcodes(self, opcodes):
+        """
+        Returns a copy of the `opcodes` table with JUMPI recording its outcome.
+        """
+        opcodes = opcodes.copy()
+        opcode_fn = opcodes[JUMPI]
+        get_bitmaps = self.get_bitmaps
+
+        def jumpi(computation):
+            values = computation._stack.values
+            if len(values) < 2:
+                return opcode_fn(computation=computation)  # raises InsufficientStack.
+            branches = get_bitmaps(computation.msg.code)[1]
+            condition = _to_int(values[-2])
+            branches[computation.code.pc - 1] |= TAKEN if condition else NOT_TAKEN
+            opcode_fn(computation=computation)
+
+        jumpi.mnemonic = opcode_fn.mnemonic
+        opcodes[JUMPI] = jumpi
+        return opcodes
+
+    def merge(self, other):
+        """
+        Adds the coverage of `other`, a CoverageCollector.
+        """
+        for code_hash, executed in other.executed.items():
+            if code_hash not in self.executed:
+                self.executed[code_hash] = bytearray(executed)
+                self.branches[code_hash] = bytearray(other.branches[code_hash])
+                continue
+            # in place, the bitmaps may be in use.
+            mine = self.executed[code_hash]
+            mine[:] = _or_bytes(mine, executed)
+            mine = self.branches[code_hash]
+            mine[:] = _or_bytes(mine, other.branches[code_hash])
+
+    #
+    # Data files
+    #
+    def save(self, path):
+        """
+        Writes the bitmaps to `path`, replacing it atomically.
+        """
+        data = json.dumps({
+            'version': COVERAGE_VERSION,
+            'codes': {
+                code_hash: {
+                    'executed': _encode_bitmap(executed),
+                    'branches': _encode_bitmap(self.branches[code_hash]),
+                }
+                for code_hash, executed in self.executed.items()
+            },
+        })
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        with os.fdopen(fd, 'w') as fh:
+            fh.write(data)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as fh:
+            data = json.load(fh)
+        if data.get('version') != COVERAGE_VERSION:
+            raise ValueError('{}: unsupported coverage version {}.'.format(
+                path, data.get('version')
+            ))
+        collector = cls()
+        for code_hash, bitmaps in data['codes'].items():
+            collector.executed[code_hash] = _decode_bitmap(bitmaps['executed'])
+            collector.branches[code_hash] = _decode_bitmap(bitmaps['branches'])
+        return collector
+
+
+def _or_bytes(a, b):
+    return (int.from_bytes(a, 'big') | int.from_bytes(b, 'big')).to_bytes(len(a), 'big')
+
+
+def _encode_bitmap(bitmap):
+    return base64.b64encode(zlib.compress(bytes(bitmap))).decode()
+
+
+def _decode_bitmap(data):
+    return bytearray(zlib.decompress(base64.b64decode(data)))
+
+
+def combine(path):
+    """
+    Merges the data files of every process, `<path>.*`, into `path` and removes them.
+    """
+    collector = CoverageCollector.load(path) if os.path.exists(path) else CoverageCollector()
+    process_paths = [p for p in glob.glob(glob.escape(path) + '.*') if not p.endswith('.tmp')]
+    for process_path in process_paths:
+        collector.merge(CoverageCollector.load(process_path))
+    collector.save(path)
+    for process_path in process_paths:
+        os.remove(process_path)
+    return collector
+
+
+#
+# Collector of every session of the process, enabled with VDB_COVERAGE.
+#
+_process_collector = None
+
+
+def get_process_collector():
+    """
+    Returns the collector of all sessions of this process when the VDB_COVERAGE environment
+    variable is set to the path of a data file, otherwise None. It is saved at exit as
+    `<path>.<host>.<pid>`, merge the files of all processes (e.g. of pytest-xdist workers)
+    with combine.
+    """
+    global _process_collector
+    path = os.environ.get('VDB_COVERAGE')
+    if not path:
+        return None
+    if _process_collector is None:
+        _process_collector = CoverageCollector()
+        process_path = '{}.{}.{}'.format(os.path.abspath(path), socket.gethostname(), os.getpid())
+        atexit.register(_save_process_collector, _process_collector, process_path)
+    return _process_collector
+
+
+def _save_process_collector(collector, path):
+    if collector.executed:
+        collector.save(path)
+
+
+#
+# Reports
+#
+def get_jumpis(code):
+    """
+    Yields the pcs of the JUMPI opcodes of `code`, skipping push data.
+    """
+    pc = 0
+    while pc < len(code):
+        opcode = code[pc]
+        if opcode == JUMPI:
+            yield pc
+        pc += 1 + (opcode - PUSH1 + 1 if PUSH1 <= opcode <= PUSH32 else 0)
+
+
+def get_file_coverage(collector, debug_info):
+    """
+    Folds the bitmaps of the runtime code of `debug_info` (see produce_debug_info) into a
+    FileCoverage. Lines are the lines with code, a line is covered when any of its pcs ran.
+    Branches are the two outcomes of every JUMPI of a line.
+    """
+    code = bytes.fromhex(debug_info['bytecode_runtime'][2:])
+    code_hash = to_hex(keccak(code))
+    executed = collector.executed.get(code_hash) or bytes(len(code) + 1)
+    branches = collector.branches.get(code_hash) or bytes(len(code) + 1)
+    source_map = debug_info['source_map']
+    pc_lines = SourceMapLookup(source_map).pc_lines
+
+    lines = {}
+    for pc, line_no in enumerate(pc_lines):
+        if line_no is not None:
+            lines[line_no] = lines.get(line_no, 0) | (executed[pc] if pc < len(executed) else 0)
+    line_branches = {}
+    for pc in get_jumpis(code):
+        line_no = pc_lines[pc] if pc < len(pc_lines) else None
+        if line_no is None:
+            continue
+        flags = branches[pc]
+        line_branches.setdefault(line_no, []).append(
+            (int(bool(flags & TAKEN)), int(bool(flags & NOT_TAKEN))) if executed[pc] else None
+        )
+    function_index = get_function_index(source_map)
+    functions = {}
+    for start, end, name in zip(
+        function_index['starts'], function_index['ends'], function_index['names']
+    ):
+        hits = [hit for line_no, hit in lines.items() if start <= line_no <= end]
+        if hits:
+            functions[name] = (start, max(hits))
+    return FileCoverage(lines, line_branches, functions)
+
+
+def write_lcov(fh, files):
+    """
+    Writes an lcov tracefile of `files`, [(source path, FileCoverage)].
+    """
+    for path, cov in files:
+        fh.write('TN:\nSF:{}\n'.format(path))
+        for name, (line_no, _) in sorted(cov.functions.items(), key=lambda x: x[1]):
+            fh.write('FN:{},{}\n'.format(line_no, name))
+        for name, (_, hit) in sorted(cov.functions.items(), key=lambda x: x[1]):
+            fh.write('FNDA:{},{}\n'.format(hit, name))
+        fh.write('FNF:{}\nFNH:{}\n'.format(
+            len(cov.functions), sum(hit for _, hit in cov.functions.values())
+        ))
+        branches_found = branches_hit = 0
+        for line_no in sorted(cov.branches):
+            for block, outcomes in enumerate(cov.branches[line_no]):
+                for branch in range(2):
+                    taken = '-' if outcomes is None else outcomes[branch]
+                    fh.write('BRDA:{},{},{},{}\n'.format(line_no, block, branch, taken))
+                    branches_found += 1
+                    branches_hit += bool(outcomes and outcomes[branch])
+        fh.write('BRF:{}\nBRH:{}\n'.format(branches_found, branches_hit))
+        for line_no in sorted(cov.lines):
+            fh.write('DA:{},{}\n'.format(line_no, cov.lines[line_no]))
+        fh.write('LF:{}\nLH:{}\nend_of_record\n'.format(len(cov.lines), sum(cov.lines.values())))
+
+
+def _count_branches(cov):
+    outcomes = [x for jumpis in cov.branches.values() for x in jumpis]
+    return 2 * len(outcomes), sum(sum(x) for x in outcomes if x is not None)
+
+
+def _rate(hit, total):
+    return '{:.4g}'.format(hit / total if total else 1)
+
+
+def write_cobertura(fh, files):
+    """
+    Writes a Cobertura XML report of `files`, [(source path, FileCoverage)].
+    """
+    lines_valid = sum(len(cov.lines) for _, cov in files)
+    lines_covered = sum(sum(cov.lines.values()) for _, cov in files)
+    branch_counts = [_count_branches(cov) for _, cov in files]
+    branches_valid = sum(total for total, _ in branch_counts)
+    branches_covered = sum(hit for _, hit in branch_counts)
+    root = ElementTree.Element('coverage', {
+        'line-rate': _rate(lines_covered, lines_valid),
+        'branch-rate': _rate(branches_covered, branches_valid),
+        'lines-covered': str(lines_covered),
+        'lines-valid': str(lines_valid),
+        'branches-covered': str(branches_covered),
+        'branches-valid': str(branches_valid),
+        'complexity': '0',
+        'timestamp': str(int(time.time() * 1000)),
+        'version': 'vdb',
+    })
+    ElementTree.SubElement(ElementTree.SubElement(root, 'sources'), 'source').text = '.'
+    package = ElementTree.SubElement(ElementTree.SubElement(root, 'packages'), 'package', {
+        'name': '.',
+        'line-rate': root.get('line-rate'),
+        'branch-rate': root.get('branch-rate'),
+        'complexity': '0',
+    })
+    classes = ElementTree.SubElement(package, 'classes')
+    for (path, cov), (branches_total, branches_hit) in zip(files, branch_counts):
+        cls = ElementTree.SubElement(classes, 'class', {
+            'name': os.path.splitext(os.path.basename(path))[0],
+            'filename': path,
+            'line-rate': _rate(sum(cov.lines.values()), len(cov.lines)),
+            'branch-rate': _rate(branches_hit, branches_total),
+            'complexity': '0',
+        })
+        ElementTree.SubElement(cls, 'methods')
+        lines = ElementTree.SubElement(cls, 'lines')
+        for line_no in sorted(cov.lines):
+            attrs = {'number': str(line_no), 'hits': str(cov.lines[line_no]), 'branch': 'false'}
+            outcomes = cov.branches.get(line_no)
+            if outcomes:
+                total = 2 * len(outcomes)
+                hit = sum(sum(x) for x in outcomes if x is not None)
+                attrs['branch'] = 'true'
+                attrs['condition-coverage'] = '{}% ({}/{})'.format(100 * hit // total, hit, total)
+            ElementTree.SubElement(lines, 'line', attrs)
+    fh.write('<?xml version="1.0" ?>\n')
+    fh.write(ElementTree.tostring(root).decode() + '\n')
+
+
+def write_summary(fh, files):
+    fh.write('{:<40} {:>7} {:>7} {:>9}\n'.format('Source', 'Lines', 'Miss', 'Branches'))
+    for path, cov in files:
+        total, hit = _count_branches(cov)
+        fh.write('{:<40} {:>7} {:>7} {:>8}%\n'.format(
+            path,
+            len(cov.lines),
+            len(cov.lines) - sum(cov.lines.values()),
+            100 * hit // total if total else 100,
+        ))
+
+
+def main(argv=None):
+    aparser = argparse.ArgumentParser(
+        prog='python -m vdb.coverage', description='Vyper coverage reports'
+    )
+    subparsers = aparser.add_subparsers(dest='command')
+    combine_parser = subparsers.add_parser(
+        'combine', help='merge the data files of all processes, DATA.*, into DATA'
+    )
+    combine_parser.add_argument('data', help='data file, the value of VDB_COVERAGE')
+    report_parser = subparsers.add_parser('report', help='report the coverage of sources')
+    report_parser.add_argument('data', nargs='+', help='data files, merged')
+    report_parser.add_argument('--source', nargs='+', required=True, metavar='PATH',
+                               help='Vyper sources to report')
+    report_parser.add_argument('--lcov', metavar='FILE', help='write an lcov tracefile')
+    report_parser.add_argument('--cobertura', metavar='FILE', help='write a Cobertura XML report')
+    args = aparser.parse_args(argv)
+
+    if args.command == 'combine':
+        combine(args.data)
+    elif args.command == 'report':
+        collector = CoverageCollector()
+        for path in args.data:
+            collector.merge(CoverageCollector.load(path))
+        files = []
+        for path in args.source:
+            with open(path) as source_fh:
+                debug_info = produce_debug_info(source_fh.read())
+            files.append((path, get_file_coverage(collector, debug_info)))
+        write_summary(sys.stdout, files)
+        if args.lcov:
+            with open(args.lcov, 'w') as fh:
+                write_lcov(fh, files)
+        if args.cobertura:
+            with open(args.cobertura, 'w') as fh:
+                write_cobertura(fh, files)
+    else:
+        aparser.print_help()
+
+
+if __name__ == '__main__':
+    main()
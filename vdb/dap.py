@@ -0,0 +1,631 @@
+import asyncio
+import base64
+import functools
+import io
+import itertools
+import json
+import queue
+import socket
+import threading
+
+from eth_utils import to_hex
+
+from vdb.decoders import (
+    Aggregate,
+    MemoryLocation,
+    StorageLocation,
+    decode,
+    format_value,
+)
+from vdb.memory import memory_view
+from vdb.storage import StorageReader
+from vdb.variables import (
+    parse_global,
+    parse_local,
+)
+from vdb.vdb import VyperDebugCmd
+
+
+THREAD_ID = 1  # the VM thread, the only thread reported to clients.
+FRAME_ID = 0
+LOCALS_REF, GLOBALS_REF, STACK_REF, MEMORY_REF = range(1, 5)
+AGGREGATES_REF = 1000  # references of lists and structs, valid until resumed.
+MEMORY_REFERENCE = 'memory'
+
+CAPABILITIES = {
+    'supportsConfigurationDoneRequest': True,
+    'supportsConditionalBreakpoints': True,
+    'supportsHitConditionalBreakpoints': True,
+    'supportsEvaluateForHovers': True,
+    'supportsSteppingGranularity': True,
+    'supportsReadMemoryRequest': True,
+}
+
+
+class DebugAdapterError(Exception):
+    pass
+
+
+def encode_message(message):
+    body = json.dumps(message).encode()
+    return b'Content-Length: %d\r\n\r\n' % len(body) + body
+
+
+def _parse_headers(lines):
+    for line in lines:
+        name, _, value = line.decode().partition(':')
+        if name.strip().lower() == 'content-length':
+            return int(value)
+    raise DebugAdapterError('Missing Content-Length header.')
+
+
+def _parse_hit_condition(hit_condition):
+    # ignore count of a breakpoint that stops on hit `hit_condition`.
+    if not hit_condition:
+        return 0
+    try:
+        return max(0, int(hit_condition) - 1)
+    except ValueError:
+        raise ValueError('Invalid hit condition: {}'.format(hit_condition))
+
+
+async def read_message(reader):
+    """
+    Reads one Content-Length framed message from an asyncio.StreamReader,
+    returns None at the end of the stream.
+    """
+    lines = []
+    while True:
+        line = await reader.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            break
+        lines.append(line)
+    body = await reader.readexactly(_parse_headers(lines))
+    return json.loads(body.decode())
+
+
+class DebugAdapterServer:
+    """
+    Headless debugger, serves the Debug Adapter Protocol on a local TCP or Unix socket.
+
+    The server installs itself as the debugger of `session`. Once the client sends
+    configurationDone, `target` (e.g. a function sending the transactions to debug) is
+    called on a separate VM thread. The VM thread runs freely and only blocks while
+    stopped on a breakpoint, a step or a pause request; stackTrace, scopes, variables,
+    evaluate and readMemory are answered while stopped. One client is served, the
+    server exits when it disconnects.
+    """
+
+    def __init__(self, session, target, source_path=None):
+        self.session = session
+        self.target = target
+        self.source_path = source_path
+        self.address = None
+        self._loop = None
+        self._server = None
+        self._writer = None
+        self._finished = None
+        self._seq = itertools.count(1)
+        self._pending_events = []
+        self._resume_queue = queue.Queue()
+        self._vm_thread = None
+        self._stopped = None  # (computation, line_no) while the VM thread is stopped.
+        self._storage = None  # StorageReader of the current stop.
+        self._aggregates = {}  # variablesReference -> decoders.Aggregate of the current stop.
+        self._step = None  # (kind, line_no, depth) of the step in progress.
+        self._pause_requested = False
+        self._detached = False
+
+    #
+    # Server
+    #
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        self._loop = asyncio.get_event_loop()
+        self._finished = asyncio.Event()
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle_client, path)
+            self.address = path
+        else:
+            self._server = await asyncio.start_server(self._handle_client, host, port)
+            self.address = self._server.sockets[0].getsockname()[:2]
+        self.session.debugger = self._on_stop
+
+    def run(self, host='127.0.0.1', port=0, path=None, ready=None):
+        """
+        Serve until the client disconnects and the VM thread exits. `ready` is called
+        with the bound address once listening, e.g. ('127.0.0.1', 41234).
+        """
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(self.start(host, port, path))
+            if ready is not None:
+                ready(self.address)
+            loop.run_until_complete(self._finished.wait())
+            self._server.close()
+            loop.run_until_complete(self._server.wait_closed())
+            if self._vm_thread is not None:
+                self._vm_thread.join()
+        finally:
+            loop.close()
+
+    async def _handle_client(self, reader, writer):
+        if self._writer is not None:  # a single client at a time.
+            writer.close()
+            return
+        self._writer = writer
+        try:
+            while not self._detached:
+                message = await read_message(reader)
+                if message is None:
+                    break
+                if message.get('type') == 'request':
+                    self._handle_request(message)
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._detach()
+            writer.close()
+            self._writer = None
+            self._finished.set()
+
+    def _send(self, message):
+        if self._writer is not None:
+            message['seq'] = next(self._seq)
+            self._writer.write(encode_message(message))
+
+    def _send_event(self, event, body=None):
+        self._send({'type': 'event', 'event': event, 'body': body or {}})
+
+    def _handle_request(self, request):
+        command = request['command']
+        response = {
+            'type': 'response',
+            'request_seq': request['seq'],
+            'command': command,
+            'success': True,
+        }
+        handler = getattr(self, 'on_' + command, None)
+        try:
+            if handler is None:
+                raise DebugAdapterError('Unsupported request "{}".'.format(command))
+            response['body'] = handler(request.get('arguments') or {}) or {}
+        except DebugAdapterError as e:
+            response['success'] = False
+            response['message'] = str(e)
+        self._send(response)
+        for event, body in self._pending_events:
+            self._send_event(event, body)
+        self._pending_events = []
+
+    #
+    # VM thread
+    #
+    def _run_target(self):
+        exit_code = 0
+        try:
+            self.target()
+        except Exception as e:
+            exit_code = 1
+            self._loop.call_soon_threadsafe(
+                self._send_event, 'output', {'category': 'stderr', 'output': '{}\n'.format(e)}
+            )
+        finally:
+            self._loop.call_soon_threadsafe(self._on_terminated, exit_code)
+
+    def _on_terminated(self, exit_code):
+        self._send_event('exited', {'exitCode': exit_code})
+        self._send_event('terminated')
+
+    def _step_done(self, computation, line_no):
+        kind, start_line_no, start_depth = self._step
+        depth = computation.msg.depth
+        if kind == 'instruction':
+            return True
+        if line_no is None:
+            return False
+        if kind == 'stepOut':
+            return depth < start_depth
+        if kind == 'stepIn':
+            return line_no != start_line_no or depth != start_depth
+        return depth < start_depth or (depth == start_depth and line_no != start_line_no)
+
+    def _on_stop(self, computation, line_no):
+        # Called from the instrumented opcode loop on the VM thread, on breakpoints and on
+        # every opcode while stepping or pausing.
+        if self._detached:
+            self.session.step_mode = False
+            return
+        if self._pause_requested:
+            if line_no is None:
+                return
+            reason = 'pause'
+        elif self._step is not None:
+            if not self._step_done(computation, line_no):
+                return
+            reason = 'step'
+        elif self.session.watchpoints.hits:
+            reason = 'data breakpoint'
+        else:
+            reason = 'breakpoint'
+        if self.session.watchpoints.hits:
+            output = io.StringIO()
+            self.session.watchpoints.write_hits(output)
+            self._loop.call_soon_threadsafe(self._send_event, 'output', {
+                'category': 'console', 'output': output.getvalue()
+            })
+        self._pause_requested = False
+        self._step = None
+        self._stopped = (computation, line_no)
+        self._storage = StorageReader.from_computation(computation)
+        self._aggregates = {}
+        self._loop.call_soon_threadsafe(self._send_event, 'stopped', {
+            'reason': reason,
+            'threadId': THREAD_ID,
+            'allThreadsStopped': True,
+        })
+        self._resume_queue.get()
+
+    def _resume(self, step=None):
+        if self._stopped is None:
+            raise DebugAdapterError('Not stopped.')
+        self._step = step
+        self.session.step_mode = step is not None
+        self._stopped = None
+        self._resume_queue.put(None)
+
+    def _detach(self):
+        if self._detached:
+            return
+        self._detached = True
+        self._pause_requested = False
+        self.session.breakpoints.clear()
+        self.session.update_breakpoints()
+        self.session.watchpoints.clear()
+        self.session.update_opcodes()
+        if self._stopped is not None:
+            self._resume()
+        self.session.step_mode = False
+
+    #
+    # Inspection helpers, only valid while stopped.
+    #
+    def _get_stopped(self):
+        if self._stopped is None:
+            raise DebugAdapterError('Not stopped.')
+        return self._stopped
+
+    def _get_cmd(self, stdout=None):
+        computation, line_no = self._get_stopped()
+        source_code, source_map = self.session.get_source(computation.msg.code)
+        return VyperDebugCmd(
+            computation,
+            line_no=line_no,
+            source_code=source_code,
+            source_map=source_map,
+            stdin=io.StringIO(),
+            stdout=stdout or io.StringIO(),
+            session=self.session,
+            storage=self._storage
+        )
+
+    def _make_variable(self, name, value, type_name=None):
+        variable = {'name': name, 'variablesReference': 0}
+        if isinstance(value, Aggregate) and \
+           (value.kind != 'map' or value.location.preimages is not None):
+            # expanded lazily, page by page for lists.
+            ref = AGGREGATES_REF + len(self._aggregates)
+            self._aggregates[ref] = value
+            variable['variablesReference'] = ref
+            if value.kind == 'list':
+                variable['value'] = '[{} items]'.format(len(value))
+                variable['indexedVariables'] = len(value)
+            elif value.kind == 'map':
+                variable['value'] = '{{{} keys}}'.format(len(value))
+                variable['namedVariables'] = len(value)
+            else:
+                variable['value'] = value.layout.get('name', value.kind)
+                variable['namedVariables'] = len(value)
+        else:
+            variable['value'] = format_value(value)
+        if type_name is not None:
+            variable['type'] = type_name
+        return variable
+
+    def _get_variable(self, name, info, parse_fn, variables, location, prefix=''):
+        computation, _ = self._get_stopped()
+        if 'layout' in info:
+            value = decode(info['layout'], location, info['position'])
+            return self._make_variable(prefix + name, value, info['type'])
+        return {
+            'name': prefix + name,
+            'value': self._read_var(parse_fn, variables, computation, prefix + name),
+            'type': info['type'],
+            'variablesReference': 0,
+        }
+
+    @staticmethod
+    def _read_var(parse_fn, variables, computation, name):
+        out = io.StringIO()
+        try:
+            parse_fn(out, variables, computation, name)
+        except Exception as e:
+            return '<error: {}>'.format(e)
+        return out.getvalue().strip()
+
+    def _memory_words(self, computation, start, count):
+        with memory_view(computation) as memory:
+            n_words = (len(memory) + 31) // 32
+            end = n_words if count is None else min(n_words, start + count)
+            return [
+                {
+                    'name': hex(i * 32),
+                    'value': to_hex(bytes(memory[i * 32:i * 32 + 32])),
+                    'variablesReference': 0,
+                }
+                for i in range(start, end)
+            ]
+
+    #
+    # Requests
+    #
+    def on_initialize(self, args):
+        self._pending_events.append(('initialized', None))
+        return CAPABILITIES
+
+    def on_launch(self, args):
+        pass
+
+    def on_attach(self, args):
+        pass
+
+    def on_setBreakpoints(self, args):
+        # Replaces all breakpoints, vyper-run debugs a single source file.
+        table = self.session.breakpoints
+        table.clear()
+        results = []
+        for source_bp in args.get('breakpoints', []):
+            result = {'verified': False, 'line': source_bp['line']}
+            try:
+                # checked before the breakpoint is added, a hit condition N stops on hit N.
+                ignore_count = _parse_hit_condition(source_bp.get('hitCondition'))
+                bp = table.add(
+                    source_bp['line'], self.session.source_map or {}, source_bp.get('condition')
+                )
+                bp.ignore_count = ignore_count
+                result['id'] = bp.number
+            except (ValueError, SyntaxError) as e:
+                result['message'] = str(e)
+            results.append(result)
+        verified = self.session.update_breakpoints()
+        for result in results:
+            if 'id' in result:
+                result['verified'] = result['line'] in verified
+        return {'breakpoints': results}
+
+    def on_setExceptionBreakpoints(self, args):
+        return {'breakpoints': []}
+
+    def on_configurationDone(self, args):
+        if self._vm_thread is None:
+            self._vm_thread = threading.Thread(target=self._run_target, name='vdb-vm')
+            self._vm_thread.start()
+
+    def on_threads(self, args):
+        return {'threads': [{'id': THREAD_ID, 'name': 'EVM'}]}
+
+    def on_stackTrace(self, args):
+        computation, line_no = self._get_stopped()
+        cmd = self._get_cmd()
+        fn_name, _ = cmd._get_fn_name_locals()
+        pc = self.session.pc
+        lookup = self.session.get_lookup(computation.msg.code)
+        pos = lookup.get_pos(pc) if lookup is not None else None
+        frame = {
+            'id': FRAME_ID,
+            'name': fn_name or '(unknown)',
+            'line': line_no or 0,
+            'column': pos[1] + 1 if pos else 0,
+            'instructionPointerReference': hex(pc),
+        }
+        contract = self.session.get_contract(computation.msg.code)
+        if contract is not None:
+            frame['source'] = {'name': contract.name}
+        elif self.source_path is not None:
+            frame['source'] = {'path': self.source_path}
+        return {'stackFrames': [frame], 'totalFrames': 1}
+
+    def on_scopes(self, args):
+        computation, _ = self._get_stopped()
+        n_words = (len(computation._memory._bytes) + 31) // 32
+        return {
+            'scopes': [
+                {'name': 'Locals', 'variablesReference': LOCALS_REF, 'expensive': False},
+                {'name': 'Globals', 'variablesReference': GLOBALS_REF, 'expensive': False},
+                {'name': 'Stack', 'variablesReference': STACK_REF, 'expensive': False},
+                {
+                    'name': 'Memory',
+                    'variablesReference': MEMORY_REF,
+                    'indexedVariables': n_words,
+                    'expensive': True,
+                },
+            ]
+        }
+
+    def on_variables(self, args):
+        computation, _ = self._get_stopped()
+        ref = args['variablesReference']
+        if ref == LOCALS_REF:
+            _, local_vars = self._get_cmd()._get_fn_name_locals()
+            variables = [
+                self._get_variable(
+                    name, info, parse_local, local_vars, MemoryLocation(computation)
+                )
+                for name, info in sorted(local_vars.items())
+            ]
+        elif ref == GLOBALS_REF:
+            global_vars = (self.session.get_source(computation.msg.code)[1] or {}).get(
+                'globals', {}
+            )
+            variables = [
+                self._get_variable(
+                    name,
+                    info,
+                    functools.partial(
+                        parse_global, storage=self._storage, preimages=self.session.preimages
+                    ),
+                    global_vars,
+                    StorageLocation(self._storage, self.session.preimages),
+                    prefix='self.'
+                )
+                for name, info in sorted(global_vars.items())
+            ]
+        elif ref in self._aggregates:
+            aggregate = self._aggregates[ref]
+            start = args.get('start', 0)
+            count = args.get('count') or len(aggregate)
+            try:
+                items = aggregate.items(start, count)
+            except Exception as e:
+                raise DebugAdapterError(str(e))
+            variables = [self._make_variable(format_value(key), value) for key, value in items]
+        elif ref == STACK_REF:
+            variables = [
+                {'name': str(idx), 'value': to_hex(value), 'variablesReference': 0}
+                for idx, value in enumerate(computation._stack.values)
+            ]
+        elif ref == MEMORY_REF:
+            variables = self._memory_words(computation, args.get('start', 0), args.get('count'))
+        else:
+            raise DebugAdapterError('Unknown variablesReference {}.'.format(ref))
+        return {'variables': variables}
+
+    def on_evaluate(self, args):
+        # Expressions are vdb commands, e.g. `self.balances[0x...]`, `a` or `mload 64`.
+        expression = args['expression'].strip()
+        if expression.split(' ', 1)[0] in ('pdb', 'quit'):
+            raise DebugAdapterError('"{}" is not available remotely.'.format(expression))
+        out = io.StringIO()
+        cmd = self._get_cmd(stdout=out)
+        try:
+            cmd.onecmd(expression)
+        except Exception as e:
+            raise DebugAdapterError(str(e))
+        return {'result': out.getvalue().strip(), 'variablesReference': 0}
+
+    def on_readMemory(self, args):
+        computation, _ = self._get_stopped()
+        if args['memoryReference'] != MEMORY_REFERENCE:
+            raise DebugAdapterError('Unknown memoryReference.')
+        offset = args.get('offset', 0)
+        with memory_view(computation) as memory:
+            data = bytes(memory[offset:offset + args['count']])
+        return {
+            'address': hex(offset),
+            'data': base64.b64encode(data).decode(),
+            'unreadableBytes': args['count'] - len(data),
+        }
+
+    def on_continue(self, args):
+        self._resume()
+        return {'allThreadsContinued': True}
+
+    def _on_step(self, kind, args):
+        computation, line_no = self._get_stopped()
+        if args.get('granularity') == 'instruction':
+            kind = 'instruction'
+        self._resume((kind, line_no, computation.msg.depth))
+
+    def on_next(self, args):
+        self._on_step('next', args)
+
+    def on_stepIn(self, args):
+        self._on_step('stepIn', args)
+
+    def on_stepOut(self, args):
+        self._on_step('stepOut', args)
+
+    def on_pause(self, args):
+        if self._stopped is None:
+            self._pause_requested = True
+            self.session.step_mode = True
+
+    def on_disconnect(self, args):
+        self._detach()
+
+
+class DebugAdapterClient:
+    """
+    Minimal blocking Debug Adapter Protocol client, for tests and scripts.
+
+    `address` is a (host, port) tuple or the path of a Unix socket.
+    """
+
+    def __init__(self, address, timeout=30):
+        if isinstance(address, str):
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(timeout)
+            self._sock.connect(address)
+        else:
+            self._sock = socket.create_connection(tuple(address), timeout)
+        self._file = self._sock.makefile('rb')
+        self._seq = itertools.count(1)
+        self.events = []
+
+    def _read(self):
+        lines = []
+        while True:
+            line = self._file.readline()
+            if not line:
+                raise DebugAdapterError('Connection closed.')
+            line = line.strip()
+            if not line:
+                break
+            lines.append(line)
+        return json.loads(self._file.read(_parse_headers(lines)).decode())
+
+    def send(self, command, **arguments):
+        seq = next(self._seq)
+        self._sock.sendall(encode_message({
+            'seq': seq,
+            'type': 'request',
+            'command': command,
+            'arguments': arguments,
+        }))
+        return seq
+
+    def request(self, command, **arguments):
+        """
+        Sends a request and returns the body of its response, events received
+        meanwhile are kept for wait_for_event.
+        """
+        seq = self.send(command, **arguments)
+        while True:
+            message = self._read()
+            if message['type'] == 'event':
+                self.events.append(message)
+            elif message['type'] == 'response' and message['request_seq'] == seq:
+                if not message['success']:
+                    raise DebugAdapterError(message.get('message'))
+                return message.get('body', {})
+
+    def wait_for_event(self, event):
+        while True:
+            for idx, message in enumerate(self.events):
+                if message.get('event') == event:
+                    return self.events.pop(idx).get('body', {})
+            self.events.append(self._read())
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -5,10 +5,35 @@ from eth.exceptions import (
     Halt,
     VMError
 )
-from vdb.vdb import VyperDebugCmd
+from vdb.breakpoints import BreakpointTable
+from vdb.coverage import (
+    CoverageCollector,
+    get_process_collector,
+)
+from vdb.defaults import DEFAULT_MAX_PREIMAGES
+from vdb.display import DirtyTracker
+from vdb.preimages import PreimageIndex
+from vdb.registry import DebugInfoRegistry
+from vdb.watchpoints import WatchpointTable
+from vdb.source_map import (
+    LINE_BREAKPOINT,
+    PC_BREAKPOINT,
+    USER_BREAKPOINT,
+    SourceMapLookup,
+)
+from vdb.vdb import (
+    VyperDebugCmd,
+    set_evm_opcode_debugger,
+    set_evm_opcode_pass,
+)
 from vyper.exceptions import ParserException
 
 
+EMPTY_SOURCE_MAP = {
+    'line_number_map': {'breakpoints': [], 'pc_breakpoints': [], 'pc_pos_map': {}}
+}
+
+
 class DebugVMError(VMError, ParserException):
     lineno = None
     col_offset = None
@@ -21,59 +46,281 @@ class DebugVMError(VMError, ParserException):
             self.source_code = source_code.splitlines()
 
 
-class DebugComputation(ByzantiumComputation):
-    enable_debug = False
-    source_code = None
-    source_map = None
-    stdin = None
-    stdout = None
-    step_mode = False
-    trace = False
-    pc = 0
+class DebugSession:
+    """
+    Debug configuration and state of one chain (see PyEVMDebugBackend).
+
+    Every session has its own computation class, with the session and its own opcode table
+    as class attributes. Chains with different sessions can be debugged, traced or profiled
+    concurrently in one process, e.g. on a thread pool; a single session is not thread safe.
+    """
+
+    def __init__(self, source_code=None, source_map=None, stdin=None, stdout=None):
+        self.source_code = source_code
+        self.source_map = source_map
+        self.stdin = stdin
+        self.stdout = stdout
+        self.enable_debug = False
+        self.step_mode = False
+        self.trace = None  # vdb.trace.TraceRecorder
+        self.profiler = None  # vdb.profiler.Profiler
+        self.pc = 0
+        # Called as debugger(computation, line_no) instead of the interactive VyperDebugCmd,
+        # e.g. vdb.dap.DebugAdapterServer.
+        self.debugger = None
+        self.breakpoints = BreakpointTable()
+        self.watchpoints = WatchpointTable()
+        self.preimages = None  # PreimageIndex, see record_preimages.
+        self.display = None  # DirtyTracker while the auto-display is on.
+        self.coverage = None  # CoverageCollector, see record_coverage.
+        # Contracts by runtime and deployment code hash, see register_contract. Code that is
+        # not registered uses the source map of set_debug_info.
+        self.contracts = DebugInfoRegistry()
+        self._lookup = None
+        self._lookup_source_map = None
+        # Opcode table without the watchpoint hooks.
+        self.opcodes = DebugComputation.opcodes.copy()
+        self.computation_class = type(DebugComputation.__name__, (DebugComputation, ), {
+            'session': self,
+            'opcodes': self.opcodes,
+        })
+        collector = get_process_collector()
+        if collector is not None:
+            self.record_coverage(collector)
+
+    def set_debug_info(self, source_code, source_map, stdin=None, stdout=None):
+        self.source_code = source_code
+        self.source_map = source_map
+        self.stdin = stdin
+        self.stdout = stdout
+
+    def register_contract(self, source_code, debug_info, name=None):
+        """
+        Registers the debug info of a contract (see produce_debug_info), computations of its
+        runtime code, e.g. nested calls, and of its deployment use its source map. Returns its
+        ContractDebugInfo.
+        """
+        return self.contracts.register(source_code, debug_info, name)
+
+    def get_contract(self, code):
+        """
+        Returns the registered ContractDebugInfo of runtime or deployment `code`, None if not
+        registered.
+        """
+        if not len(self.contracts):
+            return None
+        return self.contracts.get(code)
+
+    def get_source(self, code):
+        """
+        Returns the (source code, source map) of runtime or deployment `code`.
+        """
+        contract = self.get_contract(code)
+        if contract is not None:
+            return contract.source_code, contract.source_map
+        return self.source_code, self.source_map
+
+    def set_evm_opcode_debugger(self):
+        set_evm_opcode_debugger(
+            self.source_code, self.source_map, self.stdin, self.stdout,
+            computation_class=self.computation_class
+        )
+        self.opcodes = self.computation_class.opcodes
+        self.update_opcodes()
+
+    def set_evm_opcode_pass(self):
+        set_evm_opcode_pass(computation_class=self.computation_class)
+        self.opcodes = self.computation_class.opcodes
+        self.update_opcodes()
+
+    def _on_watchpoint_hit(self, computation):
+        if self.enable_debug:
+            self.step_mode = True  # stop before the next opcode.
+
+    def record_preimages(self, max_entries=DEFAULT_MAX_PREIMAGES):
+        """
+        Starts recording SHA3 inputs, to list the keys of maps (see PreimageIndex).
+        """
+        if self.preimages is None:
+            self.preimages = PreimageIndex(max_entries)
+            self.update_opcodes()
+        return self.preimages
+
+    def record_coverage(self, collector=None):
+        """
+        Starts recording the executed pcs and JUMPI outcomes of every contract into
+        `collector`, by default a new CoverageCollector.
+        """
+        if self.coverage is None or collector is not None:
+            self.coverage = collector or CoverageCollector()
+            self.update_opcodes()
+        return self.coverage
+
+    def set_display(self, computation=None):
+        """
+        Turns on the auto-display of the changes between stops, tracked from `computation`.
+        """
+        if self.display is None:
+            self.display = DirtyTracker()
+            self.update_opcodes()
+        if computation is not None:
+            self.display.reset(computation)
+        return self.display
+
+    def clear_display(self):
+        self.display = None
+        self.update_opcodes()
+
+    def update_opcodes(self):
+        """
+        Installs the JUMPI hook of the coverage, the SHA3 recorder, the dirty tracking of the
+        auto-display and the write hooks of the watchpoint table, only while they are needed.
+        """
+        opcodes = self.opcodes
+        if self.coverage is not None:
+            opcodes = self.coverage.make_opcodes(opcodes)
+        if self.preimages is not None:
+            opcodes = self.preimages.make_opcodes(opcodes)
+        if self.display is not None:
+            opcodes = self.display.make_opcodes(opcodes)
+        if len(self.watchpoints):
+            opcodes = self.watchpoints.make_opcodes(opcodes, self._on_watchpoint_hit)
+        self.computation_class.opcodes = opcodes
 
-    @classmethod
     def run_debugger(self, computation, line_no):
+        if self.debugger is not None:
+            self.debugger(computation, line_no)
+            return line_no
+        source_code, source_map = self.get_source(computation.msg.code)
         res = VyperDebugCmd(
             computation,
             line_no=line_no,
-            source_code=self.source_code,
-            source_map=self.source_map,
+            source_code=source_code,
+            source_map=source_map,
             stdin=self.stdin,
-            stdout=self.stdout
+            stdout=self.stdout,
+            session=self
         )
         res.cmdloop()
         self.step_mode = res.step_mode
         return line_no
 
+    def get_lookup(self, code=None):
+        # Lookup of the registered contract of `code`, else of the source map installed with
+        # set_debug_info, compiled once per installed source map.
+        if code is not None:
+            contract = self.get_contract(code)
+            if contract is not None:
+                return contract.lookup
+        if self.source_map is None:
+            return None
+        if self._lookup is None or self._lookup_source_map is not self.source_map:
+            self._lookup = SourceMapLookup(self.source_map)
+            self._lookup_source_map = self.source_map
+            self.breakpoints.apply(self._lookup)
+        return self._lookup
+
+    def update_breakpoints(self):
+        """
+        Applies changes of the breakpoint table, returns the line numbers that map to code.
+        """
+        lookup = self.get_lookup()
+        if lookup is None:
+            return set()
+        return self.breakpoints.apply(lookup)
+
+    def add_breakpoint(self, line_no, condition=None, temporary=False):
+        """
+        Adds a runtime breakpoint, raises ValueError for lines without code and
+        invalid conditions.
+        """
+        if self.source_map is None:
+            raise ValueError('No source map loaded.')
+        bp = self.breakpoints.add(line_no, self.source_map, condition, temporary)
+        if line_no not in self.update_breakpoints():
+            self.breakpoints.delete(bp.number)
+            self.update_breakpoints()
+            raise ValueError('Line {} has no code.'.format(line_no))
+        return bp
+
+    def is_instrumented(self):
+        """
+        Whether the instrumented opcode loop is needed. Without tracing, coverage, step
+        mode or any breakpoint to hit the stock py-evm loop is used instead.
+        """
+        if self.trace is not None or self.coverage is not None or self.step_mode:
+            return True
+        if self.profiler is not None and self.profiler.instrumented:
+            return True
+        if not self.enable_debug:
+            return False
+        if self.debugger is not None or len(self.watchpoints):
+            return True  # can be paused at any time.
+        lookup = self.get_lookup()
+        return (lookup is not None and lookup.has_breakpoints) or self.contracts.has_breakpoints
+
+
+class DebugComputation(ByzantiumComputation):
+    session = None  # DebugSession, set on the computation class of every session.
+
+    def __enter__(self):
+        profiler = self.session.profiler
+        if profiler is not None and not profiler.instrumented:
+            contract = self.session.get_contract(self.msg.code)
+            lookup = contract.lookup if contract is not None else self.session.get_lookup()
+            profiler.enter_computation(self, lookup.pc_lines if lookup else [], contract)
+        return super().__enter__()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        suppress = super().__exit__(exc_type, exc_value, traceback)
+        profiler = self.session.profiler
+        if profiler is not None and not profiler.instrumented:
+            profiler.exit_computation(self)
+        return suppress
+
+    @classmethod
+    def get_lookup(cls):
+        return cls.session.get_lookup()
+
     @classmethod
     def get_pos(cls, pc):
-        pc_pos_map = cls.source_map['line_number_map']['pc_pos_map']
-        if pc in pc_pos_map:
-            return pc_pos_map[pc]
+        lookup = cls.get_lookup()
+        if lookup is not None:
+            return lookup.get_pos(pc)
 
     @classmethod
     def get_line_no(cls, pc):
-        pos = cls.get_pos(pc)
-        if pos:
-            return pos[0]
+        lookup = cls.get_lookup()
+        if lookup is not None:
+            return lookup.get_line_no(pc)
         return None
 
     @classmethod
     def is_breakpoint(cls, pc, continue_line_nos):
-        line_no = cls.get_line_no(pc)
-        # PC breakpoint.
-        if pc in cls.source_map['line_number_map'].get('pc_breakpoints', {}):
+        lookup = cls.get_lookup()
+        if lookup is None:
+            return False, None
+        line_no = lookup.get_line_no(pc)
+        flags = lookup.get_breakpoints(pc + 1)[pc]
+        # PC or runtime line breakpoint.
+        if flags & (PC_BREAKPOINT | USER_BREAKPOINT):
             return True, line_no
         # Line no breakpoint.
-        breakpoint_lines = set(cls.source_map['line_number_map']['breakpoints'])
         if line_no is not None:
             if line_no in continue_line_nos:  # already been here, skip.
                 return False, line_no
-            return line_no in breakpoint_lines, line_no
+            return bool(flags), line_no
         return False, None
 
+    @classmethod
+    def is_instrumented(cls):
+        return cls.session.is_instrumented()
+
     @classmethod
     def apply_computation(cls, state, message, transaction_context):
+        session = cls.session
+        if not session.is_instrumented():
+            return super().apply_computation(state, message, transaction_context)
 
         with cls(state, message, transaction_context) as computation:
 
@@ -82,40 +329,84 @@ class DebugComputation(ByzantiumComputation):
                 computation.precompiles[message.code_address](computation)
                 return computation
 
-            continue_line_nos = []
+            # resolved once per computation, e.g. a nested call into another contract.
+            contract = session.get_contract(message.code)
+            if contract is not None:
+                lookup, source_code = contract.lookup, contract.source_code
+            else:
+                lookup, source_code = session.get_lookup(), session.source_code
+            if lookup is None:
+                lookup = SourceMapLookup(EMPTY_SOURCE_MAP)
+            breakpoints = lookup.get_breakpoints(len(computation.code))
+            pc_lines = lookup.pc_lines
+            visited_line_nos = set()
+            breakpoint_hit = session.breakpoints.hit
+            gas_meter = computation._gas_meter
+            trace = session.trace
+            if trace is not None:
+                record = trace.record
+                depth = message.depth
+                stack_values = computation._stack.values
+                memory = computation._memory
+            coverage = session.coverage
+            if coverage is not None:
+                executed = coverage.get_bitmaps(message.code)[0]
+            profiler = session.profiler
+            if profiler is not None and not profiler.instrumented:
+                profiler = None  # sampled from __enter__ / __exit__.
+            if profiler is not None:
+                profile_frame = profiler.enter(message.gas, contract)
+                profile_step = profile_frame.step
             for opcode in computation.code:
                 opcode_fn = computation.get_opcode_fn(opcode)
 
                 pc_to_execute = max(0, computation.code.pc - 1)
-                if cls.trace:
-                    print(
-                        "NEXT OPCODE: 0x%x (%s) | pc: %s..%s" %
-                        (opcode,
-                        opcode_fn.mnemonic,
-                        cls.pc,
-                        pc_to_execute)
+                if trace is not None:
+                    record(
+                        pc_to_execute,
+                        opcode,
+                        gas_meter.gas_remaining,
+                        len(stack_values),
+                        len(memory._bytes),
+                        depth,
+                        pc_lines[pc_to_execute] or 0
                     )
-                cls.pc = pc_to_execute
-
-                is_breakpoint, line_no = cls.is_breakpoint(pc_to_execute, continue_line_nos)
+                if profiler is not None:
+                    profile_step(pc_lines[pc_to_execute], gas_meter.gas_remaining)
+                if coverage is not None:
+                    executed[pc_to_execute] = 1
+                session.pc = pc_to_execute
 
-                if (is_breakpoint or cls.step_mode) and cls.enable_debug:
-                    cls.run_debugger(computation, line_no)
-                    continue_line_nos.append(line_no)
+                flags = breakpoints[pc_to_execute]
+                if session.enable_debug and (flags or session.step_mode):
+                    line_no = pc_lines[pc_to_execute]
+                    if session.step_mode or flags & PC_BREAKPOINT or \
+                       (flags & LINE_BREAKPOINT and line_no not in visited_line_nos) or \
+                       (flags & USER_BREAKPOINT and breakpoint_hit(computation, pc_to_execute)):
+                        session.run_debugger(computation, line_no)
+                        visited_line_nos.add(line_no)
 
                 try:
                     opcode_fn(computation=computation)
                 except VMError as e:  # re-raise with more details.
-                    pos = cls.get_pos(pc_to_execute)
+                    pos = lookup.get_pos(pc_to_execute)
                     msg = e.args[0]
                     msg = "" if len(msg) == 0 else msg
 
                     raise DebugVMError(
                         message=msg,
                         item=pos,
-                        source_code=cls.source_code
+                        source_code=source_code
                     ) from e
                 except Halt:
                     break
 
+        if profiler is not None:
+            profiler.exit(profile_frame, computation.get_gas_remaining())
         return computation
+
+
+# Session of computations run outside of a PyEVMDebugBackend, and of backends created
+# without a session.
+default_session = DebugSession()
+DebugComputation.session = default_session
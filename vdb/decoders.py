@@ -0,0 +1,346 @@
+import decimal
+import functools
+
+from eth_utils import (
+    big_endian_to_int,
+    to_hex,
+)
+
+from vdb.memory import (
+    read_memory,
+    read_memory_int,
+)
+
+
+DECIMAL_DIVISOR = 10 ** 10
+PAGE_SIZE = 20  # aggregate members shown at once.
+MAX_DEPTH = 3  # nested aggregates shown inline.
+SLOT_CACHE_SIZE = 4096
+
+
+def ceil32(x):
+    return x + 31 - (x - 1) % 32
+
+
+def decode_var(value, var_typ):
+    """
+    Decodes a raw storage (int) or memory (bytes) value of type `var_typ` to a Python value,
+    returns None for unsupported types.
+    """
+    from eth_abi import decode_single  # eth_abi is only loaded to decode values.
+
+    if isinstance(value, int):  # storage word.
+        v = value.to_bytes(32, 'big')
+    elif isinstance(value, bytearray):  # slice of memory.
+        v = bytes(value)
+    else:
+        v = value
+
+    if isinstance(v, bytes):
+        if var_typ in ('int128', 'uint256'):
+            if len(v) < 32:
+                v = v.rjust(32, b'\0')
+            return decode_single(var_typ, v)
+        elif var_typ == 'bool':
+            return big_endian_to_int(v) != 0
+        elif var_typ == 'decimal':
+            value = decode_single('int128', v.rjust(32, b'\0'))
+            return decimal.Decimal(value) / DECIMAL_DIVISOR
+        elif var_typ == 'address':
+            return to_hex(v[12:])
+        elif var_typ.startswith('bytes'):
+            return v
+        elif var_typ.startswith('string'):
+            return v.decode()
+    else:
+        return v.decode()
+
+
+@functools.lru_cache(maxsize=SLOT_CACHE_SIZE)
+def sha3_32(slot):
+    from eth_hash.auto import keccak
+    return big_endian_to_int(keccak(slot.to_bytes(32, 'big')))
+
+
+@functools.lru_cache(maxsize=SLOT_CACHE_SIZE)
+def sha3_64(slot, key):
+    from eth_hash.auto import keccak
+    return big_endian_to_int(keccak(slot.to_bytes(32, 'big') + key))
+
+
+def is_aggregate(layout):
+    return isinstance(layout, dict)
+
+
+def is_bytelike(layout):
+    return not is_aggregate(layout) and layout.startswith(('bytes[', 'string['))
+
+
+def get_maxlen(layout):
+    return int(layout[layout.index('[') + 1:-1])
+
+
+def get_size(layout):
+    """
+    Size of `layout` in memory, in 32 byte words.
+    """
+    if not is_aggregate(layout):
+        if is_bytelike(layout):
+            return ceil32(get_maxlen(layout)) // 32 + 2
+        return 1
+    elif layout['kind'] == 'list':
+        return get_size(layout['subtype']) * layout['count']
+    elif layout['kind'] == 'map':
+        raise ValueError('Maps have no size.')
+    return sum(get_size(member) for _, member in layout['members'])
+
+
+def encode_key(key, keytype):
+    """
+    Encodes map key `key`, as typed in vdb, the way vyper hashes keys of type `keytype`.
+    """
+    key = str(key).strip()
+    if keytype in ('int128', 'uint256'):
+        value = int(key, 0)
+    elif keytype == 'bool':
+        value = int(key.lower() in ('true', '1'))
+    elif keytype == 'decimal':
+        value = int(decimal.Decimal(key) * DECIMAL_DIVISOR)
+    elif keytype == 'address':
+        value = int(key, 16)
+    elif keytype == 'bytes32':
+        if key.startswith('0x') and len(key) == 66:
+            return bytes.fromhex(key[2:])
+        return key.encode().ljust(32, b'\0')
+    elif is_bytelike(keytype):
+        from eth_hash.auto import keccak
+        return keccak(key.encode())
+    else:
+        raise ValueError('Can not use keys of type "{}".'.format(keytype))
+    return (value % 2 ** 256).to_bytes(32, 'big')
+
+
+def decode_key(key, keytype, preimages=None):
+    """
+    Decodes raw 32 byte map key `key`, the inverse of encode_key. Keys of bytes and strings
+    are hashes, their value is looked up in `preimages`.
+    """
+    if is_bytelike(keytype):
+        preimage = preimages.get(big_endian_to_int(key)) if preimages is not None else None
+        if preimage is None:
+            return '<sha3 {}>'.format(to_hex(key))
+        return decode_var(preimage, keytype)
+    elif keytype == 'bytes32':
+        return key.rstrip(b'\0')  # as typed, see encode_key.
+    return decode_var(key, keytype)
+
+
+class MemoryLocation:
+    """
+    Variables in memory, referenced by their byte offset.
+    """
+    preimages = None
+
+    def __init__(self, computation):
+        self.computation = computation
+
+    def get_map_keys(self, ref):
+        return []
+
+    def child(self, ref, offset, index):
+        return ref + offset * 32
+
+    def map_value(self, ref, key):
+        raise ValueError('Maps can not be in memory.')
+
+    def read_base(self, ref):
+        return read_memory(self.computation, ref, 32)
+
+    def read_bytes(self, ref, maxlen):
+        length = min(read_memory_int(self.computation, ref), maxlen)
+        return read_memory(self.computation, ref + 32, length)
+
+
+class StorageLocation:
+    """
+    Variables in storage, referenced by their slot. Members of aggregates are stored from
+    the hash of the slot of the aggregate, bytes and strings from the hash of their slot.
+    """
+
+    def __init__(self, storage, preimages=None):
+        self.storage = storage  # vdb.storage.StorageReader
+        self.preimages = preimages  # vdb.preimages.PreimageIndex, to list map keys.
+
+    def get_map_keys(self, ref):
+        return self.preimages.get_map_keys(ref) if self.preimages is not None else []
+
+    def child(self, ref, offset, index):
+        return sha3_32(ref) + index
+
+    def map_value(self, ref, key):
+        return sha3_64(ref, key)
+
+    def read_base(self, ref):
+        return self.storage.get(ref)
+
+    def read_bytes(self, ref, maxlen):
+        base_slot = sha3_32(ref)
+        length = min(self.storage.get(base_slot), maxlen)
+        return bytes(self.storage.read_range(base_slot + 1, ceil32(length) // 32)[:length])
+
+
+def get_member(layout, location, ref, key):
+    """
+    Returns (layout, ref) of member `key` of aggregate `layout` at `ref`. Nothing is read:
+    member references are derived from the layout only.
+    """
+    kind = layout['kind']
+    key = str(key).strip()
+    if kind == 'map':
+        return layout['valuetype'], location.map_value(ref, encode_key(key, layout['keytype']))
+    elif kind == 'list':
+        try:
+            index = int(key, 0)
+        except ValueError:
+            raise ValueError('Invalid index "{}".'.format(key))
+        if index < 0:
+            index += layout['count']
+        if not 0 <= index < layout['count']:
+            raise ValueError('Index {} out of range.'.format(key))
+        subtype = layout['subtype']
+        return subtype, location.child(ref, index * get_size(subtype), index)
+    offset = 0
+    for index, (name, member) in enumerate(layout['members']):
+        if name == key:
+            return member, location.child(ref, offset, index)
+        offset += get_size(member)
+    raise ValueError('No member named "{}".'.format(key))
+
+
+def storage_slots(layout, slot):
+    """
+    Yields the storage slots holding the value of `layout` at `slot`.
+    """
+    if is_bytelike(layout):
+        base_slot = sha3_32(slot)
+        yield from range(base_slot, base_slot + ceil32(get_maxlen(layout)) // 32 + 1)
+    elif not is_aggregate(layout):
+        yield slot
+    elif layout['kind'] == 'map':
+        raise ValueError('Maps have no fixed slots, use [key].')
+    else:
+        if layout['kind'] == 'list':
+            members = [layout['subtype']] * layout['count']
+        else:
+            members = [member for _, member in layout['members']]
+        base_slot = sha3_32(slot)
+        for index, member in enumerate(members):
+            yield from storage_slots(member, base_slot + index)
+
+
+def decode(layout, location, ref):
+    """
+    Decodes the value of `layout` at `ref`. Aggregates are returned as Aggregate, read
+    only when their members are accessed.
+    """
+    if is_aggregate(layout):
+        return Aggregate(layout, location, ref)
+    elif is_bytelike(layout):
+        return decode_var(location.read_bytes(ref, get_maxlen(layout)), layout)
+    return decode_var(location.read_base(ref), layout)
+
+
+def format_value(value, depth=0, limit=PAGE_SIZE):
+    if isinstance(value, Aggregate):
+        return value.format(depth, limit)
+    # quote bytes and strings inside aggregates.
+    return repr(value) if depth and isinstance(value, (bytes, str)) else str(value)
+
+
+class Aggregate:
+    """
+    Lazily decoded struct, tuple, list or map. The members of maps are known only for
+    keys recorded by a PreimageIndex.
+    """
+
+    def __init__(self, layout, location, ref):
+        self.layout = layout
+        self.location = location
+        self.ref = ref
+
+    @property
+    def kind(self):
+        return self.layout['kind']
+
+    def _get_map_keys(self):
+        return self.location.get_map_keys(self.ref)
+
+    def __len__(self):
+        if self.kind == 'list':
+            return self.layout['count']
+        elif self.kind == 'map':
+            return len(self._get_map_keys())
+        return len(self.layout['members'])
+
+    def keys(self, start=0, count=PAGE_SIZE):
+        stop = min(len(self), start + count)
+        if self.kind == 'list':
+            return list(range(start, stop))
+        elif self.kind == 'map':
+            return [key for key, _ in self.items(start, count)]
+        return [name for name, _ in self.layout['members'][start:stop]]
+
+    def __getitem__(self, key):
+        layout, ref = get_member(self.layout, self.location, self.ref, key)
+        return decode(layout, self.location, ref)
+
+    def items(self, start=0, count=PAGE_SIZE):
+        """
+        Returns a page of (key, value) pairs, reading only the members of the page.
+        """
+        if self.kind == 'map':
+            keytype, valuetype = self.layout['keytype'], self.layout['valuetype']
+            keys = [
+                (decode_key(raw_key, keytype, self.location.preimages), raw_key)
+                for raw_key in self._get_map_keys()
+            ]
+            try:
+                keys.sort()
+            except TypeError:  # e.g. bytes keys without preimage.
+                pass
+            return [
+                (key, decode(valuetype, self.location, self.location.map_value(self.ref, raw_key)))
+                for key, raw_key in keys[start:start + count]
+            ]
+        return [(key, self[key]) for key in self.keys(start, count)]
+
+    def format(self, depth=0, limit=PAGE_SIZE):
+        """
+        Formats the first `limit` members (all for None), nested aggregates up to MAX_DEPTH.
+        """
+        if self.kind == 'map' and self.location.preimages is None:
+            return '<map, use [key]>'
+        if depth >= MAX_DEPTH:
+            return '...'
+        items = self.items(0, len(self) if limit is None else limit)
+        more = len(self) - len(items)
+        if self.kind in ('list', 'tuple'):
+            values = [format_value(value, depth + 1, limit) for _, value in items]
+        elif self.kind == 'map':
+            values = [
+                '{}: {}'.format(format_value(key, 1), format_value(value, depth + 1, limit))
+                for key, value in items
+            ]
+        else:
+            values = [
+                '{}={}'.format(key, format_value(value, depth + 1, limit)) for key, value in items
+            ]
+        if more:
+            values.append('... ({} more)'.format(more))
+        if self.kind == 'list':
+            return '[{}]'.format(', '.join(values))
+        elif self.kind == 'map':
+            return '{{{}}}'.format(', '.join(values))
+        elif self.kind == 'struct':
+            return '{}({})'.format(self.layout['name'], ', '.join(values))
+        return '({})'.format(', '.join(values))
@@ -0,0 +1,4 @@
+# Defaults shared by vdb and the command line options of vyper-run, which imports this
+# module before parsing its arguments: no dependencies.
+
+DEFAULT_MAX_PREIMAGES = 100000  # entries of the SHA3 preimage index, see PreimageIndex.
@@ -0,0 +1,161 @@
+from eth_utils import to_hex
+
+from vdb.decoders import decode_var
+from vdb.watchpoints import (
+    MEMORY_WRITES,
+    SSTORE,
+    _to_int,
+)
+
+MAX_DISPLAY_WORDS = 16  # dirty memory words and storage slots shown per stop.
+
+
+class DirtyTracker:
+    """
+    Memory words and storage slots written since the previous stop, for the auto-display.
+
+    The write opcodes record the old value of a word or slot the first time it is written
+    after a stop, and the size of memory at its first write: words past it were zero.
+    Nothing is copied or compared at a stop other than the dirty entries, the memory grown
+    since and the stack, so the cost of a step does not depend on the size of memory or
+    storage written before.
+    """
+
+    def __init__(self):
+        # memory -> (size at the first write, {word index: old value}), per computation.
+        self._memory = {}
+        self._storage = {}  # (address, slot) -> old value.
+        self._stack = None  # stack values at the previous stop.
+        self._stack_owner = None
+
+    def reset(self, computation):
+        self._memory = {}
+        self._storage = {}
+        self._stack = list(computation._stack.values)
+        self._stack_owner = computation._stack
+
+    #
+    # Opcode hooks
+    #
+    def make_opcodes(self, opcodes):
+        """
+        Returns a copy of the `opcodes` table with SSTORE and the memory writing opcodes
+        recording the old values of the locations they write.
+        """
+        opcodes = opcodes.copy()
+        opcodes[SSTORE] = self._wrap_sstore(opcodes[SSTORE])
+        for opcode, (depth, get_range) in MEMORY_WRITES.items():
+            opcodes[opcode] = self._wrap_memory_write(opcodes[opcode], depth, get_range)
+        return opcodes
+
+    def _wrap_sstore(self, opcode_fn):
+        def sstore(computation):
+            key = (computation.msg.storage_address, _to_int(computation._stack.values[-1]))
+            if key not in self._storage:
+                self._storage[key] = computation.state.account_db.get_storage(*key)
+            opcode_fn(computation=computation)
+
+        sstore.mnemonic = opcode_fn.mnemonic
+        return sstore
+
+    def _wrap_memory_write(self, opcode_fn, depth, get_range):
+        def memory_write(computation):
+            values = computation._stack.values
+            if len(values) < depth:
+                return opcode_fn(computation=computation)  # raises InsufficientStack.
+            start, size = (_to_int(x) for x in get_range(values))
+            if size:
+                memory = computation._memory
+                data = memory._bytes
+                if memory not in self._memory:
+                    self._memory[memory] = (len(data), {})
+                old_size, dirty = self._memory[memory]
+                # the range is only checked against the gas limit by the opcode.
+                end = min(start + size, old_size)
+                for word in range(start // 32, (end - 1) // 32 + 1):
+                    if word not in dirty:
+                        dirty[word] = bytes(data[word * 32:word * 32 + 32])
+            opcode_fn(computation=computation)
+
+        memory_write.mnemonic = opcode_fn.mnemonic
+        return memory_write
+
+    #
+    # Display
+    #
+    def get_stack_changes(self, computation):
+        """
+        Returns the (popped, pushed) stack values since the previous stop, top of the
+        stack first.
+        """
+        values = computation._stack.values
+        if self._stack_owner is not computation._stack:
+            return [], list(reversed(values))  # another call frame.
+        previous = self._stack
+        common = 0
+        limit = min(len(previous), len(values))
+        while common < limit and previous[common] == values[common]:
+            common += 1
+        return list(reversed(previous[common:])), list(reversed(values[common:]))
+
+    def get_memory_changes(self, computation):
+        """
+        Returns (word offset, old, new) of the memory words of `computation` that changed.
+        """
+        data = computation._memory._bytes
+        old_size, dirty = self._memory.get(computation._memory, (len(data), {}))
+        zero = bytes(32)
+        changes = []
+        for word in sorted(dirty):
+            new = bytes(data[word * 32:word * 32 + 32])
+            if new != dirty[word]:
+                changes.append((word * 32, dirty[word], new))
+        for offset in range(old_size, len(data), 32):
+            new = bytes(data[offset:offset + 32])
+            if new != zero:
+                changes.append((offset, zero, new))
+        return changes
+
+    def get_storage_changes(self, computation):
+        """
+        Returns (slot, old, new) of the storage slots of `computation` that changed.
+        """
+        address = computation.msg.storage_address
+        account_db = computation.state.account_db
+        changes = []
+        for (slot_address, slot), old in sorted(self._storage.items()):
+            if slot_address != address:
+                continue
+            new = account_db.get_storage(address, slot)
+            if new != old:
+                changes.append((slot, old, new))
+        return changes
+
+    def write_changes(self, stdout, computation, slot_vars=None):
+        """
+        Writes the changes since the previous stop, and starts tracking from this stop.
+        Slots in `slot_vars`, slot -> (name, type), are shown by name and decoded.
+        """
+        for label, values in zip(('Popped', 'Pushed'), self.get_stack_changes(computation)):
+            if values:
+                stdout.write('{}: {}{}\n'.format(
+                    label,
+                    ', '.join(to_hex(x) for x in values[:MAX_DISPLAY_WORDS]),
+                    ', ...' if len(values) > MAX_DISPLAY_WORDS else ''
+                ))
+        changes = self.get_memory_changes(computation)
+        for offset, old, new in changes[:MAX_DISPLAY_WORDS]:
+            stdout.write('mem[{}] {} -> {}\n'.format(hex(offset), to_hex(old), to_hex(new)))
+        if len(changes) > MAX_DISPLAY_WORDS:
+            stdout.write('... ({} more words)\n'.format(len(changes) - MAX_DISPLAY_WORDS))
+        changes = self.get_storage_changes(computation)
+        for slot, old, new in changes[:MAX_DISPLAY_WORDS]:
+            if slot_vars and slot in slot_vars:
+                name, var_type = slot_vars[slot]
+                old, new = decode_var(old, var_type), decode_var(new, var_type)
+            else:
+                name, old, new = hex(slot), hex(old), hex(new)
+            stdout.write('{}: {} -> {}\n'.format(name, old, new))
+        if len(changes) > MAX_DISPLAY_WORDS:
+            stdout.write('... ({} more slots)\n'.format(len(changes) - MAX_DISPLAY_WORDS))
+        self.reset(computation)
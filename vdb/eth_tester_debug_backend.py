@@ -1,9 +1,17 @@
+from collections import namedtuple
+import itertools
+
 from eth.chains.base import MiningChain
-from eth.db import get_db_backend
+from eth.db.atomic import AtomicDB
+from eth.db.backends.base import BaseDB
+from eth.db.backends.memory import MemoryDB
 from eth.vm.forks.byzantium import ByzantiumVM
 from eth.vm.forks.byzantium.state import ByzantiumState
 
-from vdb.debug_computation import DebugComputation
+from vdb.debug_computation import (
+    DebugComputation,
+    default_session,
+)
 
 from eth_tester.backends.pyevm.main import (
     get_default_genesis_params,
@@ -11,6 +19,7 @@ from eth_tester.backends.pyevm.main import (
     get_default_account_keys,
     PyEVMBackend
 )
+from eth_tester.exceptions import SnapshotNotFound
 
 
 class DebugState(ByzantiumState):
@@ -21,40 +30,249 @@ class DebugVM(ByzantiumVM):
     _state_class = DebugState  # type: Type[BaseState]
 
 
-def _setup_tester_chain(genesis_params, genesis_state, num_accounts):
+class DebugNoProofVM(DebugVM):
+    """Byzantium VM rules, without validating any miner proof of work"""
+
+    @classmethod
+    def validate_seal(self, header):
+        pass
+
+
+class MainnetTesterNoProofChain(MiningChain):
+    vm_configuration = ((0, DebugNoProofVM), )
+
+    @classmethod
+    def validate_seal(cls, block):
+        pass
+
+
+def make_chain_class(session):
+    """
+    Tester chain class running the computation class of `session`.
+    """
+    state_class = type(DebugState.__name__, (DebugState, ), {
+        'computation_class': session.computation_class,
+    })
+    vm_class = type(DebugNoProofVM.__name__, (DebugNoProofVM, ), {
+        '_state_class': state_class,
+    })
+    return type(MainnetTesterNoProofChain.__name__, (MainnetTesterNoProofChain, ), {
+        'vm_configuration': ((0, vm_class), ),
+    })
+
+
+# Full state of a tester chain: the key-value store of its in-memory database,
+# the pending header and the account keys.
+ChainSnapshot = namedtuple('ChainSnapshot', ('kv_store', 'header', 'account_keys'))
+# Named snapshot of a backend: the OverlayDB layer written since, the pending header and
+# the account keys.
+NamedSnapshot = namedtuple('NamedSnapshot', ('layer', 'header', 'account_keys'))
+
+# Genesis chains already built by this process, see _get_genesis_snapshot.
+_genesis_snapshots = {}
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def _take_chain_snapshot(chain, account_keys):
+    # Keys and values are immutable bytes, a shallow copy of the store is a full copy.
+    kv_store = chain.chaindb.db.wrapped_db.kv_store
+    return ChainSnapshot(dict(kv_store), chain.header, tuple(account_keys))
+
+
+class OverlayDB(BaseDB):
+    """
+    In-memory database of layers of changes over a read-only `base` dict, e.g. the store
+    of a genesis snapshot, shared and never copied.
+
+    checkpoint() starts a new layer, revert() drops the layers written since its checkpoint
+    and discard() merges a layer into the previous one: snapshots and reverts don't depend
+    on the size of the database, discarding costs the size of the layer. Reads look
+    through the layers, newest first, so every checkpoint kept adds a lookup to reads.
+    """
+
+    _deleted = object()
+
+    def __init__(self, base):
+        self._base = base
+        self._layers = [{}]
 
-    class DebugNoProofVM(DebugVM):
-        """Byzantium VM rules, without validating any miner proof of work"""
+    def __getitem__(self, key):
+        for layer in reversed(self._layers):
+            if key in layer:
+                value = layer[key]
+                if value is self._deleted:
+                    raise KeyError(key)
+                return value
+        return self._base[key]
 
-        @classmethod
-        def validate_seal(self, header):
-            pass
+    def __setitem__(self, key, value):
+        self._layers[-1][key] = value
 
-    class MainnetTesterNoProofChain(MiningChain):
-        vm_configuration = ((0, DebugNoProofVM), )
+    def _exists(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
 
-    genesis_params = get_default_genesis_params()
-    account_keys = get_default_account_keys(quantity=num_accounts)
-    genesis_state = generate_genesis_state_for_keys(account_keys)
+    def __delitem__(self, key):
+        if not self._exists(key):
+            raise KeyError(key)
+        self._layers[-1][key] = self._deleted
 
-    base_db = get_db_backend()
+    def checkpoint(self):
+        """
+        Starts a new layer, returns it as the checkpoint to revert to. Checkpoints without
+        changes between them share their layer.
+        """
+        if len(self._layers) > 1 and not self._layers[-1]:
+            return self._layers[-1]
+        layer = {}
+        self._layers.append(layer)
+        return layer
 
-    chain = MainnetTesterNoProofChain.from_genesis(base_db, genesis_params, genesis_state)
+    def has_checkpoint(self, layer):
+        return any(x is layer for x in self._layers)
+
+    def _index(self, layer):
+        for idx, x in enumerate(self._layers):
+            if x is layer:
+                return idx
+        raise KeyError('Unknown checkpoint.')
+
+    def revert(self, layer):
+        """
+        Drops the changes since the checkpoint `layer`, and the later checkpoints.
+        The checkpoint can be reverted to again.
+        """
+        idx = self._index(layer)
+        del self._layers[idx + 1:]
+        layer.clear()
+
+    def discard(self, layer):
+        """
+        Forgets the checkpoint `layer`, keeping its changes. Other checkpoints sharing the
+        layer are forgotten too.
+        """
+        idx = self._index(layer)
+        self._layers[idx - 1].update(self._layers.pop(idx))
+
+
+def _restore_chain_snapshot(chain_class, snapshot):
+    db = OverlayDB(snapshot.kv_store)
+    return db, snapshot.account_keys, chain_class(AtomicDB(db), snapshot.header)
+
+
+def _setup_tester_chain(genesis_params, genesis_state, num_accounts,
+                        chain_class=MainnetTesterNoProofChain):
+    if genesis_params is None:
+        genesis_params = get_default_genesis_params()
+
+    if genesis_state:
+        num_accounts = len(genesis_state)
+
+    account_keys = tuple(get_default_account_keys(quantity=num_accounts))
+
+    if genesis_state is None:
+        genesis_state = generate_genesis_state_for_keys(account_keys)
+
+    base_db = AtomicDB(MemoryDB())
+
+    chain = chain_class.from_genesis(base_db, genesis_params, genesis_state)
     return account_keys, chain
 
 
+def _get_genesis_snapshot(genesis_params, genesis_state, num_accounts):
+    """
+    Builds the genesis chain once per process and set of arguments, later resets share
+    its database as the read-only base of an OverlayDB. Note the default genesis timestamp
+    is the one of the first reset.
+    """
+    key = (_freeze(genesis_params), _freeze(genesis_state), num_accounts)
+    snapshot = _genesis_snapshots.get(key)
+    if snapshot is None:
+        account_keys, chain = _setup_tester_chain(genesis_params, genesis_state, num_accounts)
+        snapshot = _genesis_snapshots[key] = _take_chain_snapshot(chain, account_keys)
+    return snapshot
+
+
 class PyEVMDebugBackend(PyEVMBackend):
+    # Computation of the last transaction sent with send_transaction, gives access to the
+    # return data of a transaction without executing it again as a call.
+    last_computation = None
+
+    def __init__(self, genesis_parameters=None, genesis_state=None, session=None):
+        """
+        Backends share the default debug session (configured by set_debug_info) unless
+        given their own vdb.debug_computation.DebugSession.
+        """
+        self.session = default_session if session is None else session
+        self.chain_class = make_chain_class(self.session)
+        self._db = None  # OverlayDB of the chain.
+        self._snapshots = {}
+        self._snapshot_counter = itertools.count()
+        super().__init__(genesis_parameters, genesis_state)
 
-    def __init__(self, ):
-        super().__init__()
+    def send_transaction(self, transaction):
+        signed_evm_transaction = self._get_normalized_and_signed_evm_transaction(
+            transaction,
+        )
+        _, _, self.last_computation = self.chain.apply_transaction(signed_evm_transaction)
+        return signed_evm_transaction.hash
 
     def reset_to_genesis(self, genesis_params=None, genesis_state=None, num_accounts=None):
-        self.account_keys, self.chain = _setup_tester_chain(genesis_params, genesis_state,
-                                                            num_accounts)
+        snapshot = _get_genesis_snapshot(genesis_params, genesis_state, num_accounts)
+        self._db, self.account_keys, self.chain = _restore_chain_snapshot(
+            self.chain_class, snapshot
+        )
+        self._snapshots = {}  # checkpoints of the previous database.
+
+    #
+    # Snapshots
+    #
+    def take_snapshot(self, name=None):
+        """
+        Saves the full chain state, including pending (unmined) transactions, under
+        `name` (e.g. 'after deployment'). Returns the name, or an id when none is given.
+
+        A snapshot is a checkpoint of the OverlayDB of the chain: later writes go to a new
+        layer. Reverting drops the snapshots taken after it, reset_to_genesis drops all.
+        """
+        if name is None:
+            name = next(self._snapshot_counter)
+        if name in self._snapshots:
+            self.delete_snapshot(name)
+        self._snapshots[name] = NamedSnapshot(
+            self._db.checkpoint(), self.chain.header, tuple(self.account_keys)
+        )
+        return name
+
+    def revert_to_snapshot(self, snapshot):
+        try:
+            named_snapshot = self._snapshots[snapshot]
+        except KeyError:
+            raise SnapshotNotFound("No snapshot found for: {0}".format(snapshot))
+        self._db.revert(named_snapshot.layer)
+        self._snapshots = {
+            name: x for name, x in self._snapshots.items() if self._db.has_checkpoint(x.layer)
+        }
+        self.account_keys = named_snapshot.account_keys
+        self.chain = self.chain_class(AtomicDB(self._db), named_snapshot.header)
+
+    def delete_snapshot(self, name):
+        named_snapshot = self._snapshots.pop(name, None)
+        if named_snapshot is not None and not any(
+            x.layer is named_snapshot.layer for x in self._snapshots.values()
+        ):
+            self._db.discard(named_snapshot.layer)
 
 
-def set_debug_info(source_code, source_map, stdin=None, stdout=None):
-    setattr(DebugComputation, 'source_code', source_code)
-    setattr(DebugComputation, 'source_map', source_map)
-    setattr(DebugComputation, 'stdin', stdin)
-    setattr(DebugComputation, 'stdout', stdout)
+def set_debug_info(source_code, source_map, stdin=None, stdout=None, session=None):
+    if session is None:
+        session = default_session
+    session.set_debug_info(source_code, source_map, stdin, stdout)
@@ -0,0 +1,58 @@
+import contextlib
+
+
+BYTES_PER_LINE = 16
+
+
+@contextlib.contextmanager
+def memory_view(computation):
+    """
+    View of the memory of `computation`, slices of it do not copy. Memory can not grow
+    while a view is held, it is released when the block exits.
+    """
+    view = memoryview(computation._memory._bytes)
+    try:
+        yield view
+    finally:
+        view.release()
+
+
+def read_memory(computation, start, size):
+    """
+    Returns `size` bytes of memory from `start`, copying only those bytes. Bytes past the
+    end of memory read as zero, memory is not extended.
+    """
+    with memory_view(computation) as view:
+        return bytes(view[start:start + size]).ljust(size, b'\0')
+
+
+def read_memory_int(computation, start):
+    with memory_view(computation) as view:
+        return int.from_bytes(view[start:start + 32], 'big')
+
+
+def _format_line(offset, chunk):
+    hex_bytes = ['{:02x}'.format(b) for b in chunk]
+    columns = ' '.join(hex_bytes[:8]) + '  ' + ' '.join(hex_bytes[8:])
+    text = ''.join(chr(b) if 0x20 <= b < 0x7f else '.' for b in chunk)
+    return '{:08x}  {:<48}  |{}|'.format(offset, columns, text)
+
+
+def hexdump_lines(view, start, length):
+    """
+    Yields `hexdump -C` style lines of `view[start:start + length]`, one line at a time.
+    Repeated lines are collapsed into `*`.
+    """
+    end = min(start + length, len(view))
+    previous = None
+    squeezed = False
+    for offset in range(start, end, BYTES_PER_LINE):
+        chunk = view[offset:min(offset + BYTES_PER_LINE, end)]
+        if chunk == previous and offset + BYTES_PER_LINE < end:
+            if not squeezed:
+                squeezed = True
+                yield '*'
+            continue
+        squeezed = False
+        previous = bytes(chunk)
+        yield _format_line(offset, previous)
@@ -0,0 +1,78 @@
+import collections
+
+from eth_utils import big_endian_to_int
+
+from vdb.defaults import DEFAULT_MAX_PREIMAGES
+
+
+SHA3 = 0x20
+MAX_PREIMAGE_SIZE = 128  # longer inputs are not map keys nor short bytes keys.
+
+
+def _to_int(value):
+    return big_endian_to_int(value) if isinstance(value, bytes) else value
+
+
+class PreimageIndex:
+    """
+    Bounded index of the inputs of the SHA3 opcode, digest -> preimage.
+
+    vyper derives the slot of `map[key]` as sha3(slot of map ++ key), 64 byte preimages are
+    also indexed by the slot of their map, which gives the keys written or read so far.
+    The least recently recorded entries are evicted past `max_entries`.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_PREIMAGES):
+        self.max_entries = max_entries
+        self._preimages = collections.OrderedDict()
+        self._children = {}  # map slot -> digests of its keys.
+
+    def __len__(self):
+        return len(self._preimages)
+
+    def add(self, digest, preimage):
+        if digest in self._preimages:
+            self._preimages.move_to_end(digest)
+            return
+        self._preimages[digest] = preimage
+        if len(preimage) == 64:
+            self._children.setdefault(big_endian_to_int(preimage[:32]), set()).add(digest)
+        if len(self._preimages) > self.max_entries:
+            self._evict()
+
+    def _evict(self):
+        digest, preimage = self._preimages.popitem(last=False)
+        if len(preimage) == 64:
+            slot = big_endian_to_int(preimage[:32])
+            children = self._children[slot]
+            children.discard(digest)
+            if not children:
+                del self._children[slot]
+
+    def get(self, digest):
+        return self._preimages.get(digest)
+
+    def get_map_keys(self, slot):
+        """
+        Returns the raw (32 byte) keys of the map at `slot` recorded so far, sorted.
+        """
+        return sorted(self._preimages[digest][32:] for digest in self._children.get(slot, ()))
+
+    def make_opcodes(self, opcodes):
+        """
+        Returns a copy of the `opcodes` table with SHA3 recording its input.
+        """
+        opcodes = opcodes.copy()
+        opcode_fn = opcodes[SHA3]
+        add = self.add
+
+        def sha3(computation):
+            values = computation._stack.values
+            start, size = _to_int(values[-1]), _to_int(values[-2])
+            opcode_fn(computation=computation)
+            if size <= MAX_PREIMAGE_SIZE:
+                add(_to_int(values[-1]), bytes(computation._memory._bytes[start:start + size]))
+
+        sha3.mnemonic = opcode_fn.mnemonic
+        opcodes[SHA3] = sha3
+        return opcodes
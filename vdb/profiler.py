@@ -0,0 +1,400 @@
+import sys
+import threading
+from time import perf_counter
+
+from vdb.source_map import (
+    find_function,
+    get_function_index,
+)
+
+
+GAS, COUNT, TIME = range(3)
+WEIGHTS = {'gas': GAS, 'count': COUNT, 'time': TIME}
+
+
+class ProfileFrame:
+    """
+    Accumulates the cost of a single computation (call frame).
+
+    The cost of an opcode (gas and wall time) is only known once the next opcode starts,
+    so every step attributes the previous delta to the previous line. Gas and time spent
+    in child computations are reported back by the child and excluded here.
+    """
+
+    def __init__(self, profiler, prefix, start_gas, contract=None):
+        self.profiler = profiler
+        self.prefix = prefix
+        self.start_gas = start_gas
+        self.start_time = perf_counter()
+        self.contract = contract  # name of the registered contract, None for the default.
+        self.line_no = None
+        self.location = None
+        self.gas = None
+        self.time = None
+        self.child_gas = 0
+        self.child_time = 0.0
+        self._stat = None
+
+    def set_line(self, line_no):
+        self.line_no = line_no
+        self.location = line_no if self.contract is None else (self.contract, line_no)
+
+    def step(self, line_no, gas_remaining, count=1):
+        now = perf_counter()
+        stat = self._stat
+        if stat is not None:
+            stat[GAS] += self.gas - gas_remaining - self.child_gas
+            stat[COUNT] += count
+            stat[TIME] += now - self.time - self.child_time
+            self.child_gas = 0
+            self.child_time = 0.0
+        if line_no != self.line_no or stat is None:
+            self.set_line(line_no)
+            self._stat = self.profiler.get_stat(self.prefix, self.location)
+        self.gas = gas_remaining
+        self.time = now
+
+    def charge(self, gas, count, t):
+        """
+        Adds a cost to the current line, e.g. the estimate of a sample.
+        """
+        stat = self.profiler.get_stat(self.prefix, self.location)
+        stat[GAS] += gas
+        stat[COUNT] += count
+        stat[TIME] += t
+
+    def finish(self, gas_remaining, count=1):
+        stat = self._stat
+        if stat is not None:
+            stat[GAS] += self.gas - gas_remaining - self.child_gas
+            stat[COUNT] += count
+            stat[TIME] += perf_counter() - self.time - self.child_time
+            self._stat = None
+
+
+class Profiler:
+    """
+    Exact profiler, aggregates gas used, opcode count and wall time per source line
+    and call stack.
+
+    Stats are keyed by (prefix, location), where prefix is the tuple of calling locations
+    for nested (cross contract) calls. Locations are line numbers, or (name, line number)
+    in contracts registered with DebugSession.register_contract.
+    """
+
+    # Whether steps are taken from the instrumented opcode loop.
+    instrumented = True
+
+    def __init__(self, source_map=None):
+        self.stats = {}
+        self._frames = []
+        self._function_index = None
+        self._source_maps = {}  # name -> source map, of registered contracts.
+        if source_map is not None:
+            self.set_source_map(source_map)
+
+    def set_source_map(self, source_map):
+        self._function_index = get_function_index(source_map)
+
+    def get_fn_name(self, location):
+        """
+        Returns the name of the function at `location` (see find_function), prefixed with
+        the name of registered contracts. None outside of functions, e.g. in the dispatcher.
+        """
+        if isinstance(location, tuple):  # line of a registered contract.
+            name, line_no = location
+            fn_name = find_function(get_function_index(self._source_maps[name]), line_no)
+            return '{}.{}'.format(name, fn_name) if fn_name else None
+        if self._function_index is None:
+            return None
+        return find_function(self._function_index, location)
+
+    def get_stat(self, prefix, line_no):
+        key = (prefix, line_no)
+        stat = self.stats.get(key)
+        if stat is None:
+            stat = self.stats[key] = [0, 0, 0.0]
+        return stat
+
+    def enter(self, start_gas, contract=None):
+        """
+        Starts a frame, of the registered `contract` (a vdb.registry.ContractDebugInfo) or
+        of the default source map.
+        """
+        if self._frames:
+            parent = self._frames[-1]
+            prefix = parent.prefix + (parent.location, )
+        else:
+            prefix = ()
+        if contract is not None:
+            self._source_maps.setdefault(contract.name, contract.source_map)
+        frame = ProfileFrame(self, prefix, start_gas, contract.name if contract else None)
+        self._frames.append(frame)
+        return frame
+
+    def exit(self, frame, gas_remaining, count=1):
+        frame.finish(gas_remaining, count)
+        self._frames.pop()
+        if self._frames:
+            parent = self._frames[-1]
+            parent.child_gas += frame.start_gas - gas_remaining
+            parent.child_time += perf_counter() - frame.start_time
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    #
+    # Reports
+    #
+    def line_stats(self):
+        out = {}
+        for (_, line_no), stat in self.stats.items():
+            total = out.setdefault(line_no, [0, 0, 0.0])
+            for i in range(3):
+                total[i] += stat[i]
+        return out
+
+    def function_stats(self):
+        out = {}
+        for location, stat in self.line_stats().items():
+            fn_name = self.get_fn_name(location)
+            if fn_name is None:  # the dispatcher, labelled with the contract name if any.
+                fn_name = location[0] if isinstance(location, tuple) else '(unknown)'
+            total = out.setdefault(fn_name, [0, 0, 0.0])
+            for i in range(3):
+                total[i] += stat[i]
+        return out
+
+    def write_annotated_source(self, source_code, stdout, contract=None):
+        # lines of the registered `contract` (its name), by default of the default source.
+        line_stats = {}
+        for location, stat in self.line_stats().items():
+            if not isinstance(location, tuple) and contract is None:
+                line_stats[location] = stat
+            elif isinstance(location, tuple) and location[0] == contract:
+                line_stats[location[1]] = stat
+        stdout.write('{:>10} {:>8} {:>10}  {:>4}  {}\n'.format(
+            'gas', 'opcodes', 'time (ms)', 'line', 'source'
+        ))
+        for line_no, line in enumerate(source_code.splitlines(), start=1):
+            if line_no in line_stats:
+                gas, count, t = line_stats[line_no]
+                stdout.write('{:>10} {:>8} {:>10.3f}  {:>4}  {}\n'.format(
+                    gas, count, t * 1000, line_no, line
+                ))
+            else:
+                stdout.write('{:>10} {:>8} {:>10}  {:>4}  {}\n'.format('', '', '', line_no, line))
+
+        stdout.write('\n{:>10} {:>8} {:>10}  {}\n'.format(
+            'gas', 'opcodes', 'time (ms)', 'function'
+        ))
+        function_stats = sorted(self.function_stats().items(), key=lambda x: -x[1][GAS])
+        for fn_name, (gas, count, t) in function_stats:
+            stdout.write('{:>10} {:>8} {:>10.3f}  {}\n'.format(gas, count, t * 1000, fn_name))
+
+    def write_collapsed_stacks(self, fh, weight='gas'):
+        """
+        Write stacks in the collapsed format read by flamegraph.pl / speedscope / inferno,
+        every line is a `function;function:line` frame pair,
+        e.g. `transfer;transfer:12;credit;credit:40 2300`. Time is written in microseconds.
+        Code outside of functions (the dispatcher) is a single frame named after its
+        registered contract, and is left out for the default source.
+        """
+        idx = WEIGHTS[weight]
+        collapsed = {}
+        for (prefix, line_no), stat in self.stats.items():
+            frames = []
+            for location in prefix + (line_no, ):
+                fn_name = self.get_fn_name(location)
+                if fn_name is not None:
+                    frame_line_no = location[1] if isinstance(location, tuple) else location
+                    frames.extend([fn_name, '{}:{}'.format(fn_name, frame_line_no)])
+                elif isinstance(location, tuple):
+                    frames.append(location[0])
+            if not frames:
+                continue
+            key = ';'.join(frames)
+            collapsed[key] = collapsed.get(key, 0) + stat[idx]
+        for key, value in sorted(collapsed.items()):
+            if idx == TIME:
+                value = int(value * 1e6)
+            if value > 0:
+                fh.write('{} {}\n'.format(key, value))
+
+
+def _get_line(pc_lines, pc):
+    return pc_lines[pc] if pc < len(pc_lines) else None
+
+
+def _make_counting_get_opcode_fn(computation, frame):
+    get_opcode_fn = computation.get_opcode_fn
+
+    def get_counted_opcode_fn(opcode):
+        frame.opcodes += 1
+        return get_opcode_fn(opcode)
+
+    return get_counted_opcode_fn
+
+
+class SamplingProfiler(Profiler):
+    """
+    Sampling profiler, produces the same reports as Profiler at a fraction of the cost.
+    The VM runs the stock py-evm loop, computations register on __enter__ / __exit__.
+
+    - every_opcodes=N: a countdown in get_opcode_fn samples every N-th opcode, its line is
+      charged N opcodes and N times the gas and time of the sampled opcode.
+    - interval=T (seconds): a background thread samples the innermost active computation
+      every T seconds, the line running at its pc is charged the opcodes, gas and time of
+      the computation since its previous sample (or its start). Opcodes are counted by
+      get_opcode_fn.
+
+    Use as a context manager (or start() / stop()) around the transactions to profile. The
+    interval mode lowers the switch interval of the whole process while it runs (see start).
+    """
+
+    instrumented = False
+
+    def __init__(self, source_map=None, every_opcodes=None, interval=None):
+        if (every_opcodes is None) == (interval is None):
+            raise ValueError('Provide exactly one of every_opcodes or interval.')
+        super().__init__(source_map)
+        self.sample_every = every_opcodes
+        self.interval = interval
+        self._countdown = [1]  # opcodes to the next sample, across computations.
+        self._active = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    def enter_computation(self, computation, pc_lines, contract=None):
+        with self._lock:
+            if self._active:
+                # nested call, made from the current pc of the caller.
+                caller, caller_pc_lines, caller_frame = self._active[-1]
+                caller_frame.set_line(_get_line(caller_pc_lines, caller.code.pc - 1))
+            frame = self.enter(computation.msg.gas, contract)
+            frame.gas = computation.msg.gas
+            frame.time = frame.start_time
+            frame.opcodes = frame.sampled_opcodes = 0
+            self._active.append((computation, pc_lines, frame))
+        # shadows the method of the computation class.
+        if self.sample_every is not None:
+            computation.get_opcode_fn = self._make_get_opcode_fn(computation, pc_lines, frame)
+        else:
+            computation.get_opcode_fn = _make_counting_get_opcode_fn(computation, frame)
+
+    def exit_computation(self, computation):
+        with self._lock:
+            _, pc_lines, frame = self._active.pop()
+            gas_remaining = computation.get_gas_remaining()
+            if self.interval is not None:
+                # the rest, since the last sample, goes to the last line.
+                self._charge_interval(computation, pc_lines, frame, gas_remaining)
+            self.exit(frame, gas_remaining, count=0)
+
+    def _make_get_opcode_fn(self, computation, pc_lines, frame):
+        get_opcode_fn = computation.get_opcode_fn
+        countdown = self._countdown
+        sample_every = self.sample_every
+
+        def get_sampled_opcode_fn(opcode):
+            countdown[0] -= 1
+            if countdown[0]:
+                return get_opcode_fn(opcode)
+            countdown[0] = sample_every
+            return self._make_sample(get_opcode_fn(opcode), pc_lines, frame)
+
+        return get_sampled_opcode_fn
+
+    def _make_sample(self, opcode_fn, pc_lines, frame):
+        sample_every = self.sample_every
+
+        def sample(computation):
+            frame.set_line(_get_line(pc_lines, computation.code.pc - 1))
+            gas_meter = computation._gas_meter
+            gas = gas_meter.gas_remaining
+            frame.child_gas = 0
+            frame.child_time = 0.0
+            start = perf_counter()
+            try:
+                opcode_fn(computation=computation)
+            finally:
+                # nested calls are charged to their own frames.
+                frame.charge(
+                    (gas - gas_meter.gas_remaining - frame.child_gas) * sample_every,
+                    sample_every,
+                    (perf_counter() - start - frame.child_time) * sample_every,
+                )
+
+        sample.mnemonic = opcode_fn.mnemonic
+        return sample
+
+    def _sample(self):
+        with self._lock:
+            if not self._active:
+                return
+            computation, pc_lines, frame = self._active[-1]
+            gas_remaining = computation._gas_meter.gas_remaining
+            self._charge_interval(computation, pc_lines, frame, gas_remaining)
+
+    @staticmethod
+    def _charge_interval(computation, pc_lines, frame, gas_remaining):
+        # charges the cost since the previous sample of `frame` to its current line, nested
+        # calls are charged to their own frames.
+        now = perf_counter()
+        opcodes = frame.opcodes  # only incremented by the VM thread.
+        frame.set_line(_get_line(pc_lines, max(0, computation.code.pc - 1)))
+        frame.charge(
+            frame.gas - gas_remaining - frame.child_gas,
+            opcodes - frame.sampled_opcodes,
+            now - frame.time - frame.child_time,
+        )
+        frame.gas = gas_remaining
+        frame.time = now
+        frame.sampled_opcodes = opcodes
+        frame.child_gas = 0
+        frame.child_time = 0.0
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        """
+        Starts the sampler thread of the interval mode. Until stop(), the switch interval of
+        the interpreter (sys.setswitchinterval) is lowered to the sampling interval, which
+        changes it for every thread of the process; prefer the context manager.
+        """
+        if self.interval is None or self._thread is not None:
+            return
+        # Let the sampler thread acquire the GIL at least once per interval.
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.interval))
+        self._stop_event.clear()
+        try:
+            self._thread = threading.Thread(target=self._run, name='vdb-sampler', daemon=True)
+            self._thread.start()
+        except BaseException:
+            self._thread = None
+            sys.setswitchinterval(self._switch_interval)
+            raise
+
+    def stop(self):
+        if self.interval is None or self._thread is None:
+            return
+        self._stop_event.set()
+        try:
+            self._thread.join()
+        finally:
+            self._thread = None
+            sys.setswitchinterval(self._switch_interval)
@@ -0,0 +1,103 @@
+import collections
+import itertools
+
+from eth_hash.auto import keccak
+from eth_utils import to_hex
+
+from vdb.source_map import SourceMapLookup
+
+
+CODE_CACHE_SIZE = 256  # codes resolved without hashing.
+
+
+class ContractDebugInfo:
+    """
+    Source code and source map of a registered contract, its SourceMapLookup is compiled
+    once, on registration.
+    """
+
+    def __init__(self, name, code_hash, source_code, source_map):
+        self.name = name
+        self.code_hash = code_hash
+        self.source_code = source_code
+        self.source_map = source_map
+        self.lookup = SourceMapLookup(source_map)
+
+
+class DebugInfoRegistry:
+    """
+    Debug info of contracts by the hash of their runtime code, and of their deployment
+    code.
+
+    Every computation resolves the source map of the code it runs on entry (see
+    DebugSession.get_contract), so nested calls into other registered contracts map pcs to
+    lines of their own source. Deployment code is followed by the constructor arguments,
+    its hash is taken over the length of the registered deployment codes. Code is hashed
+    once, the CODE_CACHE_SIZE most recently resolved codes are cached by value.
+    """
+
+    def __init__(self):
+        self.contracts = {}  # runtime code hash -> ContractDebugInfo
+        self.constructors = {}  # deployment code hash -> ContractDebugInfo
+        self.has_breakpoints = False  # whether any registered source has `vdb` statements.
+        self._init_code_sizes = set()
+        # code -> ContractDebugInfo, or None if not registered.
+        self._by_code = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.contracts)
+
+    def __iter__(self):
+        return iter(self.contracts.values())
+
+    def register(self, source_code, debug_info, name=None):
+        """
+        Registers a contract compiled to `debug_info` (see produce_debug_info), `name`
+        (by default the start of its code hash) labels it in reports.
+        Returns its ContractDebugInfo.
+        """
+        source_map = debug_info['source_map']
+        code = bytes.fromhex(debug_info['bytecode_runtime'][2:])
+        code_hash = to_hex(keccak(code))
+        contract = ContractDebugInfo(name or code_hash[:10], code_hash, source_code, source_map)
+        self.contracts[code_hash] = contract
+        if 'init_line_number_map' in source_map:
+            init_code = bytes.fromhex(debug_info['bytecode'][2:])
+            init_hash = to_hex(keccak(init_code))
+            self.constructors[init_hash] = ContractDebugInfo(
+                contract.name, init_hash, source_code,
+                dict(source_map, line_number_map=source_map['init_line_number_map'])
+            )
+            self._init_code_sizes.add(len(init_code))
+        self.has_breakpoints = any(
+            c.lookup.has_breakpoints
+            for c in itertools.chain(self.contracts.values(), self.constructors.values())
+        )
+        self._by_code.clear()  # code that was not registered so far may be now.
+        return contract
+
+    def get(self, code):
+        """
+        Returns the ContractDebugInfo of runtime or deployment `code`, None if it is not
+        registered.
+        """
+        by_code = self._by_code
+        try:
+            contract = by_code[code]
+        except KeyError:
+            contract = by_code[code] = self._find(code)
+            if len(by_code) > CODE_CACHE_SIZE:
+                by_code.popitem(last=False)
+        else:
+            by_code.move_to_end(code)
+        return contract
+
+    def _find(self, code):
+        contract = self.contracts.get(to_hex(keccak(code)))
+        if contract is None:
+            for size in self._init_code_sizes:
+                if len(code) >= size:
+                    contract = self.constructors.get(to_hex(keccak(code[:size])))
+                    if contract is not None:
+                        break
+        return contract
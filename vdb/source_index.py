@@ -0,0 +1,59 @@
+# Function index and source lines of a source map, used when debugging: no dependency on
+# vyper, which is only loaded to compile (see vdb.source_map).
+import bisect
+
+
+def _mk_function_index(_locals):
+    ranges = sorted(
+        (info['from_lineno'], info['to_lineno'], name) for name, info in _locals.items()
+    )
+    return {
+        'starts': [x[0] for x in ranges],
+        'ends': [x[1] for x in ranges],
+        'names': [x[2] for x in ranges],
+    }
+
+
+def get_function_index(source_map):
+    """
+    Returns the function index of `source_map`, built for source maps without one.
+    """
+    if 'function_index' not in source_map:
+        source_map['function_index'] = _mk_function_index(source_map.get('locals', {}))
+    return source_map['function_index']
+
+
+def find_function(function_index, line_no):
+    """
+    Returns the name of the function at `line_no`, None outside of functions. A line shared
+    by two ranges (the end of a function is the start of the next) belongs to the first.
+    """
+    if line_no is None:
+        return None
+    idx = bisect.bisect_left(function_index['ends'], line_no)
+    if idx < len(function_index['starts']) and function_index['starts'][idx] <= line_no:
+        return function_index['names'][idx]
+    return None
+
+
+def get_line_offsets(code):
+    """
+    Returns the offsets in `code` of the start of every line, and the length of `code`.
+    """
+    offsets = [0]
+    for line in code.splitlines(keepends=True):
+        offsets.append(offsets[-1] + len(line))
+    return offsets
+
+
+def get_source_lines(code, line_offsets, begin, end):
+    """
+    Yields (line_no, line) of lines `begin` to `end` (inclusive, from 1) of `code`, reading
+    only those lines when `line_offsets` are the offsets of `code`.
+    """
+    if line_offsets is None or line_offsets[-1] != len(code):
+        line_offsets = get_line_offsets(code)
+    begin, end = max(begin, 1), min(end, len(line_offsets) - 1)
+    for line_no in range(begin, end + 1):
+        line = code[line_offsets[line_no - 1]:line_offsets[line_no]]
+        yield line_no, (line.splitlines() or [''])[0]
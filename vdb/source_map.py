@@ -4,7 +4,17 @@ from vyper.parser import (
 from vyper.parser.global_context import (
     GlobalContext
 )
+from vyper.signatures import (
+    sig_utils,
+)
+from vyper.signatures.event_signature import (
+    EventSignature,
+)
+from vyper.signatures.function_signature import (
+    FunctionSignature,
+)
 from vyper.types import (
+    BaseType,
     ByteArrayType,
     get_size_of_type,
     MappingType,
@@ -15,7 +25,44 @@ from vyper.types import (
 )
 from vyper import compile_lll
 from vyper import optimizer
-from vyper.parser.parser import parse_to_lll
+
+from vdb.cache import get_debug_info_cache
+from vdb.source_index import (  # noqa: F401
+    _mk_function_index,
+    find_function,
+    get_function_index,
+    get_line_offsets,
+    get_source_lines,
+)
+
+
+def get_type_layout(typ):
+    """
+    Layout descriptor of `typ` read by vdb.decoders: the type name for base types, bytes
+    and strings, a dict with the member layouts for structs, tuples, lists and maps.
+    """
+    if isinstance(typ, StructType):
+        return {
+            'kind': 'struct',
+            'name': typ.name,
+            'members': [[name, get_type_layout(t)] for name, t in typ.members.items()],
+        }
+    elif isinstance(typ, TupleType):
+        return {
+            'kind': 'tuple',
+            'members': [[str(idx), get_type_layout(t)] for idx, t in enumerate(typ.members)],
+        }
+    elif isinstance(typ, ListType):
+        return {'kind': 'list', 'subtype': get_type_layout(typ.subtype), 'count': typ.count}
+    elif isinstance(typ, MappingType):
+        return {
+            'kind': 'map',
+            'keytype': get_type_layout(typ.keytype),
+            'valuetype': get_type_layout(typ.valuetype),
+        }
+    elif isinstance(typ, BaseType):
+        return typ.typ  # without units.
+    return str(typ)
 
 
 def serialise_var_rec(var_rec):
@@ -46,45 +93,70 @@ def serialise_var_rec(var_rec):
         'size': _size,
         'position': var_rec.pos
     }
+    if isinstance(var_rec.typ, (StructType, TupleType, ListType, MappingType)):
+        out['layout'] = get_type_layout(var_rec.typ)
     return out
 
 
-def produce_source_map(code, interface_codes=None):
-    global_ctx = GlobalContext.get_global_context(
-        parser.parse_to_ast(code),
-        interface_codes=interface_codes
-    )
-    asm_list = compile_lll.compile_to_assembly(
-        optimizer.optimize(
-            parse_to_lll(
-                code,
-                runtime_only=True,
-                interface_codes=interface_codes
-            )
+def _get_runtime_lll(lll):
+    # The runtime code is wrapped as ['return', 0, ['lll', runtime, 0]] at the end of
+    # the deployment LLL.
+    if lll.value == 'seq' and lll.args and lll.args[-1].value == 'return':
+        return lll.args[-1].args[1].args[0]
+    return None
+
+
+def _get_init_line_number_map(asm_list, runtime_size):
+    # compile_lll.assembly_to_evm returns the line number map of the runtime code nested in
+    # the deployment assembly, map the deployment code the same way.
+    pc_pos_map = {}
+    pos = 0
+    for idx, item in enumerate(asm_list):
+        if isinstance(item, compile_lll.instruction) and getattr(item, 'lineno', None):
+            pc_pos_map[pos] = item.lineno, item.col_offset
+        if item == 'DEBUG' or item == 'BLANK':
+            continue
+        elif compile_lll.is_symbol(item):
+            if asm_list[idx + 1] not in ('JUMPDEST', 'BLANK'):
+                pos += 3  # PUSH2 of the symbol.
+        elif isinstance(item, list):
+            pos += runtime_size
+        else:
+            pos += 1
+    return {'breakpoints': [], 'pc_breakpoints': [], 'pc_pos_map': pc_pos_map}
+
+
+def _mk_abi(global_ctx, gas_estimates):
+    # Same output as vyper.compiler.mk_full_signature, re-using the global context.
+    abi = []
+    for event in global_ctx._events:
+        sig = EventSignature.from_declaration(event, global_ctx)
+        abi.append(sig.to_abi_dict(global_ctx._custom_units_descriptions))
+
+    for _def in global_ctx._defs:
+        sig = FunctionSignature.from_definition(
+            _def,
+            sigs=global_ctx._contracts,
+            custom_units=global_ctx._custom_units,
+            custom_structs=global_ctx._structs,
+            constants=global_ctx._constants
         )
-    )
-    c, line_number_map = compile_lll.assembly_to_evm(asm_list)
-    source_map = {
-        'globals': {},
-        'locals': {},
-        'line_number_map': line_number_map
-    }
-    source_map['globals'] = {
-        name: serialise_var_rec(var_record)
-        for name, var_record in global_ctx._globals.items()
-    }
-    # Fetch context for each function.
-    lll = parser.parse_tree_to_lll(
-        parser.parse_to_ast(code),
-        code,
-        interface_codes=interface_codes,
-        runtime_only=True
-    )
-    contexts = {
-        f.func_name: f.context
-        for f in lll.args[1:] if hasattr(f, 'context')
-    }
+        if not sig.private:
+            default_sigs = sig_utils.generate_default_arg_sigs(
+                _def, global_ctx._contracts, global_ctx
+            )
+            for s in default_sigs:
+                abi.append(s.to_abi_dict(global_ctx._custom_units_descriptions))
+
+    for func in abi:
+        func_name, _, _ = func.get('name', '').partition('(')
+        if func_name in gas_estimates:
+            func['gas'] = gas_estimates[func_name]
+    return abi
 
+
+def _mk_locals(code, global_ctx, contexts):
+    _locals = {}
     prev_func_name = None
     for _def in global_ctx._defs:
         if _def.name != '__init__':
@@ -99,12 +171,179 @@ def produce_source_map(code, interface_codes=None):
                 for var_name, var_rec in context.vars.items()
             }
 
-            source_map['locals'][_def.name] = func_info
+            _locals[_def.name] = func_info
             # set to_lineno
             if prev_func_name:
-                source_map['locals'][prev_func_name]['to_lineno'] = _def.lineno
+                _locals[prev_func_name]['to_lineno'] = _def.lineno
             prev_func_name = _def.name
 
-    source_map['locals'][_def.name]['to_lineno'] = len(code.splitlines())
+    if prev_func_name:
+        _locals[prev_func_name]['to_lineno'] = len(code.splitlines())
+    return _locals
+
+
+def _produce_debug_info(code, interface_codes=None):
+    # Parse and lower to LLL only once, everything else is derived from the
+    # deployment LLL.
+    lll = parser.parse_tree_to_lll(
+        parser.parse_to_ast(code),
+        code,
+        interface_codes=interface_codes
+    )
+    runtime_lll = _get_runtime_lll(lll)
+    runtime_funcs = runtime_lll.args[1:] if runtime_lll is not None else []
+    contexts = {
+        f.func_name: f.context
+        for f in list(lll.args) + list(runtime_funcs) if hasattr(f, 'context')
+    }
+    if contexts:
+        global_ctx = next(iter(contexts.values())).global_ctx
+    else:
+        global_ctx = GlobalContext.get_global_context(
+            parser.parse_to_ast(code),
+            interface_codes=interface_codes
+        )
+
+    optimized_lll = optimizer.optimize(lll)
+    asm_list = compile_lll.compile_to_assembly(optimized_lll)
+    bytecode, _ = compile_lll.assembly_to_evm(asm_list)
+    # The runtime assembly is the only nested assembly list.
+    runtime_asm_list = next((x for x in asm_list if isinstance(x, list)), [])
+    bytecode_runtime, line_number_map = compile_lll.assembly_to_evm(runtime_asm_list)
+
+    optimized_runtime_lll = _get_runtime_lll(optimized_lll)
+    gas_estimates = {
+        f.func_name: f.total_gas
+        for f in (optimized_runtime_lll.args if optimized_runtime_lll is not None else [])
+        if f.func_name is not None
+    }
+
+    _locals = _mk_locals(code, global_ctx, contexts)
+    source_map = {
+        'globals': {
+            name: serialise_var_rec(var_record)
+            for name, var_record in global_ctx._globals.items()
+        },
+        'locals': _locals,
+        'function_index': _mk_function_index(_locals),
+        'line_offsets': get_line_offsets(code),
+        'line_number_map': line_number_map,
+        'init_line_number_map': _get_init_line_number_map(asm_list, len(bytecode_runtime)),
+    }
+    return {
+        'abi': _mk_abi(global_ctx, gas_estimates),
+        'bytecode': '0x' + bytecode.hex(),
+        'bytecode_runtime': '0x' + bytecode_runtime.hex(),
+        'source_map': source_map,
+    }
+
+
+def produce_debug_info(code, interface_codes=None):
+    """
+    Compile `code` in a single pass, returns a dict with the `abi`, `bytecode`,
+    `bytecode_runtime` and `source_map` of the contract.
+    """
+    cache = get_debug_info_cache()
+    if cache is None:
+        return _produce_debug_info(code, interface_codes)
+
+    key = cache.make_key(code, interface_codes)
+    debug_info = cache.get(key)
+    if debug_info is None:
+        debug_info = _produce_debug_info(code, interface_codes)
+        cache.set(key, debug_info)
+    return debug_info
+
+
+def produce_source_map(code, interface_codes=None):
+    return produce_debug_info(code, interface_codes)['source_map']
+
+
+LINE_BREAKPOINT = 1
+PC_BREAKPOINT = 2
+USER_BREAKPOINT = 4  # set at runtime, see SourceMapLookup.set_line_breakpoints.
+
+
+class SourceMapLookup:
+    """
+    Array backed lookup tables compiled from a source map, indexed by pc.
+
+    `pc_lines` maps pc -> line number (or None), `breakpoints` is a bitmap of
+    LINE_BREAKPOINT / PC_BREAKPOINT / USER_BREAKPOINT flags indexed by pc.
+    """
+
+    def __init__(self, source_map):
+        line_number_map = source_map['line_number_map']
+        pc_pos_map = line_number_map['pc_pos_map']
+        pc_breakpoints = line_number_map.get('pc_breakpoints', [])
+        breakpoint_lines = set(line_number_map['breakpoints'])
+
+        size = max(list(pc_pos_map) + list(pc_breakpoints), default=-1) + 1
+        self.pc_positions = [None] * size
+        self.pc_lines = [None] * size
+        self.breakpoints = bytearray(size)
+        for pc, pos in pc_pos_map.items():
+            self.pc_positions[pc] = pos
+            self.pc_lines[pc] = pos[0]
+            if pos[0] in breakpoint_lines:
+                self.breakpoints[pc] |= LINE_BREAKPOINT
+        for pc in pc_breakpoints:
+            self.breakpoints[pc] |= PC_BREAKPOINT
+        self.has_breakpoints = any(self.breakpoints)
+        self._line_starts = None
+
+    def get_line_starts(self):
+        """
+        Returns {line_no: [pc]}, the first pc of every run of consecutive pcs of a line.
+        """
+        if self._line_starts is None:
+            self._line_starts = {}
+            prev_line_no = None
+            for pc, line_no in enumerate(self.pc_lines):
+                if line_no is None:
+                    continue
+                if line_no != prev_line_no:
+                    self._line_starts.setdefault(line_no, []).append(pc)
+                prev_line_no = line_no
+        return self._line_starts
+
+    def set_line_breakpoints(self, line_nos):
+        """
+        Replaces the runtime line breakpoints, these hit every time execution enters
+        one of the lines. Returns the line numbers that map to code.
+        """
+        breakpoints = self.breakpoints
+        for pc, flags in enumerate(breakpoints):
+            if flags & USER_BREAKPOINT:
+                breakpoints[pc] = flags & ~USER_BREAKPOINT
+        line_starts = self.get_line_starts()
+        verified = set()
+        for line_no in line_nos:
+            for pc in line_starts.get(line_no, ()):
+                breakpoints[pc] |= USER_BREAKPOINT
+                verified.add(line_no)
+        self.has_breakpoints = any(breakpoints)
+        return verified
+
+    def _grow(self, size):
+        extra = size - len(self.breakpoints)
+        if extra > 0:
+            self.pc_positions.extend([None] * extra)
+            self.pc_lines.extend([None] * extra)
+            self.breakpoints.extend(bytes(extra))
+
+    def get_breakpoints(self, code_size):
+        """
+        Returns the breakpoint bitmap, padded to at least `code_size` so that every pc
+        of the code being executed can be indexed without bounds checks.
+        """
+        self._grow(code_size)
+        return self.breakpoints
+
+    def get_pos(self, pc):
+        if pc < len(self.pc_positions):
+            return self.pc_positions[pc]
 
-    return source_map
+    def get_line_no(self, pc):
+        if pc < len(self.pc_lines):
+            return self.pc_lines[pc]
@@ -0,0 +1,40 @@
+class StorageReader:
+    """
+    Reads the storage of an account, caching slot values.
+
+    Storage does not change while execution is stopped, so one reader is used per pause
+    (see VyperDebugCmd): inspecting the same globals again does not touch the account db.
+    """
+
+    def __init__(self, account_db, address):
+        self.account_db = account_db
+        self.address = address
+        self._values = {}
+
+    @classmethod
+    def from_computation(cls, computation):
+        # storage of the account the computation runs in.
+        return cls(computation.state.account_db, computation.msg.storage_address)
+
+    def get(self, slot):
+        try:
+            return self._values[slot]
+        except KeyError:
+            value = self._values[slot] = self.account_db.get_storage(self.address, slot)
+            return value
+
+    def read_range(self, start, count):
+        """
+        Returns the `count` slots from `start` as one bytearray of `count` * 32 bytes.
+        """
+        buffer = bytearray(count * 32)
+        values = self._values
+        get_storage = self.account_db.get_storage
+        address = self.address
+        for idx, slot in enumerate(range(start, start + count)):
+            value = values.get(slot)
+            if value is None:
+                value = values[slot] = get_storage(address, slot)
+            if value:  # the buffer is zero filled.
+                buffer[idx * 32:idx * 32 + 32] = value.to_bytes(32, 'big')
+        return buffer
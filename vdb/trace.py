@@ -0,0 +1,130 @@
+from array import array
+import json
+import struct
+import sys
+
+
+TRACE_MAGIC = b'VDBTRACE'
+TRACE_VERSION = 1
+DEFAULT_CHUNK_SIZE = 1 << 20  # records kept in memory before flushing to disk.
+
+# (name, array typecode) of every field of a trace record.
+TRACE_FIELDS = (
+    ('pc', 'I'),
+    ('opcode', 'B'),
+    ('gas_remaining', 'Q'),
+    ('stack_depth', 'H'),
+    ('memory_size', 'I'),
+    ('depth', 'H'),
+    ('line_no', 'I'),  # 0 when the pc has no source position.
+)
+
+_header = struct.Struct('<8sHI')
+_chunk_header = struct.Struct('<I')
+
+
+def _dtype(typecode):
+    return '<u%d' % array(typecode).itemsize
+
+
+class TraceRecorder:
+    """
+    Execution trace recorder, appends fixed width records to one typed array per field
+    and flushes them as chunks to a compact binary file.
+
+    File layout (little endian):
+        header: magic, version, length of the JSON field description, field description
+        chunks: record count, followed by the raw array of every field in order.
+    """
+
+    def __init__(self, path, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.total_records = 0
+        self._columns = [array(typecode) for _, typecode in TRACE_FIELDS]
+        (self._pc, self._opcode, self._gas, self._stack_depth,
+         self._memory_size, self._depth, self._line_no) = (c.append for c in self._columns)
+        self._fh = open(path, 'wb')
+        fields = json.dumps([(name, _dtype(typecode)) for name, typecode in TRACE_FIELDS])
+        self._fh.write(_header.pack(TRACE_MAGIC, TRACE_VERSION, len(fields)))
+        self._fh.write(fields.encode())
+
+    def record(self, pc, opcode, gas_remaining, stack_depth, memory_size, depth, line_no):
+        self._pc(pc)
+        self._opcode(opcode)
+        self._gas(gas_remaining)
+        self._stack_depth(stack_depth)
+        self._memory_size(memory_size)
+        self._depth(depth)
+        self._line_no(line_no)
+        if len(self._columns[0]) >= self.chunk_size:
+            self.flush()
+
+    def __len__(self):
+        return self.total_records + len(self._columns[0])
+
+    def flush(self):
+        count = len(self._columns[0])
+        if not count:
+            return
+        self._fh.write(_chunk_header.pack(count))
+        for column in self._columns:
+            if sys.byteorder == 'big':
+                column.byteswap()
+            column.tofile(self._fh)
+            del column[:]
+        self.total_records += count
+
+    def close(self):
+        if not self._fh.closed:
+            self.flush()
+            self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def iter_trace_chunks(path):
+    """
+    Yields ([(field_name, dtype)], record count, {field_name: raw bytes}) for every chunk.
+    """
+    with open(path, 'rb') as fh:
+        magic, version, fields_len = _header.unpack(fh.read(_header.size))
+        if magic != TRACE_MAGIC or version != TRACE_VERSION:
+            raise ValueError('{} is not a vdb trace file (version {}).'.format(
+                path, TRACE_VERSION
+            ))
+        fields = json.loads(fh.read(fields_len).decode())
+        while True:
+            count_bytes = fh.read(_chunk_header.size)
+            if not count_bytes:
+                break
+            count, = _chunk_header.unpack(count_bytes)
+            chunk = {}
+            for name, dtype in fields:
+                chunk[name] = fh.read(count * int(dtype[2:]))
+            yield fields, count, chunk
+
+
+def read_trace(path):
+    """
+    Read a trace file written by TraceRecorder, returns a dict of field name -> numpy array.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        raise ImportError('Reading traces requires numpy, install it with `pip install numpy`.')
+
+    dtypes = {name: _dtype(typecode) for name, typecode in TRACE_FIELDS}
+    parts = {name: [] for name in dtypes}
+    for fields, _, chunk in iter_trace_chunks(path):
+        for name, dtype in fields:
+            dtypes[name] = dtype
+            parts.setdefault(name, []).append(np.frombuffer(chunk[name], dtype=dtype))
+    return {
+        name: np.concatenate(parts[name]) if parts[name] else np.empty(0, dtype=dtypes[name])
+        for name in dtypes
+    }
@@ -1,11 +1,32 @@
-from eth_hash.auto import keccak
-from eth_abi import decode_single
+import functools
+import re
+
 from eth_utils import (
-    to_hex,
     big_endian_to_int,
     int_to_big_endian,
 )
-from vyper.utils import ceil32
+
+from vdb.decoders import (
+    SLOT_CACHE_SIZE,
+    Aggregate,
+    MemoryLocation,
+    StorageLocation,
+    ceil32,
+    decode,
+    decode_var,
+    format_value,
+    get_maxlen,
+    get_member,
+    is_aggregate,
+    is_bytelike,
+    sha3_32,
+    storage_slots,
+)
+from vdb.memory import (
+    read_memory,
+    read_memory_int,
+)
+from vdb.storage import StorageReader
 
 
 base_types = (
@@ -14,126 +35,254 @@ base_types = (
     'address',
     'bytes32'
 )
+# `.member` and `[key]` accessors of a variable.
+MEMBER_RE = re.compile(r"\.(\w+)|\[([^\]]*)\]")
+
+
+class VariableError(Exception):
+    pass
 
 
 def print_var(stdout, value, var_typ):
+    value = decode_var(value, var_typ)
+    if value is not None:
+        stdout.write(str(value) + '\n')
 
-    if isinstance(value, int):
-        v = int_to_big_endian(value)
-    else:
-        v = value
-
-    if isinstance(v, bytes):
-        if var_typ in ('int128', 'uint256'):
-            if len(v) < 32:
-                v = v.rjust(32, b'\0')
-            stdout.write(str(decode_single(var_typ, v)) + '\n')
-        elif var_typ == 'address':
-            stdout.write(to_hex(v[12:]) + '\n')
-        elif var_typ.startswith('bytes'):
-            stdout.write(str(v) + '\n')
-        elif var_typ.startswith('string'):
-            stdout.write(v.decode() + '\n')
-    else:
-        stdout.write(v.decode() + '\n')
+
+def print_value(stdout, value, page=None):
+    """
+    Prints a decoded value, `page` (`start:stop`) prints only those members of a list or
+    struct, one per line.
+    """
+    if page is None:
+        if value is not None:
+            stdout.write(format_value(value) + '\n')
+        return
+    if not isinstance(value, Aggregate) or \
+       (value.kind == 'map' and value.location.preimages is None):
+        raise VariableError('Only lists, structs, tuples and recorded maps can be paged.')
+    start, _, stop = page.partition(':')
+    try:
+        start = int(start or '0', 0)
+        stop = int(stop, 0) if stop.strip() else len(value)
+    except ValueError:
+        raise VariableError('Invalid page "{}", use [start:stop].'.format(page))
+    for key, item in value.items(start, stop - start):
+        stdout.write('[{}] {}\n'.format(format_value(key), format_value(item, depth=1)))
+
+
+def _base_type(var_type):
+    # without units, e.g. uint256(wei)
+    return var_type.split('(', 1)[0] if not var_type.startswith('map') else var_type
+
+
+def parse_var_name(name):
+    """
+    Splits `<name>.member[key]...` into the variable name and the keys of its members.
+    """
+    var_name = re.match(r'\w*', name).group()
+    keys = [
+        attr or key.replace('\'', '').replace('"', '')
+        for attr, key in MEMBER_RE.findall(name[len(var_name):])
+    ]
+    return var_name, keys
+
+
+def _pop_page(keys):
+    return keys.pop() if keys and ':' in keys[-1] else None
+
+
+def _get_member_value(value, keys):
+    for key in keys:
+        if not isinstance(value, Aggregate):
+            raise VariableError('Can not get "{}" of a {}.'.format(key, type(value).__name__))
+        try:
+            value = value[key]
+        except ValueError as e:
+            raise VariableError(str(e))
+    return value
+
+
+def read_local(var_info, computation):
+    """
+    Returns the raw value of a local variable, None if its type can not be read.
+    """
+    local_type = _base_type(var_info['type'])
+    start_position = var_info['position']
+    if local_type in base_types or local_type in ('bool', 'decimal'):
+        return read_memory(computation, start_position, 32)
+    elif is_bytelike(local_type):
+        byte_len = min(read_memory_int(computation, start_position), get_maxlen(local_type))
+        return read_memory(computation, start_position + 32, byte_len)
+    return None
+
+
+def read_local_value(local_variables, computation, var_name, keys=()):
+    """
+    Returns the decoded value of local `var_name`, indexed by `keys`, aggregates as
+    vdb.decoders.Aggregate. Raises VariableError if it can not be read.
+    """
+    var_info = local_variables[var_name]
+    if 'layout' in var_info:
+        value = decode(var_info['layout'], MemoryLocation(computation), var_info['position'])
+        return _get_member_value(value, keys)
+    value = read_local(var_info, computation) if not keys else None
+    if value is None:
+        raise VariableError('Can not read local of type "{}".'.format(var_info['type']))
+    return decode_var(value, _base_type(var_info['type']))
 
 
 def parse_local(stdout, local_variables, computation, line):
-    var_info = local_variables[line]
+    var_name, keys = parse_var_name(line)
+    page = _pop_page(keys)
+    var_info = local_variables[var_name]
     local_type = var_info['type']
-    if local_type in base_types:
-        start_position = var_info['position']
-        value = computation._memory._bytes[start_position:start_position + 32]
-        print_var(stdout, value, local_type)
-    elif local_type.startswith('bytes') or local_type.startswith('string'):
-        start_position = var_info['position']
-        byte_len = big_endian_to_int(computation.memory_read(start_position, 32))
-        if byte_len == 0:
-            stdout.write("(empty)\n")
-        value = computation.memory_read(start_position + 32, byte_len)
-        print_var(stdout, value, local_type)
-    else:
+    if 'layout' in var_info:
+        value = decode(var_info['layout'], MemoryLocation(computation), var_info['position'])
+        try:
+            print_value(stdout, _get_member_value(value, keys), page)
+        except VariableError as e:
+            stdout.write(str(e) + '\n')
+        return
+    value = read_local(var_info, computation) if not keys else None
+    if value is None:
         stdout.write('Can not read local of type "{}" \n'.format(local_type))
+        return
+    if len(value) == 0 and is_bytelike(local_type):
+        stdout.write("(empty)\n")
+    print_var(stdout, value, _base_type(local_type))
 
 
-def get_keys(n):
-    out = []
-    name = n
-    for _ in range(name.count('[')):
-        open_pos = name.find('[')
-        close_pos = name.find(']')
-        key = name[open_pos + 1:close_pos].replace('\'', '').replace('"', '')
-        name = name[close_pos + 1:]
-        out.append(key)
-    return out
+@functools.lru_cache(maxsize=SLOT_CACHE_SIZE)
+def _get_map_slot(var_pos, keys):
+    from eth_hash.auto import keccak
+    if len(keys) > 1:
+        key_inp = _get_map_slot(var_pos, keys[:-1]).to_bytes(32, 'big')
+    else:
+        key_inp = int_to_big_endian(var_pos).rjust(32, b'\0')
+    return big_endian_to_int(keccak(key_inp + keys[-1].encode().ljust(32, b'\0')))
 
 
 def get_hash(var_pos, keys, _type):
-    key_inp = b''
-
-    key_inp = keccak(
-        int_to_big_endian(var_pos).rjust(32, b'\0') +
-        keys[0].encode().ljust(32, b'\0')
-    )
-    for key in keys[1:]:
-        key_inp = keccak(key_inp + key.encode().ljust(32, b'\0'))
-    slot = big_endian_to_int(key_inp)
+    # derivations are cached per key path, the prefixes of nested maps are shared.
+    return _get_map_slot(var_pos, tuple(keys))
+
+
+def _get_global_member(global_vars, var_name, keys=()):
+    """
+    Returns (layout, slot) of global `var_name`, indexed by `keys`.
+    """
+    if var_name not in global_vars:
+        raise VariableError('Global named "{}" not found.'.format(var_name))
+
+    var_info = global_vars[var_name]
+    global_type = var_info['type']
+    if 'layout' in var_info:
+        layout, slot = var_info['layout'], var_info['position']
+        for key in keys:
+            if not is_aggregate(layout):
+                raise VariableError('Can not get "{}" of type "{}".'.format(key, layout))
+            try:
+                layout, slot = get_member(layout, StorageLocation(None), slot, key)
+            except ValueError as e:
+                raise VariableError(str(e))
+        return layout, slot
+    elif global_type.startswith('map') and keys and global_type.count('(') == len(keys):
+        # source maps without layouts, bytes32 keys.
+        value_type = global_type[global_type.rfind(',') + 1: global_type.rfind(')')].strip()
+        return value_type, get_hash(var_info['position'], keys, global_type)
+    elif not keys and not global_type.startswith('map'):
+        return _base_type(global_type), var_info['position']
+    raise VariableError('Can not read global of type "{}".'.format(global_type))
+
+
+def get_global_slot(global_vars, var_name, keys=()):
+    """
+    Returns the storage slot of global `var_name`, indexed by `keys` for maps, lists and
+    structs. Raises VariableError if it can not be read.
+    """
+    layout, slot = _get_global_member(global_vars, var_name, keys)
+    if is_aggregate(layout):
+        raise VariableError('Can not read global of type "{}".'.format(layout['kind']))
     return slot
 
 
-def valid_subscript(name, global_type):
-    if name.count('[') != name.count(']'):
-        return False
-    elif global_type.count('(') != name.count(']'):
-        return False
-    return True
+def get_global_slots(global_vars, var_name, keys=()):
+    """
+    Returns all storage slots holding global `var_name`, including the members of lists
+    and structs.
+    """
+    layout, slot = _get_global_member(global_vars, var_name, keys)
+    try:
+        return list(storage_slots(layout, slot))
+    except ValueError as e:
+        raise VariableError(str(e))
+
+
+def parse_global_name(line):
+    """
+    Splits `self.<name>[key].member...` into the global name and keys.
+    """
+    return parse_var_name(line.split('.', 1)[1] if '.' in line else '')
 
 
-def parse_global(stdout, global_vars, computation, line):
+def read_global(global_vars, computation, var_name, keys=(), storage=None):
+    """
+    Returns (raw value, value type) of global `var_name`, indexed by `keys`.
+    `storage` is the StorageReader of the current pause, if any.
+    Raises VariableError if it can not be read.
+    """
+    layout, slot = _get_global_member(global_vars, var_name, keys)
+    if is_aggregate(layout):
+        raise VariableError('Can not read global of type "{}".'.format(layout['kind']))
+    if storage is None:
+        storage = StorageReader.from_computation(computation)
+
+    if is_bytelike(layout):
+        base_slot_hash = sha3_32(slot)
+        len_val = storage.get(base_slot_hash)
+        # never read past the data slots of the type.
+        num_slots = min(ceil32(len_val), ceil32(get_maxlen(layout))) // 32
+        value = bytes(storage.read_range(base_slot_hash + 1, num_slots)[:len_val])
+    else:
+        value = storage.get(slot)
+    return value, layout
+
+
+def read_global_value(global_vars, storage, var_name, keys=(), preimages=None):
+    """
+    Returns the decoded value of global `var_name`, indexed by `keys`, aggregates as
+    vdb.decoders.Aggregate. Maps list the keys recorded in `preimages`.
+    """
+    layout, slot = _get_global_member(global_vars, var_name, keys)
+    return decode(layout, StorageLocation(storage, preimages), slot)
+
+
+def parse_global(stdout, global_vars, computation, line, storage=None, preimages=None):
     # print global value.
-    name = line.split('.')[1]
-    var_name = name[:name.find('[')] if '[' in name else name
+    var_name, keys = parse_global_name(line)
+    page = _pop_page(keys)
+    if storage is None:
+        storage = StorageReader.from_computation(computation)
 
-    if var_name not in global_vars:
-        stdout.write('Global named "{}" not found.'.format(var_name) + '\n')
-        return
+    try:
+        print_value(
+            stdout, read_global_value(global_vars, storage, var_name, keys, preimages), page
+        )
+    except VariableError as e:
+        stdout.write(str(e) + '\n')
 
-    global_type = global_vars[var_name]['type']
-    slot = None
-    size = global_vars[var_name]['size']
-    is_bytelike = global_type.startswith('bytes') or global_type.startswith('string')
-
-    if global_type in base_types or is_bytelike:
-        slot = global_vars[var_name]['position']
-    elif global_type.startswith('map') and valid_subscript(name, global_type):
-        keys = get_keys(name)
-        var_pos = global_vars[var_name]['position']
-        slot = get_hash(var_pos, keys, global_type)
-
-    if slot is not None:
-        if is_bytelike:
-            value = b""
-            base_slot_hash = big_endian_to_int(keccak(int_to_big_endian(slot).rjust(32, b'\0')))
-            len_val = computation.state.account_db.get_storage(
-                address=computation.msg.storage_address,
-                slot=base_slot_hash,
-            )
-            for i in range(0, ceil32(len_val) // 32):
-                sub_slot = base_slot_hash + 1 + i
-                value += int_to_big_endian(
-                    computation.state.account_db.get_storage(
-                    address=computation.msg.storage_address,
-                    slot=sub_slot,
-                    )
-                )
-            value = value[:len_val]
-        else:
-            value = computation.state.account_db.get_storage(
-                address=computation.msg.storage_address,
-                slot=slot,
+
+def dump_globals(stdout, global_vars, storage, preimages=None):
+    """
+    Prints every global, lists and maps in full (map keys as recorded in `preimages`).
+    """
+    for var_name in sorted(global_vars):
+        try:
+            value = format_value(
+                read_global_value(global_vars, storage, var_name, preimages=preimages),
+                limit=None
             )
-        if global_type.startswith('map'):
-            global_type = global_type[global_type.rfind(',') + 1: global_type.rfind(')')].strip()
-        print_var(stdout, value, global_type)
-    else:
-        stdout.write('Can not read global of type "{}".\n'.format(global_type))
+        except VariableError as e:
+            value = str(e)
+        stdout.write('self.{} = {}\n'.format(var_name, value))
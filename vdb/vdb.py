@@ -1,28 +1,62 @@
 import cmd
-import readline
+import functools
 import sys
 from eth_utils import (
     to_hex,
     to_int,
 )
 
-import eth.vm
-from eth import constants
-from eth.vm.opcode import as_opcode
-from vyper.opcodes import opcodes as vyper_opcodes
+from vdb.decoders import (
+    Aggregate,
+    format_value,
+    is_bytelike,
+)
+from vdb.memory import (
+    hexdump_lines,
+    memory_view,
+    read_memory,
+)
+from vdb.source_index import (
+    find_function,
+    get_function_index,
+    get_source_lines,
+)
+from vdb.storage import StorageReader
 from vdb.variables import (
+    VariableError,
+    dump_globals,
+    get_global_slots,
     parse_global,
-    parse_local
+    parse_global_name,
+    parse_local,
+    parse_var_name,
+    read_global_value,
 )
 
 commands = [
+    'break',
     'continue',
+    'delete',
+    'display',
+    'dump',
+    'globals',
+    'hexdump',
+    'ignore',
+    'keys',
     'locals',
-    'globals'
+    'tbreak',
+    'unwatch',
+    'watch',
+    'x',
 ]
 
+DEFAULT_DUMP_LENGTH = 256
+DUMP_PAGE_SIZE = 1024  # bytes written per `x`, the rest is continued by `x`.
+UINT256 = 'uint256'  # eth.constants.UINT256
+
 
 def history(stdout):
+    import readline
     for i in range(1, readline.get_current_history_length() + 1):
         stdout.write("%3d %s" % (i, readline.get_history_item(i)) + '\n')
 
@@ -41,15 +75,22 @@ class VyperDebugCmd(cmd.Cmd):
     prompt = '\033[92mvdb\033[0m> '
 
     def __init__(self, computation, line_no=None, source_code=None, source_map=None,
-                 stdout=None, stdin=None):
+                 stdout=None, stdin=None, session=None, storage=None):
         if source_map is None:
             source_map = {}
         self.computation = computation
+        # storage reads are cached for the whole pause.
+        self.storage = storage or StorageReader.from_computation(computation)
+        self.preimages = session.preimages if session is not None else None
+        self.session = session  # vdb.debug_computation.DebugSession, for breakpoints.
         self.source_code = source_code
         self.line_no = line_no
         self.global_vars = source_map.get("globals", {})
         self.local_vars = source_map.get("locals", {})
+        self.function_index = get_function_index(source_map)
+        self.line_offsets = source_map.get("line_offsets")
         self.step_mode = False
+        self._next_dump = None  # (start, length) of the next `x` without arguments.
         super().__init__(stdin=stdin, stdout=stdout)
         if stdout or stdin:
             self.use_rawinput = False
@@ -60,11 +101,10 @@ class VyperDebugCmd(cmd.Cmd):
             self.stdout.write('No source loaded' + '\n')
             return
 
-        lines = self.source_code.splitlines()
-        begin = self.line_no - 1 if self.line_no > 1 else 0
-        end = self.line_no + 1 if self.line_no < len(lines) else self.line_no
-        for idx, line in enumerate(lines[begin - 1:end]):
-            line_number = begin + idx
+        lines = get_source_lines(
+            self.source_code, self.line_offsets, self.line_no - 1, self.line_no + 1
+        )
+        for line_number, line in lines:
             if line_number == self.line_no:
                 self.stdout.write("--> \033[92m{}\033[0m\t{}".format(line_number, line) + '\n')
             else:
@@ -72,7 +112,13 @@ class VyperDebugCmd(cmd.Cmd):
 
     def preloop(self):
         super().preloop()
+        if self.session is not None and self.session.watchpoints.hits:
+            self.session.watchpoints.write_hits(self.stdout)
         self._print_code_position()
+        if self.session is not None and self.session.display is not None:
+            self.session.display.write_changes(
+                self.stdout, self.computation, self._get_slot_vars()
+            )
 
     def postloop(self):
         if not self.step_mode:
@@ -99,10 +145,10 @@ class VyperDebugCmd(cmd.Cmd):
             self.stdout.write('self.{}\t\t{}'.format(name, info['type']) + '\n')
 
     def _get_fn_name_locals(self):
-        for fn_name, info in self.local_vars.items():
-            if info['from_lineno'] <= self.line_no <= info['to_lineno']:
-                return fn_name, info['variables']
-        return '', {}
+        fn_name = find_function(self.function_index, self.line_no)
+        if fn_name is None:
+            return '', {}
+        return fn_name, self.local_vars[fn_name]['variables']
 
     def do_locals(self, *args):
         if not self.local_vars:
@@ -152,10 +198,49 @@ class VyperDebugCmd(cmd.Cmd):
         self.stdout.write(
             "{}\t{} \n".format(
                 pos,
-                to_hex(self.computation._memory._bytes[pos:pos + 32])
+                to_hex(read_memory(self.computation, pos, 32))
             )
         )
 
+    def do_x(self, line):
+        """
+        Hexdump memory, a page at a time. Without arguments continues the last dump.
+        x <start: int/0x hex> [<length: int/0x hex>]
+        """
+        args = line.split()
+        if not args and self._next_dump is None:
+            self.stdout.write('Usage: x <start> [<length>]\n')
+            return
+        elif args:
+            try:
+                start = int(args[0], 0)
+                length = int(args[1], 0) if len(args) > 1 else DEFAULT_DUMP_LENGTH
+            except (IndexError, ValueError):
+                self.stdout.write('Only valid int/hex positions allowed\n')
+                return
+            if start < 0 or length <= 0:
+                self.stdout.write('*** Start must not be negative, length must be positive.\n')
+                return
+        else:
+            start, length = self._next_dump
+
+        page = min(length, DUMP_PAGE_SIZE)
+        with memory_view(self.computation) as view:
+            memory_size = len(view)
+            for dump_line in hexdump_lines(view, start, page):
+                self.stdout.write(dump_line + '\n')
+        end = min(start + page, memory_size)
+        if start >= memory_size:
+            self.stdout.write('Memory ends at {}.\n'.format(hex(memory_size)))
+            self._next_dump = None
+        elif length > page and end < memory_size:
+            self._next_dump = (end, length - page)
+            self.stdout.write('({} more bytes, x to continue)\n'.format(length - page))
+        else:
+            self._next_dump = (end, DEFAULT_DUMP_LENGTH)
+
+    do_hexdump = do_x
+
     def do_calldataload(self, line):
         """
         Read something from the calldata.
@@ -179,9 +264,10 @@ class VyperDebugCmd(cmd.Cmd):
 
         if line.startswith('self.') and len(line) > 4:
             parse_global(
-                self.stdout, self.global_vars, self.computation, line
+                self.stdout, self.global_vars, self.computation, line, self.storage,
+                self.preimages
             )
-        elif line in local_variables:
+        elif parse_var_name(line)[0] in local_variables:
             parse_local(
                 self.stdout, local_variables, self.computation, line
             )
@@ -196,6 +282,232 @@ class VyperDebugCmd(cmd.Cmd):
             for idx, value in enumerate(self.computation._stack.values):
                 self.stdout.write("{}\t{}".format(idx, to_hex(value)) + '\n')
 
+    def _set_breakpoint(self, line, temporary):
+        if self.session is None:
+            self.stdout.write('Breakpoints are not available.\n')
+            return
+        line_no, _, condition = line.strip().partition(' ')
+        condition = condition.strip()
+        if condition and not condition.startswith('if '):
+            self.stdout.write('Usage: break <line_no> [if <condition>]\n')
+            return
+        condition = condition[3:].strip() or None
+        try:
+            bp = self.session.add_breakpoint(int(line_no), condition, temporary)
+        except (ValueError, SyntaxError) as e:
+            self.stdout.write('*** {}\n'.format(e))
+            return
+        self.stdout.write('{} {} at line {}{}\n'.format(
+            'Temporary breakpoint' if temporary else 'Breakpoint',
+            bp.number,
+            bp.line_no,
+            ' if ' + condition if condition else ''
+        ))
+
+    def _print_breakpoints(self):
+        breakpoints = list(self.session.breakpoints) if self.session is not None else []
+        if not breakpoints:
+            self.stdout.write('No breakpoints.\n')
+            return
+        self.stdout.write('Num\tType\tLine\tHits\tCondition\n')
+        for bp in breakpoints:
+            self.stdout.write('{}\t{}\t{}\t{}\t{}{}{}\n'.format(
+                bp.number,
+                'tbreak' if bp.temporary else 'break',
+                bp.line_no,
+                bp.hits,
+                bp.condition or '',
+                ' (ignore next {} hits)'.format(bp.ignore_count) if bp.ignore_count else '',
+                ' (error: {})'.format(bp.error) if bp.error else '',
+            ))
+
+    def do_break(self, line):
+        """
+        Set a breakpoint, without arguments list breakpoints.
+        break <line_no> [if <condition>]
+        Conditions are Python expressions over locals, globals (self.x, self.x[key]) and
+        stack values (stack[-1] is the top of the stack), e.g. break 12 if i == 9999
+        """
+        if not line.strip():
+            self._print_breakpoints()
+        else:
+            self._set_breakpoint(line, temporary=False)
+
+    def do_tbreak(self, line):
+        """
+        Set a temporary breakpoint, deleted when first hit.
+        tbreak <line_no> [if <condition>]
+        """
+        self._set_breakpoint(line, temporary=True)
+
+    def do_ignore(self, line):
+        """
+        Do not stop the next <count> times a breakpoint is hit.
+        ignore <breakpoint number> <count>
+        """
+        try:
+            number, count = (int(x) for x in line.split())
+        except ValueError:
+            self.stdout.write('Usage: ignore <breakpoint number> <count>\n')
+            return
+        bp = self.session.breakpoints.breakpoints.get(number) if self.session else None
+        if bp is None:
+            self.stdout.write('No breakpoint number {}.\n'.format(number))
+            return
+        bp.ignore_count = max(0, count)
+        self.stdout.write('Will ignore next {} crossings of breakpoint {}.\n'.format(
+            bp.ignore_count, number
+        ))
+
+    def do_delete(self, line):
+        """
+        Delete a breakpoint, or all breakpoints without arguments.
+        delete [<breakpoint number>]
+        """
+        if self.session is None:
+            return
+        if not line.strip():
+            self.session.breakpoints.clear()
+        elif self.session.breakpoints.delete(self.get_int(line)) is None:
+            self.stdout.write('No breakpoint number {}.\n'.format(line.strip()))
+        self.session.update_breakpoints()
+
+    def _print_watchpoints(self):
+        watchpoints = list(self.session.watchpoints) if self.session is not None else []
+        if not watchpoints:
+            self.stdout.write('No watchpoints.\n')
+            return
+        self.stdout.write('Num\tHits\tWhat\n')
+        for wp in watchpoints:
+            self.stdout.write('{}\t{}\t{}\n'.format(wp.number, wp.hits, wp.description))
+
+    def do_watch(self, line):
+        """
+        Stop after a write to a global or to memory, without arguments list watchpoints.
+        watch self.<name>[<key>]
+        watch mem <start> <size>
+        """
+        args = line.split()
+        if not args:
+            self._print_watchpoints()
+            return
+        if self.session is None:
+            return
+        if args[0] == 'mem' and len(args) == 3:
+            start, size = self.get_int(args[1]), self.get_int(args[2])
+            if start is None or size is None:
+                return
+            try:
+                wp = self.session.watchpoints.add_memory(start, size)
+            except ValueError as e:
+                self.stdout.write('*** {}\n'.format(e))
+                return
+        elif args[0].startswith('self.'):
+            var_name, keys = parse_global_name(line.strip())
+            try:
+                slots = get_global_slots(self.global_vars, var_name, keys)
+            except VariableError as e:
+                self.stdout.write('*** {}\n'.format(e))
+                return
+            wp = self.session.watchpoints.add_storage(
+                line.strip(), self.computation.msg.storage_address, slots
+            )
+        else:
+            self.stdout.write('Usage: watch self.<name>[<key>] | watch mem <start> <size>\n')
+            return
+        self.session.update_opcodes()
+        self.stdout.write('Watchpoint {}: {}\n'.format(wp.number, wp.description))
+
+    def do_unwatch(self, line):
+        """
+        Delete a watchpoint, or all watchpoints without arguments.
+        unwatch [<watchpoint number>]
+        """
+        if self.session is None:
+            return
+        if not line.strip():
+            self.session.watchpoints.clear()
+        elif self.session.watchpoints.delete(self.get_int(line)) is None:
+            self.stdout.write('No watchpoint number {}.\n'.format(line.strip()))
+        self.session.update_opcodes()
+
+    def do_keys(self, line):
+        """
+        List the keys of a map written or read so far.
+        keys self.<name>[<key>]...
+        keys on: start recording keys (vyper-run --preimages records from the start).
+        """
+        line = line.strip()
+        if line == 'on':
+            if self.session is not None:
+                self.preimages = self.session.record_preimages()
+                self.stdout.write('Recording map keys.\n')
+            return
+        if self.preimages is None:
+            self.stdout.write('Map keys are not recorded, enable with: keys on\n')
+            return
+        var_name, keys = parse_global_name(line)
+        try:
+            value = read_global_value(
+                self.global_vars, self.storage, var_name, keys, self.preimages
+            )
+        except VariableError as e:
+            self.stdout.write('*** {}\n'.format(e))
+            return
+        if not isinstance(value, Aggregate) or value.kind != 'map':
+            self.stdout.write('*** {} is not a map.\n'.format(line))
+            return
+        for key in value.keys(0, len(value)):
+            self.stdout.write(format_value(key) + '\n')
+        if not len(value):
+            self.stdout.write('No keys recorded.\n')
+
+    def do_dump(self, line):
+        """
+        Print globals in full, maps with all keys recorded so far (see keys).
+        dump [self.<name>...]
+        """
+        if not line.strip():
+            dump_globals(self.stdout, self.global_vars, self.storage, self.preimages)
+            return
+        var_name, keys = parse_global_name(line.strip())
+        try:
+            value = read_global_value(
+                self.global_vars, self.storage, var_name, keys, self.preimages
+            )
+        except VariableError as e:
+            self.stdout.write('*** {}\n'.format(e))
+            return
+        self.stdout.write(format_value(value, limit=None) + '\n')
+
+    def _get_slot_vars(self):
+        # globals stored in their own slot.
+        return {
+            info['position']: ('self.' + name, info['type'])
+            for name, info in self.global_vars.items()
+            if not ('layout' in info or is_bytelike(info['type']) or info['type'].startswith('map'))
+        }
+
+    def do_display(self, line):
+        """
+        Show what changed at every stop: stack values popped and pushed, memory words and
+        storage slots written.
+        display on|off
+        """
+        line = line.strip()
+        if self.session is None:
+            return
+        if line == 'on':
+            self.session.set_display(self.computation)
+        elif line == 'off':
+            self.session.clear_display()
+        elif line:
+            self.stdout.write('Usage: display on|off\n')
+            return
+        self.stdout.write('Auto-display is {}.\n'.format(
+            'off' if self.session.display is None else 'on'
+        ))
+
     def do_pdb(self, *args):
         # Break out to pdb for vdb debugging.
         import pdb; pdb.set_trace()  # noqa
@@ -223,13 +535,43 @@ class VyperDebugCmd(cmd.Cmd):
         return True
 
 
-original_opcodes = eth.vm.forks.byzantium.computation.ByzantiumComputation.opcodes
+@functools.lru_cache(maxsize=None)
+def get_original_opcodes():
+    # py-evm and vyper are imported on first use, not with vdb.
+    from eth.vm.forks.byzantium.computation import ByzantiumComputation
+    return ByzantiumComputation.opcodes
+
+
+def _make_opcodes(debug_opcode):
+    from eth.vm.opcode import as_opcode
+    from vyper.opcodes import opcodes as vyper_opcodes
+
+    opcodes = get_original_opcodes().copy()
+    opcodes[vyper_opcodes['DEBUG'][0]] = as_opcode(
+        logic_fn=debug_opcode,
+        mnemonic="DEBUG",
+        gas_cost=0
+    )
+    return opcodes
+
+
+def _get_default_computation_class():
+    from eth.vm.forks.byzantium.computation import ByzantiumComputation
+    get_original_opcodes()  # before it is patched.
+    return ByzantiumComputation
 
 
-def set_evm_opcode_debugger(source_code=None, source_map=None, stdin=None, stdout=None):
+def set_evm_opcode_debugger(source_code=None, source_map=None, stdin=None, stdout=None,
+                            computation_class=None):
+    """
+    Install a DEBUG opcode that opens vdb, on `computation_class` (by default
+    ByzantiumComputation, for the whole process; see DebugSession.set_evm_opcode_debugger).
+    """
+    if computation_class is None:
+        computation_class = _get_default_computation_class()
 
     def debug_opcode(computation):
-        line_no = computation.stack_pop(num_items=1, type_hint=constants.UINT256)
+        line_no = computation.stack_pop(num_items=1, type_hint=UINT256)
         VyperDebugCmd(
             computation,
             line_no=line_no,
@@ -239,25 +581,14 @@ def set_evm_opcode_debugger(source_code=None, source_map=None, stdin=None, stdou
             stdout=stdout
         ).cmdloop()
 
-    opcodes = original_opcodes.copy()
-    opcodes[vyper_opcodes['DEBUG'][0]] = as_opcode(
-        logic_fn=debug_opcode,
-        mnemonic="DEBUG",
-        gas_cost=0
-    )
-
-    setattr(eth.vm.forks.byzantium.computation.ByzantiumComputation, 'opcodes', opcodes)
+    setattr(computation_class, 'opcodes', _make_opcodes(debug_opcode))
 
 
-def set_evm_opcode_pass():
+def set_evm_opcode_pass(computation_class=None):
+    if computation_class is None:
+        computation_class = _get_default_computation_class()
 
     def debug_opcode(computation):
-        computation.stack_pop(num_items=1, type_hint=constants.UINT256)
+        computation.stack_pop(num_items=1, type_hint=UINT256)
 
-    opcodes = original_opcodes.copy()
-    opcodes[vyper_opcodes['DEBUG'][0]] = as_opcode(
-        logic_fn=debug_opcode,
-        mnemonic="DEBUG",
-        gas_cost=0
-    )
-    setattr(eth.vm.forks.byzantium.computation.ByzantiumComputation, 'opcodes', opcodes)
+    setattr(computation_class, 'opcodes', _make_opcodes(debug_opcode))
@@ -0,0 +1,205 @@
+import bisect
+import itertools
+
+from eth_utils import (
+    big_endian_to_int,
+    to_hex,
+)
+
+
+SSTORE = 0x55
+MSTORE = 0x52
+MSTORE8 = 0x53
+CALLDATACOPY = 0x37
+CODECOPY = 0x39
+EXTCODECOPY = 0x3c
+RETURNDATACOPY = 0x3e
+CALL = 0xf1
+CALLCODE = 0xf2
+DELEGATECALL = 0xf4
+STATICCALL = 0xfa
+
+# opcode -> (number of stack values read, function of the stack values returning the
+# written memory range (start, size)).
+MEMORY_WRITES = {
+    MSTORE: (2, lambda values: (values[-1], 32)),
+    MSTORE8: (2, lambda values: (values[-1], 1)),
+    CALLDATACOPY: (3, lambda values: (values[-1], values[-3])),
+    CODECOPY: (3, lambda values: (values[-1], values[-3])),
+    RETURNDATACOPY: (3, lambda values: (values[-1], values[-3])),
+    EXTCODECOPY: (4, lambda values: (values[-2], values[-4])),
+    CALL: (7, lambda values: (values[-6], values[-7])),  # return data.
+    CALLCODE: (7, lambda values: (values[-6], values[-7])),
+    DELEGATECALL: (6, lambda values: (values[-5], values[-6])),
+    STATICCALL: (6, lambda values: (values[-5], values[-6])),
+}
+MAX_DISPLAY_BYTES = 64
+
+
+def _to_int(value):
+    return big_endian_to_int(value) if isinstance(value, bytes) else value
+
+
+class Watchpoint:
+
+    def __init__(self, number, description, address=None, slots=(), start=None, size=None):
+        self.number = number
+        self.description = description
+        self.address = address  # storage watchpoints.
+        self.slots = slots
+        self.start = start  # memory watchpoints.
+        self.size = size
+        self.hits = 0
+
+    @property
+    def is_memory(self):
+        return self.start is not None
+
+
+class WatchpointTable:
+    """
+    Storage and memory watchpoints of a debug session.
+
+    Watched storage slots are kept in a set of (address, slot), watched memory in sorted,
+    merged [start, end) intervals searched with bisect. Checking a write costs the same
+    regardless of the number of watchpoints. Memory watchpoints apply to the memory of
+    every computation.
+    """
+
+    def __init__(self):
+        self.watchpoints = {}
+        self.hits = []  # (watchpoint, old value, new value) not reported yet.
+        self._numbers = itertools.count(1)
+        self._slots = {}
+        self._starts = []
+        self._ends = []
+
+    def __iter__(self):
+        return iter(sorted(self.watchpoints.values(), key=lambda wp: wp.number))
+
+    def __len__(self):
+        return len(self.watchpoints)
+
+    def add_storage(self, description, address, slots):
+        wp = Watchpoint(next(self._numbers), description, address=address, slots=tuple(slots))
+        self.watchpoints[wp.number] = wp
+        self._rebuild()
+        return wp
+
+    def add_memory(self, start, size):
+        if size <= 0:
+            raise ValueError('Watched memory size must be positive.')
+        description = 'mem[{}:{}]'.format(hex(start), hex(start + size))
+        wp = Watchpoint(next(self._numbers), description, start=start, size=size)
+        self.watchpoints[wp.number] = wp
+        self._rebuild()
+        return wp
+
+    def delete(self, number):
+        wp = self.watchpoints.pop(number, None)
+        self._rebuild()
+        return wp
+
+    def clear(self):
+        self.watchpoints.clear()
+        self._rebuild()
+
+    def _rebuild(self):
+        self._slots = {}
+        intervals = []
+        for wp in self:
+            if wp.is_memory:
+                intervals.append((wp.start, wp.start + wp.size))
+            else:
+                for slot in wp.slots:
+                    self._slots.setdefault((wp.address, slot), []).append(wp)
+        starts, ends = [], []
+        for start, end in sorted(intervals):
+            if ends and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        self._starts, self._ends = starts, ends
+
+    def watches_memory(self, start, size):
+        if not size:
+            return False
+        idx = bisect.bisect_left(self._starts, start + size) - 1
+        return idx >= 0 and self._ends[idx] > start
+
+    def _memory_watchpoints(self, start, size):
+        return [
+            wp for wp in self
+            if wp.is_memory and wp.start < start + size and start < wp.start + wp.size
+        ]
+
+    #
+    # Opcode hooks
+    #
+    def make_opcodes(self, opcodes, on_hit):
+        """
+        Returns a copy of the `opcodes` table with SSTORE and the memory writing opcodes
+        wrapped. `on_hit(computation)` is called after a write to a watched location,
+        the hits are appended to `hits`.
+        """
+        opcodes = opcodes.copy()
+        opcodes[SSTORE] = self._wrap_sstore(opcodes[SSTORE], on_hit)
+        for opcode, (depth, get_range) in MEMORY_WRITES.items():
+            opcodes[opcode] = self._wrap_memory_write(
+                opcodes[opcode], depth, get_range, on_hit
+            )
+        return opcodes
+
+    def _wrap_sstore(self, opcode_fn, on_hit):
+        def sstore(computation):
+            key = (computation.msg.storage_address, _to_int(computation._stack.values[-1]))
+            watchpoints = self._slots.get(key)
+            if watchpoints is None:
+                return opcode_fn(computation=computation)
+            account_db = computation.state.account_db
+            old = account_db.get_storage(*key)
+            opcode_fn(computation=computation)
+            new = account_db.get_storage(*key)
+            for wp in watchpoints:
+                wp.hits += 1
+                self.hits.append((wp, old, new))
+            on_hit(computation)
+
+        sstore.mnemonic = opcode_fn.mnemonic
+        return sstore
+
+    def _wrap_memory_write(self, opcode_fn, depth, get_range, on_hit):
+        def memory_write(computation):
+            values = computation._stack.values
+            if len(values) < depth:
+                return opcode_fn(computation=computation)  # raises InsufficientStack.
+            start, size = (_to_int(x) for x in get_range(values))
+            if not self.watches_memory(start, size):
+                return opcode_fn(computation=computation)
+            watchpoints = self._memory_watchpoints(start, size)
+            memory = computation._memory._bytes
+            olds = [bytes(memory[wp.start:wp.start + wp.size]) for wp in watchpoints]
+            opcode_fn(computation=computation)
+            memory = computation._memory._bytes
+            for wp, old in zip(watchpoints, olds):
+                wp.hits += 1
+                new = bytes(memory[wp.start:wp.start + wp.size])
+                self.hits.append((wp, old.ljust(wp.size, b'\0'), new))
+            on_hit(computation)
+
+        memory_write.mnemonic = opcode_fn.mnemonic
+        return memory_write
+
+    def write_hits(self, stdout):
+        for wp, old, new in self.hits:
+            stdout.write('Watchpoint {}: {}\n'.format(wp.number, wp.description))
+            if wp.is_memory and wp.size > MAX_DISPLAY_BYTES:
+                # show the bytes from the first change.
+                offset = next((i for i, (a, b) in enumerate(zip(old, new)) if a != b), 0)
+                stdout.write('Changed from {}\n'.format(hex(wp.start + offset)))
+                old, new = (x[offset:offset + MAX_DISPLAY_BYTES] for x in (old, new))
+            if wp.is_memory:
+                old, new = to_hex(old), to_hex(new)
+            stdout.write('Old value = {}\nNew value = {}\n'.format(old, new))
+        self.hits = []